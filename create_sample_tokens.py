@@ -145,7 +145,7 @@ def main():
     
     # Test database connection
     db = get_db()
-    if not db.connection or not db.connection.is_connected():
+    if not db.is_connected():
         logger.error("Database connection failed")
         sys.exit(1)
         
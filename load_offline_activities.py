@@ -12,6 +12,8 @@ import json
 import glob
 import logging
 import random
+import argparse
+import tempfile
 import mysql.connector
 from datetime import datetime, timedelta
 
@@ -30,217 +32,403 @@ DB_CONFIG = {
     'database': 'honeytoken_ueba'
 }
 
-def connect_to_database():
-    """Connect to the MySQL database"""
+# Number of activity files written per batch
+BATCH_SIZE = 500
+# Batch size in bulk mode, where a batch costs a couple of statements however large it is
+BULK_BATCH_SIZE = 10000
+
+ACTIVITY_COLUMNS = ('user_id', 'activity_type', 'resource_accessed', 'ip_address', 'user_agent', 'timestamp', 'action_details')
+ANOMALY_COLUMNS = ('user_id', 'activity_id', 'feature_name', 'expected_value', 'actual_value', 'anomaly_score', 'timestamp')
+
+def connect_to_database(bulk=False):
+    """Connect to the MySQL database (bulk mode needs LOCAL INFILE enabled on the connection)"""
     try:
-        conn = mysql.connector.connect(**DB_CONFIG)
+        conn = mysql.connector.connect(**DB_CONFIG, allow_local_infile=bulk)
         logger.info(f"Connected to MySQL database '{DB_CONFIG['database']}'")
         return conn
     except mysql.connector.Error as err:
         logger.error(f"Failed to connect to MySQL database: {err}")
         sys.exit(1)
 
-def process_activity(conn, activity_data):
-    """Process an activity and save it to the database"""
-    cursor = conn.cursor()
+def parse_activity(activity_data):
+    """Map an activity file onto a user_activities row"""
+    # Map fields from activity file to database columns
+    user_id = activity_data.get('user_id')
+    activity_type = activity_data.get('activity_type')
+    ip_address = activity_data.get('ip_address')
+    user_agent = activity_data.get('user_agent')
+    resource = activity_data.get('resource')
+    details = activity_data.get('details', {})
     
-    try:
-        # Map fields from activity file to database columns
-        user_id = activity_data.get('user_id')
-        activity_type = activity_data.get('activity_type')
-        ip_address = activity_data.get('ip_address')
-        user_agent = activity_data.get('user_agent')
-        resource = activity_data.get('resource')
-        details = activity_data.get('details', {})
-        
-        # Convert timestamp if it exists
-        timestamp = None
-        if 'timestamp' in details:
+    # Convert timestamp if it exists
+    timestamp = None
+    if 'timestamp' in details:
+        try:
+            timestamp = datetime.strptime(details['timestamp'], '%Y-%m-%dT%H:%M:%S.%f')
+        except ValueError:
             try:
-                timestamp = datetime.strptime(details['timestamp'], '%Y-%m-%dT%H:%M:%S.%f')
+                timestamp = datetime.strptime(details['timestamp'], '%Y-%m-%dT%H:%M:%S')
             except ValueError:
-                try:
-                    timestamp = datetime.strptime(details['timestamp'], '%Y-%m-%dT%H:%M:%S')
-                except ValueError:
-                    logger.error(f"Invalid timestamp format: {details['timestamp']}")
+                logger.error(f"Invalid timestamp format: {details['timestamp']}")
+    
+    # If no timestamp, use a random time in the past 24 hours
+    if not timestamp:
+        timestamp = datetime.now() - timedelta(hours=random.uniform(0, 24))
+    
+    # Convert details to JSON if it's a dict
+    if isinstance(details, dict):
+        details_json = json.dumps(details)
+    else:
+        details_json = details
+        
+    return {
+        'user_id': user_id,
+        'activity_type': activity_type,
+        'resource': resource,
+        'ip_address': ip_address,
+        'user_agent': user_agent,
+        'timestamp': timestamp,
+        'details_json': details_json
+    }
+
+def local_infile_enabled(conn):
+    """Whether the server accepts LOAD DATA LOCAL INFILE (local_infile is OFF by default since MySQL 8.0)"""
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SHOW GLOBAL VARIABLES LIKE 'local_infile'")
+        row = cursor.fetchone()
+        return bool(row) and row[1] == 'ON'
+    except mysql.connector.Error as err:
+        logger.error(f"Error checking local_infile: {err}")
+        return False
+    finally:
+        cursor.close()
+
+def tsv_field(value):
+    """Format a value for LOAD DATA's default format: tab-separated, backslash escapes, \\N for NULL"""
+    if value is None:
+        return '\\N'
+    if isinstance(value, bool):
+        value = int(value)
+    elif isinstance(value, datetime):
+        value = value.strftime('%Y-%m-%d %H:%M:%S')
+    return (str(value).replace('\\', '\\\\').replace('\t', '\\t')
+            .replace('\n', '\\n').replace('\r', '\\r').replace('\0', '\\0'))
+
+def load_data(cursor, table, columns, rows):
+    """Stage rows in a temporary TSV file and load it with LOAD DATA LOCAL INFILE
+    
+    One statement streams the whole file to the server, with none of the
+    per-statement parsing and round trips of INSERTs. Returns False if the
+    server skipped any row (it reports bad rows as warnings and carries on).
+    """
+    with tempfile.NamedTemporaryFile('w', suffix='.tsv', encoding='utf-8', newline='\n', delete=False) as f:
+        for row in rows:
+            f.write('\t'.join(tsv_field(value) for value in row) + '\n')
+        path = f.name
         
-        # If no timestamp, use a random time in the past 24 hours
-        if not timestamp:
-            timestamp = datetime.now() - timedelta(hours=random.uniform(0, 24))
+    try:
+        cursor.execute(
+            f"LOAD DATA LOCAL INFILE %s INTO TABLE {table} CHARACTER SET utf8mb4 ({', '.join(columns)})",
+            (path,)
+        )
+    finally:
+        os.remove(path)
         
-        # Convert details to JSON if it's a dict
-        if isinstance(details, dict):
-            details_json = json.dumps(details)
-        else:
-            details_json = details
+    if cursor.rowcount != len(rows):
+        logger.error(f"LOAD DATA into {table} loaded {cursor.rowcount} of {len(rows)} rows")
+        return False
+    return True
+
+def loaded_activity_ids(cursor, activities):
+    """IDs of the activities LOAD DATA just inserted, in the order of activities
+    
+    cursor.lastrowid is 0 after LOAD DATA, and with innodb_autoinc_lock_mode=2
+    a concurrent insert can take IDs in the middle of the statement's, so the
+    rows are selected back instead: from LAST_INSERT_ID() (the first ID the
+    statement generated) on, skipping rows that aren't the next activity.
+    Returns None if some activity wasn't found.
+    """
+    cursor.execute("SELECT LAST_INSERT_ID()")
+    first_id = cursor.fetchone()[0]
+    timestamps = [activity['timestamp'].replace(microsecond=0) for activity in activities]
+    
+    cursor.execute("""
+    SELECT activity_id, user_id, activity_type, timestamp
+    FROM user_activities
+    WHERE activity_id >= %s AND timestamp BETWEEN %s AND %s
+    ORDER BY activity_id
+    """, (first_id, min(timestamps), max(timestamps)))
+    
+    # The file's rows were inserted, and so numbered, in order
+    activity_ids = []
+    for activity_id, user_id, activity_type, timestamp in cursor.fetchall():
+        if len(activity_ids) == len(activities):
+            break
+        activity = activities[len(activity_ids)]
+        if (user_id, activity_type, timestamp) == (activity['user_id'], activity['activity_type'], timestamps[len(activity_ids)]):
+            activity_ids.append(activity_id)
+            
+    if len(activity_ids) < len(activities):
+        logger.error(f"Found {len(activity_ids)} of the {len(activities)} activities loaded from ID {first_id}")
+        return None
+    return activity_ids
+
+def process_activity_batch(conn, activities, bulk=False):
+    """Save a batch of parsed activities to the database
+    
+    Each table is written with a single executemany() call, which the connector
+    rewrites into one multi-row INSERT. In bulk mode activities and anomaly
+    scores are loaded with LOAD DATA LOCAL INFILE instead, and last_login is
+    derived with one set-based UPDATE. Returns the list of activity IDs.
+    """
+    if not activities:
+        return []
         
-        # Insert activity into user_activities table
+    cursor = conn.cursor()
+    
+    try:
+        # Insert activities into user_activities table
         query = """
         INSERT INTO user_activities 
         (user_id, activity_type, resource_accessed, ip_address, user_agent, timestamp, action_details) 
         VALUES (%s, %s, %s, %s, %s, %s, %s)
         """
         
-        values = (
-            user_id,
-            activity_type,
-            resource,
-            ip_address,
-            user_agent,
-            timestamp.strftime('%Y-%m-%d %H:%M:%S'),
-            details_json
-        )
-        
-        cursor.execute(query, values)
-        activity_id = cursor.lastrowid
+        values = [
+            (
+                activity['user_id'],
+                activity['activity_type'],
+                activity['resource'],
+                activity['ip_address'],
+                activity['user_agent'],
+                activity['timestamp'].strftime('%Y-%m-%d %H:%M:%S'),
+                activity['details_json']
+            )
+            for activity in activities
+        ]
         
-        # Update the user's last_login time
+        if bulk:
+            return load_activity_batch(cursor, activities, values)
+            
+        cursor.executemany(query, values)
+        
+        # A multi-row INSERT reports the first generated ID; the rest follow consecutively
+        first_id = cursor.lastrowid
+        activity_ids = list(range(first_id, first_id + len(activities)))
+        
+        # Update each user's last_login time once, to the latest activity in the batch;
+        # GREATEST keeps a later batch of older logs from moving it back, as in bulk mode
+        last_logins = {}
+        for activity in activities:
+            user_id = activity['user_id']
+            if user_id not in last_logins or activity['timestamp'] > last_logins[user_id]:
+                last_logins[user_id] = activity['timestamp']
+                
         update_query = """
-        UPDATE users SET last_login = %s WHERE user_id = %s
+        UPDATE users SET last_login = GREATEST(COALESCE(last_login, %s), %s) WHERE user_id = %s
         """
-        cursor.execute(update_query, (timestamp.strftime('%Y-%m-%d %H:%M:%S'), user_id))
+        cursor.executemany(update_query, [
+            (timestamp.strftime('%Y-%m-%d %H:%M:%S'), timestamp.strftime('%Y-%m-%d %H:%M:%S'), user_id)
+            for user_id, timestamp in last_logins.items()
+        ])
+        
+        generate_side_effects(cursor, activity_ids, activities)
+        return activity_ids
         
+    except mysql.connector.Error as err:
+        logger.error(f"Database error: {err}")
+        return []
+    finally:
+        cursor.close()
+
+def load_activity_batch(cursor, activities, values):
+    """Bulk-mode half of process_activity_batch: LOAD DATA, then one UPDATE for last_login"""
+    if not load_data(cursor, 'user_activities', ACTIVITY_COLUMNS, values):
+        return []
+        
+    activity_ids = loaded_activity_ids(cursor, activities)
+    if activity_ids is None:
+        return []
+    
+    # Derive every user's last_login from the loaded rows in one statement; GREATEST
+    # keeps a backfill of older logs from moving last_login back in time (and makes
+    # other sessions' rows interleaved in the ID range harmless)
+    cursor.execute("""
+    UPDATE users u
+    JOIN (
+        SELECT user_id, MAX(timestamp) AS latest
+        FROM user_activities
+        WHERE activity_id BETWEEN %s AND %s
+        GROUP BY user_id
+    ) batch ON batch.user_id = u.user_id
+    SET u.last_login = GREATEST(COALESCE(u.last_login, batch.latest), batch.latest)
+    """, (activity_ids[0], activity_ids[-1]))
+    
+    if not generate_side_effects(cursor, activity_ids, activities, bulk=True):
+        return []
+    return activity_ids
+
+def generate_side_effects(cursor, activity_ids, activities, bulk=False):
+    """Add synthetic anomaly scores and alerts for some of the activities
+    
+    Returns False if the anomaly scores failed to load in bulk mode.
+    """
+    anomaly_rows = []
+    alerted = []
+    for activity_id, activity in zip(activity_ids, activities):
         # Generate anomaly score for some activities (about 15%)
         if random.random() < 0.15:
-            generate_anomaly_score(conn, user_id, activity_id, timestamp)
+            anomaly_rows.extend(generate_anomaly_score(activity['user_id'], activity_id, activity['timestamp']))
             
         # Generate alert for some anomalous activities (about 5%)
         if random.random() < 0.05:
-            generate_alert(conn, user_id, activity_id, activity_type, resource, ip_address, timestamp)
+            alerted.append((activity_id, activity))
             
-        return activity_id
+    if anomaly_rows:
+        if bulk:
+            if not load_data(cursor, 'anomaly_scores', ANOMALY_COLUMNS, anomaly_rows):
+                return False
+        else:
+            add_anomaly_scores(cursor, anomaly_rows)
         
-    except mysql.connector.Error as err:
-        logger.error(f"Database error: {err}")
-        return None
-    finally:
-        cursor.close()
+    if alerted:
+        generate_alerts(cursor, alerted)
+    return True
 
-def generate_anomaly_score(conn, user_id, activity_id, timestamp):
-    """Generate anomaly scores for an activity"""
-    cursor = conn.cursor()
+def generate_anomaly_score(user_id, activity_id, timestamp):
+    """Generate anomaly score rows for an activity"""
+    features = {
+        "login_time": {
+            "expected": random.uniform(9.0, 17.0),
+            "actual": random.uniform(0.0, 24.0)
+        },
+        "access_frequency": {
+            "expected": random.uniform(1.0, 10.0),
+            "actual": random.uniform(10.0, 50.0)
+        },
+        "resource_access_pattern": {
+            "expected": random.uniform(0.1, 0.5),
+            "actual": random.uniform(0.6, 0.9)
+        },
+        "ip_address_range": {
+            "expected": random.uniform(0.7, 0.9),
+            "actual": random.uniform(0.1, 0.5)
+        },
+        "session_duration": {
+            "expected": random.uniform(30.0, 120.0),
+            "actual": random.uniform(150.0, 480.0)
+        }
+    }
     
+    rows = []
+    for feature_name, values in features.items():
+        # Skip some features randomly
+        if random.random() > 0.7:
+            continue
+            
+        # Generate anomaly score based on difference between expected and actual
+        diff = abs(values["actual"] - values["expected"])
+        normalized_diff = min(diff / values["expected"], 1.0)
+        
+        # Add some randomness
+        anomaly_score = min(normalized_diff * random.uniform(0.8, 1.2), 1.0)
+        
+        rows.append((
+            user_id,
+            activity_id,
+            feature_name,
+            values["expected"],
+            values["actual"],
+            anomaly_score,
+            timestamp.strftime('%Y-%m-%d %H:%M:%S')
+        ))
+        
+    return rows
+
+def add_anomaly_scores(cursor, rows):
+    """Insert anomaly score rows in one statement"""
     try:
-        features = {
-            "login_time": {
-                "expected": random.uniform(9.0, 17.0),
-                "actual": random.uniform(0.0, 24.0)
-            },
-            "access_frequency": {
-                "expected": random.uniform(1.0, 10.0),
-                "actual": random.uniform(10.0, 50.0)
-            },
-            "resource_access_pattern": {
-                "expected": random.uniform(0.1, 0.5),
-                "actual": random.uniform(0.6, 0.9)
-            },
-            "ip_address_range": {
-                "expected": random.uniform(0.7, 0.9),
-                "actual": random.uniform(0.1, 0.5)
-            },
-            "session_duration": {
-                "expected": random.uniform(30.0, 120.0),
-                "actual": random.uniform(150.0, 480.0)
-            }
-        }
+        query = """
+        INSERT INTO anomaly_scores 
+        (user_id, activity_id, feature_name, expected_value, actual_value, anomaly_score, timestamp) 
+        VALUES (%s, %s, %s, %s, %s, %s, %s)
+        """
+        
+        cursor.executemany(query, rows)
         
-        for feature_name, values in features.items():
-            # Skip some features randomly
-            if random.random() > 0.7:
-                continue
-                
-            # Generate anomaly score based on difference between expected and actual
-            diff = abs(values["actual"] - values["expected"])
-            normalized_diff = min(diff / values["expected"], 1.0)
-            
-            # Add some randomness
-            anomaly_score = min(normalized_diff * random.uniform(0.8, 1.2), 1.0)
-            
-            query = """
-            INSERT INTO anomaly_scores 
-            (user_id, activity_id, feature_name, expected_value, actual_value, anomaly_score, timestamp) 
-            VALUES (%s, %s, %s, %s, %s, %s, %s)
-            """
-            
-            values_tuple = (
-                user_id,
-                activity_id,
-                feature_name,
-                values["expected"],
-                values["actual"],
-                anomaly_score,
-                timestamp.strftime('%Y-%m-%d %H:%M:%S')
-            )
-            
-            cursor.execute(query, values_tuple)
-            
     except mysql.connector.Error as err:
-        logger.error(f"Error adding anomaly score: {err}")
-    finally:
-        cursor.close()
+        logger.error(f"Error adding anomaly scores: {err}")
 
-def generate_alert(conn, user_id, activity_id, activity_type, resource, ip_address, timestamp):
-    """Generate an alert for an activity"""
-    cursor = conn.cursor()
-    
+def generate_alerts(cursor, alerted):
+    """Generate alerts for a list of (activity_id, activity) pairs"""
     try:
-        # Choose alert type and severity
         alert_types = ["access", "unusual_behavior", "multiple_access", "unauthorized"]
         severity_levels = ["low", "medium", "high", "critical"]
         severity_weights = [0.4, 0.3, 0.2, 0.1]
-        
-        alert_type = random.choice(alert_types)
-        severity = random.choices(severity_levels, weights=severity_weights, k=1)[0]
-        
-        # Generate description based on alert type
-        if alert_type == "access":
-            description = f"Suspicious access detected from IP {ip_address} at unusual time"
-        elif alert_type == "unusual_behavior":
-            description = f"User accessed {resource} outside normal working hours"
-        elif alert_type == "multiple_access":
-            description = f"Multiple access attempts from different locations"
-        else:  # unauthorized
-            description = f"Unauthorized access attempt to restricted resource: {resource}"
-        
-        # Randomly select a honeytoken (1-5)
-        token_id = random.randint(1, 5)
-        
-        # First create a honeytoken access record
         access_methods = ["web_browser", "api_call", "command_line", "application"]
-        access_method = random.choice(access_methods)
-        access_duration = random.randint(10, 300)
         user_agent = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
         
-        additional_context = json.dumps({
-            "activity_id": activity_id,
-            "activity_type": activity_type,
-            "resource": resource,
-            "referrer": f"http://{random.choice(['internal', 'external'])}.example.com/{random.choice(['login', 'dashboard', 'reports'])}"
-        })
+        honeytoken_values = []
+        alerts = []
+        for activity_id, activity in alerted:
+            ip_address = activity['ip_address']
+            resource = activity['resource']
+            timestamp = activity['timestamp'].strftime('%Y-%m-%d %H:%M:%S')
+            
+            # Choose alert type and severity
+            alert_type = random.choice(alert_types)
+            severity = random.choices(severity_levels, weights=severity_weights, k=1)[0]
+            
+            # Generate description based on alert type
+            if alert_type == "access":
+                description = f"Suspicious access detected from IP {ip_address} at unusual time"
+            elif alert_type == "unusual_behavior":
+                description = f"User accessed {resource} outside normal working hours"
+            elif alert_type == "multiple_access":
+                description = f"Multiple access attempts from different locations"
+            else:  # unauthorized
+                description = f"Unauthorized access attempt to restricted resource: {resource}"
+            
+            # Randomly select a honeytoken (1-5)
+            token_id = random.randint(1, 5)
+            
+            additional_context = json.dumps({
+                "activity_id": activity_id,
+                "activity_type": activity['activity_type'],
+                "resource": resource,
+                "referrer": f"http://{random.choice(['internal', 'external'])}.example.com/{random.choice(['login', 'dashboard', 'reports'])}"
+            })
+            
+            honeytoken_values.append((
+                token_id,
+                activity['user_id'],
+                ip_address,
+                user_agent,
+                timestamp,
+                random.choice(access_methods),
+                0,  # is_authorized (0 = false)
+                random.randint(10, 300),
+                additional_context
+            ))
+            
+            # 30% of alerts are resolved; access_id is filled in once the access rows exist
+            is_resolved = random.random() < 0.3
+            alerts.append([activity['user_id'], alert_type, severity, timestamp, description, is_resolved, token_id, None])
         
+        # First create the honeytoken access records
         honeytoken_query = """
         INSERT INTO honeytoken_access 
         (token_id, user_id, ip_address, user_agent, access_time, access_method, is_authorized, access_duration, additional_context) 
         VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
         """
         
-        honeytoken_values = (
-            token_id,
-            user_id,
-            ip_address,
-            user_agent,
-            timestamp.strftime('%Y-%m-%d %H:%M:%S'),
-            access_method,
-            0,  # is_authorized (0 = false)
-            access_duration,
-            additional_context
-        )
-        
-        cursor.execute(honeytoken_query, honeytoken_values)
-        access_id = cursor.lastrowid
+        cursor.executemany(honeytoken_query, honeytoken_values)
+        first_access_id = cursor.lastrowid
         
-        # Now create an alert with this access_id
-        is_resolved = random.random() < 0.3  # 30% of alerts are resolved
+        # Now create the alerts pointing at those access records
+        for offset, alert in enumerate(alerts):
+            alert[-1] = first_access_id + offset
         
         alert_query = """
         INSERT INTO alerts 
@@ -248,23 +436,10 @@ def generate_alert(conn, user_id, activity_id, activity_type, resource, ip_addre
         VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
         """
         
-        alert_values = (
-            user_id,
-            alert_type,
-            severity,
-            timestamp.strftime('%Y-%m-%d %H:%M:%S'),
-            description,
-            is_resolved,
-            token_id,
-            access_id
-        )
-        
-        cursor.execute(alert_query, alert_values)
+        cursor.executemany(alert_query, [tuple(alert) for alert in alerts])
         
     except mysql.connector.Error as err:
-        logger.error(f"Error adding alert: {err}")
-    finally:
-        cursor.close()
+        logger.error(f"Error adding alerts: {err}")
 
 def ensure_honeytokens_exist(conn):
     """Ensure honeytokens exist in the database"""
@@ -355,8 +530,12 @@ def ensure_honeytokens_exist(conn):
     finally:
         cursor.close()
 
-def load_offline_activities():
-    """Load all offline activities from the ./offline_activities directory"""
+def load_offline_activities(bulk=False, batch_size=None):
+    """Load all offline activities from the ./offline_activities directory
+    
+    bulk=True loads each batch with LOAD DATA LOCAL INFILE, which needs
+    local_infile=ON on the server; without it the normal INSERT path is used.
+    """
     offline_dir = "./offline_activities"
     processed_dir = os.path.join(offline_dir, "processed")
     
@@ -381,7 +560,13 @@ def load_offline_activities():
         return False
     
     # Connect to database
-    conn = connect_to_database()
+    conn = connect_to_database(bulk=bulk)
+    
+    if bulk and not local_infile_enabled(conn):
+        logger.warning("The server has local_infile=OFF (SET GLOBAL local_infile = 1 to enable it); "
+                       "loading with multi-row INSERTs instead")
+        bulk = False
+    batch_size = batch_size or (BULK_BATCH_SIZE if bulk else BATCH_SIZE)
     
     try:
         # Ensure honeytokens exist
@@ -391,30 +576,37 @@ def load_offline_activities():
         
         processed_count = 0
         
-        for file_path in all_files:
-            try:
-                with open(file_path, 'r') as f:
-                    activity_data = json.load(f)
-                
-                # Process the activity
-                activity_id = process_activity(conn, activity_data)
-                
-                if activity_id:
-                    processed_count += 1
+        for batch_start in range(0, len(all_files), batch_size):
+            batch_files = []
+            activities = []
+            
+            for file_path in all_files[batch_start:batch_start + batch_size]:
+                try:
+                    with open(file_path, 'r') as f:
+                        activity_data = json.load(f)
                     
-                    # Move processed file to processed directory if it's not already there
+                    activities.append(parse_activity(activity_data))
+                    batch_files.append(file_path)
+                    
+                except (json.JSONDecodeError, IOError) as err:
+                    logger.error(f"Error reading activity file {file_path}: {err}")
+            
+            # Process the whole batch in a handful of statements
+            activity_ids = process_activity_batch(conn, activities, bulk=bulk)
+            
+            if activity_ids:
+                conn.commit()
+                processed_count += len(activity_ids)
+                logger.info(f"Processed {processed_count} activities")
+                
+                # Move processed files to processed directory if they're not already there
+                for file_path in batch_files:
                     if not file_path.startswith(processed_dir):
                         processed_path = os.path.join(processed_dir, os.path.basename(file_path))
                         os.rename(file_path, processed_path)
                         logger.debug(f"Moved {file_path} to {processed_path}")
-                
-                # Commit after every 50 activities
-                if processed_count % 50 == 0:
-                    conn.commit()
-                    logger.info(f"Processed {processed_count} activities")
-                
-            except (json.JSONDecodeError, IOError) as err:
-                logger.error(f"Error reading activity file {file_path}: {err}")
+            else:
+                conn.rollback()
         
         # Final commit
         conn.commit()
@@ -430,8 +622,15 @@ def load_offline_activities():
 
 def main():
     """Main function"""
+    parser = argparse.ArgumentParser(description="Load offline activity files into the database")
+    parser.add_argument('--bulk', action='store_true',
+                        help='Load batches with LOAD DATA LOCAL INFILE (for large historical imports)')
+    parser.add_argument('--batch-size', type=int,
+                        help=f'Activity files per batch (default {BATCH_SIZE}, {BULK_BATCH_SIZE} with --bulk)')
+    args = parser.parse_args()
+    
     logger.info("Starting offline activities loading")
-    success = load_offline_activities()
+    success = load_offline_activities(bulk=args.bulk, batch_size=args.batch_size)
     
     if success:
         logger.info("Offline activities loaded successfully")
@@ -36,6 +36,17 @@ def parse_args():
     parser.add_argument('--setup', action='store_true', help='Run setup tasks')
     parser.add_argument('--load-offline', action='store_true', help='Load offline activities before starting')
     parser.add_argument('--test-db', action='store_true', help='Test database connection and exit')
+    parser.add_argument('--migrate', action='store_true', help='Apply pending schema migrations and exit')
+    parser.add_argument('--maintain-partitions', action='store_true', help='Create upcoming partitions, drop expired ones and exit')
+    parser.add_argument('--check-plans', action='store_true', help='EXPLAIN the hot queries and exit, failing on full scans or filesorts')
+    parser.add_argument('--rebuild-risk', action='store_true', help='Recompute the user_risk table from alerts and anomaly scores and exit')
+    parser.add_argument('--replay', nargs=2, metavar=('START', 'END'),
+                        help='Re-score the activities between two dates/times with isolated baselines and exit')
+    parser.add_argument('--replay-output', default='replay_results.csv', help='CSV file for the replayed scores')
+    parser.add_argument('--replay-workers', type=int, default=4, help='Processes to split the replayed users over')
+    parser.add_argument('--scoring', choices=['ratio', 'zscore'], help='Anomaly scoring mode for the replay')
+    parser.add_argument('--feature-threshold', type=float, help='Per-feature alert threshold for the replay')
+    parser.add_argument('--overall-threshold', type=float, help='Overall score alert threshold for the replay')
     
     return parser.parse_args()
 
@@ -54,7 +65,7 @@ def test_database_connection():
             db = get_db()
             
             # Test basic connection
-            if not db.connection or not db.connection.is_connected():
+            if not db.is_connected():
                 logger.error(f"Database connection failed - not connected (attempt {attempt+1}/{max_attempts})")
                 if attempt < max_attempts - 1:
                     time.sleep(2)
@@ -62,7 +73,7 @@ def test_database_connection():
                 return False
                 
             # Run a simple query to test the connection fully
-            test_result = db.fetch_one("SELECT 1 as test")
+            test_result = db.fetch_one("SELECT 1 as test", primary=True)
             if test_result and test_result.get('test') == 1:
                 logger.info("Database connection successful")
                 return True
@@ -295,13 +306,79 @@ def main():
         
         # Test database connection if requested
         if args.test_db:
-            if test_database_connection():
+            connected = test_database_connection()
+            breaker = get_db().breaker_state()
+            logger.info(f"Database circuit breaker: {breaker['state']} "
+                        f"(consecutive failures: {breaker['consecutive_failures']}, "
+                        f"retry budget: {breaker['retry']['budget_tokens']})")
+            if connected:
                 logger.info("Database connection test successful")
                 sys.exit(0)
             else:
                 logger.error("Database connection test failed")
                 sys.exit(1)
         
+        # Apply schema migrations if requested
+        if args.migrate:
+            from src.db.migrate import migrate
+            if not test_database_connection() or migrate() is None:
+                logger.error("Schema migration failed")
+                sys.exit(1)
+            sys.exit(0)
+            
+        # Create upcoming partitions and apply retention if requested (run daily)
+        if args.maintain_partitions:
+            from src.db.partitions import maintain_partitions
+            if not test_database_connection() or maintain_partitions() is None:
+                logger.error("Partition maintenance failed")
+                sys.exit(1)
+            sys.exit(0)
+            
+        # Check the query plans of the hot queries if requested
+        if args.check_plans:
+            from src.db.query_plans import check_query_plans
+            if not test_database_connection():
+                sys.exit(1)
+            problems = check_query_plans()
+            if problems:
+                logger.error(f"{len(problems)} query plan problems found")
+                sys.exit(1)
+            logger.info("All hot queries use indexes")
+            sys.exit(0)
+            
+        # Backtest the UEBA model on past activity if requested
+        if args.replay:
+            from src.models import replay
+            if not test_database_connection():
+                sys.exit(1)
+            options = {
+                'scoring': args.scoring,
+                'feature_threshold': args.feature_threshold,
+                'overall_threshold': args.overall_threshold
+            }
+            summary = replay.replay(
+                datetime.fromisoformat(args.replay[0]),
+                datetime.fromisoformat(args.replay[1]),
+                output=args.replay_output,
+                workers=args.replay_workers,
+                **{key: value for key, value in options.items() if value is not None}
+            )
+            if summary is None:
+                logger.error("Replay failed")
+                sys.exit(1)
+            for day, totals in summary['days'].items():
+                logger.info(f"{day}: {totals['activities']} activities, {totals['replayed_alerts']} alerts replayed, "
+                            f"{totals['recorded_alerts']} recorded ({totals['difference']:+d})")
+            sys.exit(0)
+            
+        # Recompute the incrementally maintained risk scores if requested
+        if args.rebuild_risk:
+            from src.models.risk import rebuild_user_risk
+            if not test_database_connection() or rebuild_user_risk() is None:
+                logger.error("Risk rebuild failed")
+                sys.exit(1)
+            sys.exit(0)
+        
         # Run setup if requested
         if args.setup:
             if not setup():
@@ -313,6 +390,10 @@ def main():
             logger.error("Failed to connect to database. Exiting.")
             sys.exit(1)
             
+        # Fill the UEBA engine's in-memory trackers from recent history
+        from src.models.ueba import get_ueba_engine
+        get_ueba_engine().warm_up()
+        
         # Load offline activities if requested
         if args.load_offline:
             logger.info("Loading offline activities...")
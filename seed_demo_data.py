@@ -152,6 +152,35 @@ def connect_to_database():
         logger.error(f"Failed to connect to MySQL database: {err}")
         sys.exit(1)
 
+def stream_sample(table, columns, fraction, batch_size=1000):
+    """Yield a uniform random sample of int(count * fraction) rows from a table
+    
+    Rows are streamed from an unbuffered cursor on a second connection (the
+    caller keeps writing on its own connection meanwhile) and picked with
+    selection sampling, so only one batch is ever held in memory.
+    """
+    conn = connect_to_database()
+    cursor = conn.cursor()
+    try:
+        cursor.execute(f"SELECT COUNT(*) FROM {table}")
+        remaining = cursor.fetchone()[0]
+        wanted = int(remaining * fraction)
+        
+        cursor.execute(f"SELECT {', '.join(columns)} FROM {table}")
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            for row in rows:
+                # Take each row with probability wanted/remaining: exactly `wanted` rows overall
+                if wanted and random.random() * remaining < wanted:
+                    wanted -= 1
+                    yield row
+                remaining -= 1
+    finally:
+        # Closing the connection also discards any rows left unread
+        conn.close()
+
 def seed_users(conn, clear_existing=False):
     """Seed user data into the database"""
     cursor = conn.cursor()
@@ -285,8 +314,10 @@ def seed_activities(conn, num_activities=1000, clear_existing=False):
         cursor.close()
         return
     
-    # Initialize activity counter
+    # Initialize activity counter and pending batch
     activities_added = 0
+    batch = []
+    last_logins = {}
     
     # Generate activities for the past 14 days
     for day in range(14, 0, -1):
@@ -333,44 +364,64 @@ def seed_activities(conn, num_activities=1000, clear_existing=False):
                 # Choose user agent
                 user_agent = random.choice(USER_AGENTS)
                 
-                # Add activity to database
-                query = """
-                INSERT INTO user_activities 
-                (user_id, activity_type, resource_accessed, ip_address, user_agent, timestamp) 
-                VALUES (%s, %s, %s, %s, %s, %s)
-                """
-                
-                values = (
+                # Queue activity for the next batched insert
+                batch.append((
                     user_id, 
                     activity_type,
                     resource,
                     ip_address,
                     user_agent,
                     timestamp.strftime('%Y-%m-%d %H:%M:%S')
-                )
+                ))
                 
-                try:
-                    cursor.execute(query, values)
-                    activities_added += 1
-                    
-                    # Update last_login time for the user
-                    update_query = """
-                    UPDATE users SET last_login = %s WHERE user_id = %s
-                    """
-                    cursor.execute(update_query, (timestamp.strftime('%Y-%m-%d %H:%M:%S'), user_id))
-                    
-                    # Commit after every 100 inserts
-                    if activities_added % 100 == 0:
-                        conn.commit()
-                        logger.info(f"Added {activities_added} activities")
-                except mysql.connector.Error as err:
-                    logger.error(f"Error adding activity: {err}")
+                # Track the latest activity per user for last_login
+                if user_id not in last_logins or timestamp > last_logins[user_id]:
+                    last_logins[user_id] = timestamp
+                
+                # Write and commit every 100 activities in one statement
+                if len(batch) >= 100:
+                    activities_added += _insert_activity_batch(cursor, batch)
+                    conn.commit()
+                    logger.info(f"Added {activities_added} activities")
+                    batch = []
+    
+    activities_added += _insert_activity_batch(cursor, batch)
+    
+    # Update last_login time once per user
+    try:
+        update_query = """
+        UPDATE users SET last_login = %s WHERE user_id = %s
+        """
+        cursor.executemany(update_query, [
+            (timestamp.strftime('%Y-%m-%d %H:%M:%S'), user_id)
+            for user_id, timestamp in last_logins.items()
+        ])
+    except mysql.connector.Error as err:
+        logger.error(f"Error updating last_login: {err}")
     
     # Final commit
     conn.commit()
     logger.info(f"Added a total of {activities_added} user activities")
     cursor.close()
 
+def _insert_activity_batch(cursor, batch):
+    """Insert a batch of activity tuples in one multi-row statement"""
+    if not batch:
+        return 0
+        
+    query = """
+    INSERT INTO user_activities 
+    (user_id, activity_type, resource_accessed, ip_address, user_agent, timestamp) 
+    VALUES (%s, %s, %s, %s, %s, %s)
+    """
+    
+    try:
+        cursor.executemany(query, batch)
+        return len(batch)
+    except mysql.connector.Error as err:
+        logger.error(f"Error adding activities: {err}")
+        return 0
+
 def seed_alerts(conn, alert_percentage=0.05, clear_existing=False):
     """Seed alert data into the database"""
     cursor = conn.cursor()
@@ -391,17 +442,17 @@ def seed_alerts(conn, alert_percentage=0.05, clear_existing=False):
         cursor.close()
         return
     
-    # Get all activities
-    cursor.execute("""
-    SELECT activity_id, user_id, activity_type, resource_accessed, ip_address, timestamp 
-    FROM user_activities
-    """)
-    
-    activities = cursor.fetchall()
+    # Stream a sample of the activities rather than loading them all
+    activities = stream_sample(
+        'user_activities',
+        ['activity_id', 'user_id', 'activity_type', 'resource_accessed', 'ip_address', 'timestamp'],
+        alert_percentage
+    )
     alerts_added = 0
+    pending = []
     
     # First create honeytoken access records, then use those to create alerts
-    for activity in random.sample(activities, int(len(activities) * alert_percentage)):
+    for activity in activities:
         activity_id, user_id, activity_type, resource, ip_address, timestamp = activity
         
         # Choose alert type and severity - make sure to use only valid enum values
@@ -425,13 +476,6 @@ def seed_alerts(conn, alert_percentage=0.05, clear_existing=False):
         # Randomly select a honeytoken
         token_id = random.randint(1, len(HONEYTOKENS))
         
-        # First create a honeytoken access record
-        honeytoken_query = """
-        INSERT INTO honeytoken_access 
-        (token_id, user_id, ip_address, user_agent, access_time, access_method, is_authorized, access_duration, additional_context) 
-        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
-        """
-        
         # Choose a user agent
         user_agent = random.choice(USER_AGENTS)
         
@@ -462,46 +506,67 @@ def seed_alerts(conn, alert_percentage=0.05, clear_existing=False):
             additional_context
         )
         
-        try:
-            cursor.execute(honeytoken_query, honeytoken_values)
-            access_id = cursor.lastrowid  # Get the auto-generated access_id
-            
-            # Now create an alert with this access_id
-            # 30% of alerts are resolved
-            is_resolved = random.random() < 0.3
-            
-            alert_query = """
-            INSERT INTO alerts 
-            (user_id, alert_type, severity, timestamp, description, is_resolved, token_id, access_id) 
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-            """
-            
-            alert_values = (
-                user_id,
-                alert_type,
-                severity,
-                timestamp.strftime('%Y-%m-%d %H:%M:%S'),
-                description,
-                is_resolved,
-                token_id,
-                access_id
-            )
-            
-            cursor.execute(alert_query, alert_values)
-            alerts_added += 1
-            
-            # Commit after every 20 inserts
-            if alerts_added % 20 == 0:
-                conn.commit()
-                logger.info(f"Added {alerts_added} alerts")
-        except mysql.connector.Error as err:
-            logger.error(f"Error adding alert: {err}")
+        # 30% of alerts are resolved
+        is_resolved = random.random() < 0.3
+        
+        alert_values = (
+            user_id,
+            alert_type,
+            severity,
+            timestamp.strftime('%Y-%m-%d %H:%M:%S'),
+            description,
+            is_resolved,
+            token_id
+        )
+        
+        pending.append((honeytoken_values, alert_values))
+        
+        # Write and commit every 20 alerts
+        if len(pending) >= 20:
+            alerts_added += _insert_alert_batch(cursor, pending)
+            conn.commit()
+            logger.info(f"Added {alerts_added} alerts")
+            pending = []
+    
+    alerts_added += _insert_alert_batch(cursor, pending)
     
     # Final commit
     conn.commit()
     logger.info(f"Added a total of {alerts_added} alerts")
     cursor.close()
 
+def _insert_alert_batch(cursor, pending):
+    """Insert honeytoken access records and their alerts, one statement per table"""
+    if not pending:
+        return 0
+        
+    honeytoken_query = """
+    INSERT INTO honeytoken_access 
+    (token_id, user_id, ip_address, user_agent, access_time, access_method, is_authorized, access_duration, additional_context) 
+    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+    """
+    
+    alert_query = """
+    INSERT INTO alerts 
+    (user_id, alert_type, severity, timestamp, description, is_resolved, token_id, access_id) 
+    VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+    """
+    
+    try:
+        # First create the honeytoken access records
+        cursor.executemany(honeytoken_query, [honeytoken_values for honeytoken_values, _ in pending])
+        first_access_id = cursor.lastrowid  # IDs of a multi-row insert are consecutive
+        
+        # Now create the alerts with those access_ids
+        cursor.executemany(alert_query, [
+            alert_values + (first_access_id + offset,)
+            for offset, (_, alert_values) in enumerate(pending)
+        ])
+        return len(pending)
+    except mysql.connector.Error as err:
+        logger.error(f"Error adding alerts: {err}")
+        return 0
+
 def seed_anomaly_scores(conn, anomaly_percentage=0.10, clear_existing=False):
     """Seed anomaly score data into the database"""
     cursor = conn.cursor()
@@ -522,17 +587,17 @@ def seed_anomaly_scores(conn, anomaly_percentage=0.10, clear_existing=False):
         cursor.close()
         return
     
-    # Get all activities
-    cursor.execute("""
-    SELECT activity_id, user_id, activity_type, timestamp 
-    FROM user_activities
-    """)
-    
-    activities = cursor.fetchall()
+    # Stream a sample of the activities rather than loading them all
+    activities = stream_sample(
+        'user_activities',
+        ['activity_id', 'user_id', 'activity_type', 'timestamp'],
+        anomaly_percentage
+    )
     anomalies_added = 0
+    batch = []
     
     # For a percentage of activities, generate anomaly scores
-    for activity in random.sample(activities, int(len(activities) * anomaly_percentage)):
+    for activity in activities:
         activity_id, user_id, activity_type, timestamp = activity
         
         # Generate several anomaly records for different features
@@ -564,12 +629,6 @@ def seed_anomaly_scores(conn, anomaly_percentage=0.10, clear_existing=False):
             if random.random() > 0.7:
                 continue
                 
-            query = """
-            INSERT INTO anomaly_scores 
-            (user_id, activity_id, feature_name, expected_value, actual_value, anomaly_score, timestamp) 
-            VALUES (%s, %s, %s, %s, %s, %s, %s)
-            """
-            
             # Generate anomaly score based on difference between expected and actual
             diff = abs(values["actual"] - values["expected"])
             normalized_diff = min(diff / values["expected"], 1.0)  # Normalize to 0-1
@@ -587,22 +646,40 @@ def seed_anomaly_scores(conn, anomaly_percentage=0.10, clear_existing=False):
                 timestamp.strftime('%Y-%m-%d %H:%M:%S')
             )
             
-            try:
-                cursor.execute(query, values_tuple)
-                anomalies_added += 1
-                
-                # Commit after every 50 inserts
-                if anomalies_added % 50 == 0:
-                    conn.commit()
-                    logger.info(f"Added {anomalies_added} anomaly scores")
-            except mysql.connector.Error as err:
-                logger.error(f"Error adding anomaly score: {err}")
+            batch.append(values_tuple)
+            
+            # Write and commit every 50 scores in one statement
+            if len(batch) >= 50:
+                anomalies_added += _insert_anomaly_batch(cursor, batch)
+                conn.commit()
+                logger.info(f"Added {anomalies_added} anomaly scores")
+                batch = []
+    
+    anomalies_added += _insert_anomaly_batch(cursor, batch)
     
     # Final commit
     conn.commit()
     logger.info(f"Added a total of {anomalies_added} anomaly scores")
     cursor.close()
 
+def _insert_anomaly_batch(cursor, batch):
+    """Insert a batch of anomaly score tuples in one multi-row statement"""
+    if not batch:
+        return 0
+        
+    query = """
+    INSERT INTO anomaly_scores 
+    (user_id, activity_id, feature_name, expected_value, actual_value, anomaly_score, timestamp) 
+    VALUES (%s, %s, %s, %s, %s, %s, %s)
+    """
+    
+    try:
+        cursor.executemany(query, batch)
+        return len(batch)
+    except mysql.connector.Error as err:
+        logger.error(f"Error adding anomaly scores: {err}")
+        return 0
+
 def seed_behavioral_baselines(conn, clear_existing=False):
     """Seed behavioral baseline data into the database"""
     cursor = conn.cursor()
@@ -638,6 +715,7 @@ def seed_behavioral_baselines(conn, clear_existing=False):
     }
     
     baselines_added = 0
+    batch = []
     
     # For each user, add behavioral baselines
     for user_id in USER_PROFILES.keys():
@@ -659,25 +737,26 @@ def seed_behavioral_baselines(conn, clear_existing=False):
             # Generate timestamp for when the baseline was last updated
             last_updated = datetime.now() - timedelta(days=random.randint(1, 14))
             
-            query = """
-            INSERT INTO behavioral_baselines 
-            (user_id, feature_name, feature_value, confidence_score, last_updated) 
-            VALUES (%s, %s, %s, %s, %s)
-            """
-            
-            values = (
+            batch.append((
                 user_id,
                 feature_name,
                 feature_value,
                 confidence_score,
                 last_updated.strftime('%Y-%m-%d %H:%M:%S')
-            )
-            
-            try:
-                cursor.execute(query, values)
-                baselines_added += 1
-            except mysql.connector.Error as err:
-                logger.error(f"Error adding behavioral baseline: {err}")
+            ))
+    
+    query = """
+    INSERT INTO behavioral_baselines 
+    (user_id, feature_name, feature_value, confidence_score, last_updated) 
+    VALUES (%s, %s, %s, %s, %s)
+    """
+    
+    # Insert all baselines in one statement
+    try:
+        cursor.executemany(query, batch)
+        baselines_added = len(batch)
+    except mysql.connector.Error as err:
+        logger.error(f"Error adding behavioral baselines: {err}")
     
     # Commit changes
     conn.commit()
@@ -7,6 +7,9 @@ import time
 from datetime import datetime, timedelta
 from functools import wraps
 from ..db.database import get_db
+from ..db.write_behind import resolve_id
+from ..db import queries
+from ..db.pagination import InvalidCursor, after, decode_cursor, next_cursor
 from ..models.honeytoken import Honeytoken, create_honeytoken, FileHoneytoken, DatabaseHoneytoken, APIKeyHoneytoken, CredentialsHoneytoken
 from ..models.ueba import get_ueba_engine
 from ..models.alert import Alert, get_alert_manager
@@ -97,7 +100,32 @@ def settings_ui():
 def ping():
     """Simple endpoint for connection testing"""
     logger.info(f"Ping request received - IP: {request.remote_addr}")
-    return jsonify({'status': 'ok', 'message': 'API is running'})
+    
+    # Report the database circuit breaker state
+    breaker = get_db().breaker_state()
+    
+    return jsonify({
+        'status': 'ok' if breaker['state'] == 'closed' else 'degraded',
+        'message': 'API is running',
+        'database': breaker
+    })
+
+@app.route('/api/db/stats', methods=['GET'])
+@require_api_key
+def get_db_stats():
+    """Per-query latency histograms, row counts and pool wait times"""
+    top = request.args.get('top', 50, type=int)
+    sort = request.args.get('sort', 'total_ms')
+    if sort not in ('total_ms', 'avg_ms', 'max_ms', 'calls', 'rows', 'errors', 'pool_wait_ms'):
+        return jsonify({'error': f"Invalid sort key: {sort}"}), 400
+    
+    db = get_db()
+    if request.args.get('reset', '').lower() == 'true':
+        stats = db.query_stats(top=top, sort=sort)
+        db.metrics.reset()
+        return jsonify(stats)
+        
+    return jsonify(db.query_stats(top=top, sort=sort))
 
 @app.route('/api/honeytokens', methods=['GET'])
 @require_api_key
@@ -281,13 +309,20 @@ def get_alerts():
     severity = request.args.get('severity')
     limit = int(request.args.get('limit', 100))
     offset = int(request.args.get('offset', 0))
+    cursor = request.args.get('cursor')
+    if cursor and 'offset' in request.args:
+        return jsonify({'error': "Pass either offset or cursor, not both"}), 400
     
-    alerts = Alert.get_all(
-        resolved=resolved,
-        severity=severity,
-        limit=limit,
-        offset=offset
-    )
+    try:
+        alerts = Alert.get_all(
+            resolved=resolved,
+            severity=severity,
+            limit=limit,
+            offset=offset,
+            cursor=cursor
+        )
+    except InvalidCursor as e:
+        return jsonify({'error': str(e)}), 400
     
     # Convert to JSON serializable format
     result = []
@@ -306,7 +341,12 @@ def get_alerts():
             'resolution_notes': alert.resolution_notes
         })
     
-    return jsonify(result)
+    # Pass X-Next-Cursor back as ?cursor= for the next page
+    response = jsonify(result)
+    page_cursor = next_cursor(alerts, limit, 'timestamp', 'alert_id')
+    if page_cursor:
+        response.headers['X-Next-Cursor'] = page_cursor
+    return response
 
 @app.route('/api/alerts/recent', methods=['GET'])
 @require_api_key
@@ -319,16 +359,7 @@ def get_recent_alerts():
         from_time = datetime.now() - timedelta(hours=hours)
         
         db = get_db()
-        recent_alerts = db.fetch_all("""
-            SELECT 
-                a.alert_id as id, a.description as title, a.description, a.severity, 
-                a.timestamp, a.is_resolved as status, a.user_id, u.username
-            FROM alerts a
-            LEFT JOIN users u ON a.user_id = u.user_id
-            WHERE a.timestamp > %s
-            ORDER BY a.timestamp DESC
-            LIMIT 50
-        """, (from_time,))
+        recent_alerts = db.fetch_all(queries.RECENT_ALERTS, (from_time,))
         
         for alert in recent_alerts:
             # Format timestamp for display
@@ -352,12 +383,7 @@ def get_alert_summary():
         from_date = datetime.now() - timedelta(days=days)
         
         db = get_db()
-        summary = db.fetch_all("""
-            SELECT severity, COUNT(*) as count 
-            FROM alerts 
-            WHERE timestamp > %s 
-            GROUP BY severity
-        """, (from_date,))
+        summary = db.fetch_all(queries.ALERT_SUMMARY, (from_date,))
         
         # Transform to a more usable format
         result = {
@@ -414,7 +440,8 @@ def resolve_alert(alert_id):
     if not alert or not alert.alert_id:
         return jsonify({"error": f"Alert with ID {alert_id} not found"}), 404
         
-    alert.resolve(user_id, notes)
+    if not alert.resolve(user_id, notes):
+        return jsonify({"error": f"Failed to resolve alert {alert_id}"}), 500
     
     return jsonify({"message": "Alert resolved successfully"})
 
@@ -516,24 +543,7 @@ def get_risky_users():
         logger.info(f"Request: GET /api/users/risky - IP: {request.remote_addr}")
         
         db = get_db()
-        risky_users = db.fetch_all("""
-            SELECT u.user_id, u.username, u.department, u.role, 
-                   MAX(a.severity) as highest_severity,
-                   COUNT(a.alert_id) as alert_count
-            FROM users u
-            JOIN alerts a ON u.user_id = a.user_id
-            WHERE a.is_resolved = FALSE
-            GROUP BY u.user_id, u.username, u.department, u.role
-            ORDER BY 
-                CASE 
-                    WHEN MAX(a.severity) = 'critical' THEN 1
-                    WHEN MAX(a.severity) = 'high' THEN 2
-                    WHEN MAX(a.severity) = 'medium' THEN 3
-                    ELSE 4
-                END, 
-                COUNT(a.alert_id) DESC
-            LIMIT 5
-        """)
+        risky_users = db.fetch_all(queries.RISKY_USERS)
         
         return jsonify(risky_users)
     except Exception as e:
@@ -550,28 +560,16 @@ def get_user_stats():
         db = get_db()
         
         # Get total users count
-        total_users = db.fetch_one("SELECT COUNT(*) as count FROM users")
+        total_users = db.fetch_one(queries.USER_COUNT)
         
         # Get active users (active in last 7 days)
-        active_users = db.fetch_one("""
-            SELECT COUNT(DISTINCT user_id) as count 
-            FROM user_activities 
-            WHERE timestamp > DATE_SUB(NOW(), INTERVAL 7 DAY)
-        """)
+        active_users = db.fetch_one(queries.ACTIVE_USER_COUNT)
         
         # Get admin users count
-        admin_users = db.fetch_one("""
-            SELECT COUNT(*) as count 
-            FROM users 
-            WHERE role = 'admin'
-        """)
+        admin_users = db.fetch_one(queries.ADMIN_USER_COUNT)
         
         # Get users with open alerts
-        risky_users = db.fetch_one("""
-            SELECT COUNT(DISTINCT user_id) as count 
-            FROM alerts 
-            WHERE is_resolved = FALSE
-        """)
+        risky_users = db.fetch_one(queries.USERS_WITH_OPEN_ALERTS)
         
         return jsonify({
             'total': total_users.get('count', 0),
@@ -616,26 +614,46 @@ def log_user_activity():
         
     return jsonify({
         "message": "Activity processed successfully",
-        "activity_id": result['activity_id'],
+        # None while the activity is still queued for write-behind
+        "activity_id": resolve_id(result['activity_id']),
         "anomaly_score": result['analysis']['overall_score']
     })
 
+@app.route('/api/ueba/baselines/invalidate', methods=['POST'])
+@require_api_key
+def invalidate_baselines():
+    """Drop cached behavior profiles after baselines were changed outside the engine
+    
+    Invalidates one user with {"user_id": ...}, every user without a body.
+    """
+    data = request.get_json(silent=True) or {}
+    user_id = data.get('user_id')
+    get_ueba_engine().invalidate_profile(user_id)
+    
+    return jsonify({"message": f"Invalidated cached profile of {'user ' + str(user_id) if user_id else 'all users'}"})
+
 @app.route('/api/ueba/activities/<int:user_id>', methods=['GET'])
 @require_api_key
 def get_user_activities(user_id):
-    """Get recent activities for a user"""
+    """Get recent activities for a user, newest first (paged with ?cursor=)"""
     db = get_db()
     days = int(request.args.get('days', 30))
     limit = int(request.args.get('limit', 100))
     
-    query = """
-    SELECT * FROM user_activities
-    WHERE user_id = %s AND timestamp > DATE_SUB(NOW(), INTERVAL %s DAY)
-    ORDER BY timestamp DESC
-    LIMIT %s
-    """
+    conditions = "user_id = %s AND timestamp > DATE_SUB(NOW(), INTERVAL %s DAY)"
+    params = [user_id, days]
+    
+    cursor = request.args.get('cursor')
+    if cursor:
+        try:
+            condition, cursor_params = after(decode_cursor(cursor), 'timestamp', 'activity_id')
+        except InvalidCursor as e:
+            return jsonify({'error': str(e)}), 400
+        conditions += " AND " + condition
+        params.extend(cursor_params)
     
-    activities = db.fetch_all(query, (user_id, days, limit))
+    activities = db.fetch_all(queries.USER_ACTIVITIES_PAGE.format(conditions=conditions), params + [limit])
+    page_cursor = next_cursor(activities, limit, 'timestamp', 'activity_id')
     
     # Convert datetime objects to strings
     for activity in activities:
@@ -643,7 +661,10 @@ def get_user_activities(user_id):
             if isinstance(value, datetime):
                 activity[key] = value.isoformat()
     
-    return jsonify(activities)
+    response = jsonify(activities)
+    if page_cursor:
+        response.headers['X-Next-Cursor'] = page_cursor
+    return response
 
 # Utility functions for the API
 
@@ -667,26 +688,23 @@ def get_activities():
         limit = request.args.get('limit', 500, type=int)     # Increase default limit to 500
         db = get_db()
         
-        # Update query to use resource_accessed instead of resource and action_details instead of details
-        activities = db.fetch_all("""
-            SELECT ua.activity_id as id, ua.user_id, u.username, ua.activity_type, 
-                   ua.resource_accessed as resource, ua.ip_address, ua.timestamp, 
-                   COALESCE(anoms.anomaly_score, 0) as anomaly_score,
-                   ua.action_details as details
-            FROM user_activities ua
-            LEFT JOIN users u ON ua.user_id = u.user_id
-            LEFT JOIN (
-                SELECT activity_id, AVG(anomaly_score) as anomaly_score
-                FROM anomaly_scores
-                GROUP BY activity_id
-            ) anoms ON ua.activity_id = anoms.activity_id
-            WHERE ua.timestamp > DATE_SUB(NOW(), INTERVAL %s HOUR)
-            ORDER BY ua.timestamp DESC
-            LIMIT %s
-        """, (hours, limit))
-        
-        # Convert datetime objects to strings
+        conditions = "ua.timestamp > DATE_SUB(NOW(), INTERVAL %s HOUR)"
+        params = [hours]
+        
+        cursor = request.args.get('cursor')
+        if cursor:
+            try:
+                condition, cursor_params = after(decode_cursor(cursor), 'ua.timestamp', 'ua.activity_id')
+            except InvalidCursor as e:
+                return jsonify({'error': str(e)}), 400
+            conditions += " AND " + condition
+            params.extend(cursor_params)
+        
+        activities = db.fetch_all(queries.ACTIVITIES_PAGE.format(conditions=conditions), params + [limit])
+        page_cursor = next_cursor(activities, limit, 'timestamp', 'id')
+        
         for activity in activities:
+            # Convert datetime objects to strings
             for key, value in activity.items():
                 if isinstance(value, datetime):
                     activity[key] = value.isoformat()
@@ -698,7 +716,11 @@ def get_activities():
                         except:
                             pass
         
-        return jsonify(activities)
+        # Pass X-Next-Cursor back as ?cursor= for the next page
+        response = jsonify(activities)
+        if page_cursor:
+            response.headers['X-Next-Cursor'] = page_cursor
+        return response
     except Exception as e:
         logger.error(f"Error in get_activities: {str(e)}")
         return jsonify({'error': 'Internal server error'}), 500
@@ -714,28 +736,13 @@ def get_activity_stats():
         db = get_db()
         
         # Get total activities
-        total_activities = db.fetch_one("""
-            SELECT COUNT(*) as count
-            FROM user_activities
-            WHERE timestamp > DATE_SUB(NOW(), INTERVAL %s HOUR)
-        """, (hours,))
+        total_activities = db.fetch_one(queries.ACTIVITY_COUNT, (hours,))
         
         # Get anomalous activities (score > 0.5)
-        anomalous_activities = db.fetch_one("""
-            SELECT COUNT(*) as count
-            FROM user_activities ua
-            JOIN anomaly_scores ans ON ua.activity_id = ans.activity_id
-            WHERE ua.timestamp > DATE_SUB(NOW(), INTERVAL %s HOUR)
-            AND ans.anomaly_score > 0.5
-        """, (hours,))
+        anomalous_activities = db.fetch_one(queries.ANOMALOUS_ACTIVITY_COUNT, (hours, hours))
         
         # Get average anomaly score
-        avg_score = db.fetch_one("""
-            SELECT AVG(ans.anomaly_score) as avg_score
-            FROM user_activities ua
-            JOIN anomaly_scores ans ON ua.activity_id = ans.activity_id
-            WHERE ua.timestamp > DATE_SUB(NOW(), INTERVAL %s HOUR)
-        """, (hours,))
+        avg_score = db.fetch_one(queries.AVG_ANOMALY_SCORE, (hours, hours))
         
         total = total_activities.get('count', 0)
         anomalous = anomalous_activities.get('count', 0)
@@ -761,19 +768,12 @@ def get_anomaly_distribution():
         db = get_db()
         
         # Get anomaly score distribution
-        scores = db.fetch_all("""
-            SELECT ROUND(anomaly_score, 1) as score_range, COUNT(*) as count
-            FROM user_activities ua
-            JOIN anomaly_scores ans ON ua.activity_id = ans.activity_id
-            WHERE ua.timestamp > DATE_SUB(NOW(), INTERVAL %s HOUR)
-            GROUP BY ROUND(anomaly_score, 1)
-            ORDER BY ROUND(anomaly_score, 1)
-        """, (hours,))
+        scores = db.fetch_all(queries.ANOMALY_DISTRIBUTION, (hours, hours), result='columns')
         
         # Convert to dictionary with score range as key
         distribution = {}
-        for item in scores:
-            distribution[str(item['score_range'])] = item['count']
+        if scores:
+            distribution = dict(zip(map(str, scores['score_range'].tolist()), scores['count'].tolist()))
         
         return jsonify(distribution)
     except Exception as e:
@@ -0,0 +1,279 @@
+import os
+import re
+import sqlite3
+import logging
+import threading
+from datetime import datetime, date
+from decimal import Decimal
+from functools import lru_cache
+import mysql.connector
+from mysql.connector import errors
+
+logger = logging.getLogger('database')
+
+SQLITE_SCHEMA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'schema_sqlite.sql')
+
+class MySQLBackend:
+    """MySQL server reached through mysql.connector (the default backend)"""
+
+    name = 'mysql'
+
+    def __init__(self, host, user, password, database):
+        self.host = host
+        self.user = user
+        self.password = password
+        self.database = database
+
+    def connect(self):
+        """Open a new autocommit connection"""
+        return mysql.connector.connect(
+            host=self.host,
+            user=self.user,
+            passwd=self.password,
+            database=self.database,
+            use_pure=True,  # Use pure Python implementation for better stability
+            connection_timeout=30,
+            autocommit=True  # Statements outside transaction() commit on their own
+        )
+
+    def describe(self):
+        return f"MySQL database '{self.database}' on {self.host}"
+
+class SQLiteBackend:
+    """Embedded SQLite database file in WAL mode, for single-node deployments and test rigs
+
+    Its connections implement the part of the mysql.connector connection API
+    that Database uses, so pooling, transactions, retries and metrics work
+    unchanged. Queries keep being written in MySQL dialect and are translated
+    (placeholders, NOW(), DATE_SUB(NOW(), INTERVAL n UNIT) and MOD()), and sqlite3
+    errors are raised as the matching mysql.connector errors: a locked
+    database is an OperationalError, so it is retried like a deadlock.
+    The schema is created on first use of an empty file, and pending
+    migrations are applied whenever a file is first opened.
+    """
+
+    name = 'sqlite'
+
+    def __init__(self, path, busy_timeout=5.0):
+        self.path = path
+        self.busy_timeout = busy_timeout
+        self._schema_lock = threading.Lock()
+        self._schema_checked = False
+
+    def connect(self):
+        """Open a new connection (usable from any thread, one at a time)"""
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        try:
+            raw = sqlite3.connect(self.path, timeout=self.busy_timeout,
+                                  isolation_level=None, check_same_thread=False)
+            # WAL lets readers run alongside the single writer; NORMAL sync is durable in WAL mode
+            raw.execute("PRAGMA journal_mode=WAL")
+            raw.execute("PRAGMA synchronous=NORMAL")
+            self._ensure_schema(raw)
+        except sqlite3.Error as e:
+            raise translate_error(e) from e
+
+        return SQLiteConnection(raw)
+
+    def _ensure_schema(self, raw):
+        with self._schema_lock:
+            if self._schema_checked:
+                return
+            if not raw.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'users'").fetchone():
+                with open(SQLITE_SCHEMA_PATH) as f:
+                    raw.executescript(f.read())
+                logger.info(f"Created SQLite schema in {self.path}")
+            self._apply_migrations(raw)
+            self._schema_checked = True
+
+    def _apply_migrations(self, raw):
+        """Bring the file up to date with src/db/migrations, as run.py --migrate would
+
+        SQLite DDL is transactional, so each migration and its schema_migrations
+        row commit together.
+        """
+        # Imported here: migrate imports database, which imports this module
+        from .migrate import list_migrations, split_statements
+
+        raw.execute("""
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+                version INT PRIMARY KEY,
+                name VARCHAR(255) NOT NULL,
+                applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        done = {row[0] for row in raw.execute("SELECT version FROM schema_migrations")}
+
+        for version, name, path in list_migrations(self.name):
+            if version in done:
+                continue
+            with open(path) as f:
+                statements = split_statements(f.read())
+            raw.execute("BEGIN IMMEDIATE")
+            try:
+                for statement in statements:
+                    raw.execute(statement)
+                raw.execute("INSERT INTO schema_migrations (version, name) VALUES (?, ?)", (version, name))
+                raw.execute("COMMIT")
+            except sqlite3.Error:
+                raw.execute("ROLLBACK")
+                raise
+            logger.info(f"Applied migration {version:03d}_{name} to {self.path}")
+
+    def describe(self):
+        return f"SQLite database {self.path}"
+
+_INTERVAL = re.compile(r"DATE_SUB\(\s*NOW\(\)\s*,\s*INTERVAL\s+(%s|\d+)\s+(SECOND|MINUTE|HOUR|DAY)\s*\)", re.IGNORECASE)
+_NOW = re.compile(r"\bNOW\(\)", re.IGNORECASE)
+_MOD = re.compile(r"\bMOD\(\s*([\w.]+)\s*,\s*(%s|\d+)\s*\)", re.IGNORECASE)
+
+@lru_cache(maxsize=1024)
+def translate(query):
+    """Rewrite a MySQL-dialect statement for SQLite"""
+    def interval(match):
+        amount = '?' if match.group(1) == '%s' else match.group(1)
+        return f"datetime('now', 'localtime', '-' || {amount} || ' {match.group(2).lower()}s')"
+
+    query = _INTERVAL.sub(interval, query)
+    query = _NOW.sub("datetime('now', 'localtime')", query)
+    # SQLite's mod() is optional (math functions) and returns a float; % is integer modulo
+    query = _MOD.sub(lambda match: f"({match.group(1)} % {match.group(2)})", query)
+    return query.replace('%s', '?')
+
+def translate_error(error):
+    """The mysql.connector error matching a sqlite3 error"""
+    message = str(error)
+    if isinstance(error, sqlite3.OperationalError):
+        if 'locked' in message or 'busy' in message:
+            return errors.OperationalError(msg=message)
+        if 'unable to open' in message or 'disk I/O' in message:
+            return errors.InterfaceError(msg=message)
+        return errors.ProgrammingError(msg=message)
+    if isinstance(error, sqlite3.IntegrityError):
+        return errors.IntegrityError(msg=message)
+    if isinstance(error, (sqlite3.ProgrammingError, sqlite3.InterfaceError)):
+        return errors.ProgrammingError(msg=message)
+    return errors.DatabaseError(msg=message)
+
+def _adapt(value):
+    """Store parameters the way MySQL would compare them"""
+    if isinstance(value, datetime):
+        return value.strftime('%Y-%m-%d %H:%M:%S')
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, bool):
+        return int(value)
+    if isinstance(value, Decimal):
+        return float(value)
+    return value
+
+_DATETIME = re.compile(r"^\d{4}-\d{2}-\d{2}[ T]\d{2}:\d{2}:\d{2}(\.\d+)?$")
+_DATE = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+
+def _convert(value):
+    """Return temporal values as datetime/date objects, as mysql.connector does"""
+    if isinstance(value, str):
+        if 19 <= len(value) <= 26 and _DATETIME.match(value):
+            return datetime.fromisoformat(value)
+        if len(value) == 10 and _DATE.match(value):
+            return date.fromisoformat(value)
+    return value
+
+class SQLiteCursor:
+    """sqlite3 cursor with mysql.connector cursor semantics"""
+
+    def __init__(self, cursor, dictionary=False):
+        self._cursor = cursor
+        self._dictionary = dictionary
+        self._columns = None
+        self._fetched = 0
+        self.lastrowid = None
+
+    def execute(self, query, params=()):
+        sql = translate(query)
+        try:
+            self._cursor.execute(sql, [_adapt(value) for value in params or ()])
+        except sqlite3.Error as e:
+            raise translate_error(e) from e
+
+        description = self._cursor.description
+        self._columns = [column[0] for column in description] if description else None
+        self._fetched = 0
+
+        self.lastrowid = self._cursor.lastrowid
+        if sql.lstrip()[:6].upper() == 'INSERT' and self._cursor.rowcount > 1:
+            # MySQL reports the first ID of a multi-row INSERT, SQLite the last
+            self.lastrowid = self._cursor.lastrowid - self._cursor.rowcount + 1
+
+    def _row(self, row):
+        values = tuple(_convert(value) for value in row)
+        return dict(zip(self._columns, values)) if self._dictionary else values
+
+    def fetchone(self):
+        row = self._cursor.fetchone()
+        if row is None:
+            return None
+        self._fetched += 1
+        return self._row(row)
+
+    def fetchmany(self, size=1):
+        rows = self._cursor.fetchmany(size)
+        self._fetched += len(rows)
+        return [self._row(row) for row in rows]
+
+    def fetchall(self):
+        rows = self._cursor.fetchall()
+        self._fetched += len(rows)
+        return [self._row(row) for row in rows]
+
+    @property
+    def rowcount(self):
+        # Like a buffered MySQL cursor, a SELECT reports the rows fetched so far
+        return self._cursor.rowcount if self._cursor.rowcount >= 0 else self._fetched
+
+    @property
+    def column_names(self):
+        return tuple(self._columns or ())
+
+    def close(self):
+        self._cursor.close()
+
+class SQLiteConnection:
+    """sqlite3 connection with the mysql.connector connection methods Database uses"""
+
+    def __init__(self, connection):
+        self._connection = connection
+
+    def cursor(self, dictionary=False, buffered=None):
+        return SQLiteCursor(self._connection.cursor(), dictionary=dictionary)
+
+    def _execute(self, statement):
+        try:
+            self._connection.execute(statement)
+        except sqlite3.Error as e:
+            raise translate_error(e) from e
+
+    def start_transaction(self):
+        # Take the write lock up front so the transaction can't fail halfway on a busy database
+        self._execute("BEGIN IMMEDIATE")
+
+    def commit(self):
+        if self._connection.in_transaction:
+            self._execute("COMMIT")
+
+    def rollback(self):
+        if self._connection.in_transaction:
+            self._execute("ROLLBACK")
+
+    def is_connected(self):
+        try:
+            self._connection.execute("SELECT 1")
+            return True
+        except sqlite3.Error:
+            return False
+
+    def close(self):
+        self._connection.close()
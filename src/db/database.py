@@ -1,9 +1,17 @@
-import mysql.connector
 import logging
 import os
 import time
-from mysql.connector import Error, pooling
+import threading
+from contextlib import contextmanager
+from mysql.connector import Error
+from mysql.connector.errors import PoolError
 from datetime import datetime
+from .pool import ConnectionPool
+from .retry import RetryPolicy, CircuitBreaker, CircuitOpenError, is_transient
+from .metrics import QueryMetrics
+from .write_behind import WriteBehindBuffer
+from .backends import MySQLBackend, SQLiteBackend
+from .results import RESULT_MODES, to_records, to_columns
 
 # Set up logging
 logging.basicConfig(
@@ -16,6 +24,14 @@ logging.basicConfig(
 )
 logger = logging.getLogger('database')
 
+class _Transaction:
+    """State of the transaction scope open on the current thread"""
+    
+    def __init__(self, connection):
+        self.connection = connection
+        self.depth = 0
+        self.failed = False
+
 class Database:
     def __init__(self, host=None, user=None, password=None, database=None):
         # Try to load credentials from .dbcredentials file if they exist
@@ -32,350 +48,667 @@ class Database:
             self.password = password or creds.get('DB_PASS', '123')
             self.database = database or creds.get('DB_NAME', 'honeytoken_ueba')
         else:
+            creds = {}
             self.host = host or 'localhost'
             self.user = user or 'root'
             self.password = password or '123'
             self.database = database or 'honeytoken_ueba'
         
-        self.connection = None
+        # Storage backend: a MySQL server (default) or an embedded SQLite file
+        if creds.get('DB_BACKEND', 'mysql').lower() == 'sqlite':
+            self.backend = SQLiteBackend(creds.get('DB_PATH', 'data/honeytoken.db'),
+                                         busy_timeout=float(creds.get('DB_SQLITE_BUSY_TIMEOUT', 5)))
+        else:
+            self.backend = MySQLBackend(self.host, self.user, self.password, self.database)
+        
+        # Chunking budget for insert_many(); keep well under max_allowed_packet
+        self.batch_max_rows = int(creds.get('DB_BATCH_MAX_ROWS', 500))
+        self.batch_max_bytes = int(creds.get('DB_BATCH_MAX_BYTES', 1024 * 1024))
+        
+        # Connection pool sizing; overflow connections are closed on release
+        self.pool_size = int(creds.get('DB_POOL_SIZE', 5))
+        self.pool_max_overflow = int(creds.get('DB_POOL_MAX_OVERFLOW', 5))
+        self.pool_timeout = float(creds.get('DB_POOL_TIMEOUT', 10))
+        
+        # Shared retry policy and circuit breaker for every operation
+        self.retry_policy = RetryPolicy(
+            max_attempts=int(creds.get('DB_RETRY_ATTEMPTS', 3)),
+            base_delay=float(creds.get('DB_RETRY_BASE_DELAY', 0.05)),
+            max_delay=float(creds.get('DB_RETRY_MAX_DELAY', 2.0)),
+            budget_ratio=float(creds.get('DB_RETRY_BUDGET_RATIO', 0.2))
+        )
+        self.breaker = CircuitBreaker(
+            failure_threshold=int(creds.get('DB_BREAKER_THRESHOLD', 5)),
+            reset_timeout=float(creds.get('DB_BREAKER_RESET', 30))
+        )
+        
+        # Idle connections (and get_db() liveness) are only re-checked after this long
+        self.ping_interval = float(creds.get('DB_PING_INTERVAL', 30))
+        self._last_success = None
+        
+        # Optional read replica (MySQL only); fetch_all()/fetch_one() read from it unless pinned to the primary
+        self.replica_host = creds.get('DB_REPLICA_HOST') if self.backend.name == 'mysql' else None
+        self.replica_user = creds.get('DB_REPLICA_USER', self.user)
+        self.replica_password = creds.get('DB_REPLICA_PASS', self.password)
+        self.replica_database = creds.get('DB_REPLICA_NAME', self.database)
+        self.replica_backend = None
+        if self.replica_host:
+            self.replica_backend = MySQLBackend(self.replica_host, self.replica_user,
+                                                self.replica_password, self.replica_database)
+        self.replica_breaker = CircuitBreaker(
+            failure_threshold=int(creds.get('DB_BREAKER_THRESHOLD', 5)),
+            reset_timeout=float(creds.get('DB_BREAKER_RESET', 30))
+        )
+        
+        # Per-statement latency metrics; slower statements also go to logs/slow_queries.log
+        self.metrics = QueryMetrics(slow_threshold=float(creds.get('DB_SLOW_QUERY_MS', 500)) / 1000)
+        
+        # Partitioning of user_activities/anomaly_scores (see partitions.py); 0 days keeps everything
+        self.partition_interval = creds.get('DB_PARTITION_INTERVAL', 'month')
+        self.partitions_ahead = int(creds.get('DB_PARTITIONS_AHEAD', 3))
+        self.retention_days = int(creds.get('DB_RETENTION_DAYS', 0))
+        
         self.pool = None
+        self.replica_pool = None
+        self._local = threading.local()
         self._setup_connection_pool()
         self.connect()
+        
+        # Opt-in write-behind for queue_insert()/queue_update(): writes return before they commit
+        self.write_behind = None
+        if creds.get('DB_WRITE_BEHIND', 'false').lower() in ('1', 'true', 'yes'):
+            self.write_behind = WriteBehindBuffer(
+                self,
+                max_queue=int(creds.get('DB_WRITE_BEHIND_QUEUE', 10000)),
+                flush_rows=int(creds.get('DB_WRITE_BEHIND_ROWS', 500)),
+                flush_interval=float(creds.get('DB_WRITE_BEHIND_INTERVAL', 0.5)),
+                put_timeout=float(creds.get('DB_WRITE_BEHIND_TIMEOUT', 5))
+            )
+            logger.info("Write-behind buffer enabled")
 
     def _setup_connection_pool(self):
         """Setup a connection pool for better handling of concurrent requests"""
-        try:
-            self.pool = pooling.MySQLConnectionPool(
-                pool_name="honeytoken_pool",
-                pool_size=5,
-                host=self.host,
-                user=self.user,
-                password=self.password,
-                database=self.database
+        self.pool = ConnectionPool(
+            self._open_connection,
+            size=self.pool_size,
+            max_overflow=self.pool_max_overflow,
+            timeout=self.pool_timeout,
+            validate=lambda connection: connection.is_connected(),
+            validate_after=self.ping_interval
+        )
+        logger.info(f"Connection pool created for {self.backend.describe()} "
+                    f"(size={self.pool_size}, max_overflow={self.pool_max_overflow})")
+        
+        if self.replica_host:
+            self.replica_pool = ConnectionPool(
+                lambda: self._open_connection(replica=True),
+                size=self.pool_size,
+                max_overflow=self.pool_max_overflow,
+                timeout=self.pool_timeout,
+                validate=lambda connection: connection.is_connected(),
+                validate_after=self.ping_interval
             )
-            logger.info(f"Connection pool created for MySQL database '{self.database}'")
-        except Error as e:
-            logger.error(f"Error creating connection pool: {e}")
-            self.pool = None
+            logger.info(f"Read replica pool created for MySQL host '{self.replica_host}'")
+
+    def _open_connection(self, replica=False):
+        """Open a new connection to the primary (or the read replica)"""
+        backend = self.replica_backend if replica else self.backend
+        connection = backend.connect()
+        logger.info(f"Connected to {'replica' if replica else 'primary'} {backend.describe()}")
+        return connection
+
+    def _acquire(self, replica=False):
+        """Check out a live connection from the pool, unless the circuit breaker is open"""
+        pool = self.replica_pool if replica else self.pool
+        breaker = self.replica_breaker if replica else self.breaker
+        
+        if not breaker.allow():
+            raise CircuitOpenError(f"Database {'replica' if replica else 'primary'} circuit breaker is open, failing fast")
+            
+        try:
+            return pool.acquire()
+        except PoolError:
+            # Every pooled connection is busy; that says nothing about the database
+            breaker.release_trial()
+            raise
+        except Error:
+            if not replica:
+                self._last_success = None
+            breaker.record_failure()
+            raise
+
+    def _release(self, connection, discard=False, replica=False):
+        """Return a connection to the pool"""
+        pool = self.replica_pool if replica else self.pool
+        pool.release(connection, discard=discard)
 
     def connect(self):
-        """Connect to the MySQL database"""
+        """Verify that the database is reachable through the pool"""
         try:
-            # Try to get a connection from the pool first
-            if self.pool:
-                try:
-                    self.connection = self.pool.get_connection()
-                    self.connection.autocommit = True
-                    logger.info(f"Connected to MySQL database '{self.database}' from pool")
-                    return True
-                except:
-                    logger.warning("Failed to get connection from pool, falling back to direct connection")
-                    # Continue to direct connection if pool connection fails
-            
-            # Direct connection if pool is not available or failed
-            if self.connection is None or not self.connection.is_connected():
-                self.connection = mysql.connector.connect(
-                    host=self.host,
-                    user=self.user,
-                    passwd=self.password,
-                    database=self.database,
-                    use_pure=True,  # Use pure Python implementation for better stability
-                    connection_timeout=30
-                )
-                # Set autocommit to True to avoid transaction issues
-                self.connection.autocommit = True
-                logger.info(f"Connected to MySQL database '{self.database}'")
-                return True
-            elif not self.connection.is_connected():
-                # Reconnect if connection was lost
-                self.connection.reconnect(attempts=3, delay=1)
-                logger.info(f"Reconnected to MySQL database '{self.database}'")
-                return True
+            connection = self._acquire()
         except Error as e:
-            logger.error(f"Error connecting to MySQL database: {e}")
+            logger.error(f"Error connecting to the database: {e}")
             return False
             
-        return self.connection.is_connected()
+        self._record_success()
+        self._release(connection)
+        return True
 
-    def ensure_connection(self):
-        """Ensure database connection is active, reconnect if needed"""
-        max_attempts = 3
-        attempt = 0
+    def _record_success(self, replica=False):
+        if replica:
+            self.replica_breaker.record_success()
+            return
+        self._last_success = time.monotonic()
+        self.breaker.record_success()
+
+    def is_connected(self):
+        """Check whether the database is usable
         
-        while attempt < max_attempts:
-            try:
-                if self.connection is None:
-                    return self.connect()
-                
-                if not self.connection.is_connected():
-                    # Connection lost, try to reconnect
-                    try:
-                        self.connection.ping(reconnect=True, attempts=3, delay=1)
-                        if self.connection.is_connected():
-                            logger.info(f"Reconnected to MySQL database '{self.database}'")
-                            return True
-                    except:
-                        # If ping with reconnect fails, try to establish a new connection
-                        return self.connect()
-                
-                return True
-            except Error as e:
-                logger.error(f"Error ensuring database connection (attempt {attempt+1}/{max_attempts}): {e}")
-                attempt += 1
-                time.sleep(1)  # Wait before retry
-                
-        # Last attempt - try to establish a fresh connection
+        A query that succeeded within the last ping_interval seconds counts as
+        proof of liveness, so this only goes to the server when things have
+        been quiet (or the last query failed with an I/O error).
+        """
+        last_success = self._last_success
+        if last_success is not None and time.monotonic() - last_success < self.ping_interval:
+            return True
         return self.connect()
 
     def disconnect(self):
-        """Disconnect from the database"""
-        if self.connection and self.connection.is_connected():
-            self.connection.close()
-            logger.info("Disconnected from MySQL database")
-            return True
-        return False
+        """Close all idle pooled connections, writing out queued writes first"""
+        self.flush_writes()
+        closed = self.pool.close_all()
+        if self.replica_pool:
+            closed += self.replica_pool.close_all()
+        if closed:
+            logger.info("Disconnected from the database")
+        return closed > 0
 
-    def execute_query(self, query, params=None):
-        """Execute a query without returning a result"""
-        cursor = None
-        attempt = 0
-        max_attempts = 3
+    def pool_stats(self):
+        """Connection pool occupancy, checkout and wait-time counters"""
+        stats = self.pool.stats()
+        if self.replica_pool:
+            stats['replica'] = self.replica_pool.stats()
+        return stats
+
+    def query_stats(self, top=None, sort='total_ms'):
+        """Per-statement latency, row and pool-wait aggregates, plus pool counters"""
+        stats = self.metrics.snapshot(top=top, sort=sort)
+        stats['pool'] = self.pool_stats()
+        if self.write_behind:
+            stats['write_behind'] = self.write_behind.stats()
+        return stats
+
+    def breaker_state(self):
+        """Circuit breaker state and retry budget, for health reporting"""
+        state = self.breaker.stats()
+        state['retry'] = self.retry_policy.stats()
+        if self.replica_pool:
+            state['replica'] = self.replica_breaker.stats()
+        return state
+
+    @contextmanager
+    def transaction(self):
+        """Run a block of statements as one transaction on one pooled connection
         
-        while attempt < max_attempts:
+        Every Database call made by this thread inside the block uses the same
+        connection and skips its per-statement commit. The transaction commits
+        once when the block exits, and rolls back if the block raises or any
+        statement inside it failed (check the yielded object's ``failed`` flag).
+        Nested scopes join the outermost one.
+        """
+        txn = getattr(self._local, 'transaction', None)
+        if txn is not None:
+            txn.depth += 1
             try:
-                if not self.ensure_connection():
-                    attempt += 1
-                    if attempt < max_attempts:
-                        time.sleep(1)
-                        continue
-                    return False
-                    
-                cursor = self.connection.cursor()
-                cursor.execute(query, params or ())
-                self.connection.commit()
-                return True
-            except Error as e:
-                logger.error(f"Error executing query (attempt {attempt+1}/{max_attempts}): {e}")
-                logger.error(f"Query: {query}")
-                logger.error(f"Params: {params}")
-                if self.connection and self.connection.is_connected():
-                    self.connection.rollback()
-                
-                attempt += 1
-                if attempt < max_attempts:
-                    time.sleep(1)
-                    # Reset the connection before retrying
-                    self.connect()
-                else:
-                    return False
+                yield txn
             finally:
-                if cursor:
-                    cursor.close()
+                txn.depth -= 1
+            return
+            
+        connection = self._acquire()
+        txn = _Transaction(connection)
+        self._local.transaction = txn
+        broken = False
+        try:
+            connection.start_transaction()
+            yield txn
+            
+            if txn.failed:
+                logger.warning("Rolling back transaction after a failed statement")
+                connection.rollback()
+            else:
+                connection.commit()
+            self._record_success()
+        except Exception as e:
+            txn.failed = True
+            # Report the outcome to the breaker even if no statement ran, or a
+            # half-open trial taken by _acquire() would never be resolved
+            transient = isinstance(e, Error) and is_transient(e)
+            try:
+                connection.rollback()
+            except Error as rollback_error:
+                logger.error(f"Error rolling back transaction: {rollback_error}")
+                broken = True
+                transient = transient or is_transient(rollback_error)
+            if transient:
+                self._last_success = None
+                self.breaker.record_failure()
+            else:
+                self._record_success()
+            raise
+        finally:
+            self._local.transaction = None
+            self._release(connection, discard=broken)
 
-    def fetch_all(self, query, params=None):
-        """Execute a query and return all results"""
-        cursor = None
+    def _run(self, query, params, handle_result, default, dictionary=False, action="executing query", replica=False):
+        """Execute one statement on a pooled connection and return handle_result(cursor)
+        
+        This is the single acquire/release path for every query. Inside a
+        transaction() scope the statement runs once on the transaction's
+        connection, and a failure marks the transaction for rollback. Otherwise
+        transient errors are retried under the shared retry policy, and the
+        circuit breaker fails the call fast while the database is down. Either
+        way, failures are logged and default is returned.
+        
+        With replica=True the statement goes to the read replica when one is
+        configured (never inside a transaction), falling back to the primary
+        if the replica is unavailable.
+        """
+        txn = getattr(self._local, 'transaction', None)
+        use_replica = replica and txn is None and self.replica_pool is not None
+        max_attempts = 1 if txn else self.retry_policy.max_attempts
         attempt = 0
-        max_attempts = 3
         
-        while attempt < max_attempts:
-            try:
-                if not self.ensure_connection():
-                    attempt += 1
-                    if attempt < max_attempts:
-                        time.sleep(1)
-                        continue
-                    return []
-                    
-                # Create a new connection for this query to avoid "commands out of sync"
+        self.retry_policy.record_request()
+        
+        # Timing for the query metrics, covering all attempts and backoff sleeps
+        started = time.monotonic()
+        pool_wait = 0.0
+        rows = 0
+        failed = True
+        
+        try:
+            while True:
                 connection = None
+                cursor = None
+                broken = False
+                on_replica = use_replica
                 try:
-                    if self.pool:
-                        connection = self.pool.get_connection()
+                    if txn:
+                        connection = txn.connection
                     else:
-                        connection = mysql.connector.connect(
-                            host=self.host,
-                            user=self.user,
-                            passwd=self.password,
-                            database=self.database
-                        )
-                    
-                    cursor = connection.cursor(dictionary=True)
+                        acquire_started = time.monotonic()
+                        connection = self._acquire(replica=on_replica)
+                        pool_wait += time.monotonic() - acquire_started
+                    cursor = connection.cursor(dictionary=dictionary)
                     cursor.execute(query, params or ())
-                    result = cursor.fetchall()
+                    result = handle_result(cursor)
+                    rows = max(cursor.rowcount, 0)
+                    failed = False
+                    self._record_success(replica=on_replica)
                     return result
-                finally:
-                    # Always close the cursor and specific connection
-                    if cursor:
-                        cursor.close()
-                    if connection and connection.is_connected():
-                        connection.close()
-            except Error as e:
-                logger.error(f"Error fetching data (attempt {attempt+1}/{max_attempts}): {e}")
-                logger.error(f"Query: {query}")
-                logger.error(f"Params: {params}")
-                
-                attempt += 1
-                if attempt < max_attempts:
-                    time.sleep(1)
-                else:
-                    return []
-
-    def fetch_one(self, query, params=None):
-        """Execute a query and return one result"""
-        cursor = None
-        attempt = 0
-        max_attempts = 3
-        
-        while attempt < max_attempts:
-            try:
-                if not self.ensure_connection():
-                    attempt += 1
-                    if attempt < max_attempts:
-                        time.sleep(1)
+                except CircuitOpenError as e:
+                    if on_replica:
+                        use_replica = False
                         continue
-                    return None
-                    
-                # Create a new connection for this query to avoid "commands out of sync"
-                connection = None
-                try:
-                    if self.pool:
-                        connection = self.pool.get_connection()
-                    else:
-                        connection = mysql.connector.connect(
-                            host=self.host,
-                            user=self.user,
-                            passwd=self.password,
-                            database=self.database
-                        )
+                    logger.warning(f"Skipped {action}: {e}")
+                    return default
+                except PoolError as e:
+                    if on_replica:
+                        use_replica = False
+                        continue
+                    # Not retried: the pool is saturated, not the database down
+                    logger.error(f"Skipped {action}: {e}")
+                    return default
+                except Error as e:
+                    if on_replica and is_transient(e):
+                        # Replica trouble shouldn't fail the read; go to the primary instead
+                        logger.warning(f"Read replica unavailable, {action} on primary: {e}")
+                        broken = True
+                        if connection is not None:
+                            self.replica_breaker.record_failure()
+                        use_replica = False
+                        continue
+                        
+                    logger.error(f"Error {action} (attempt {attempt+1}/{max_attempts}): {e}")
+                    logger.error(f"Query: {query}")
+                    logger.error(f"Params: {params}")
                     
-                    cursor = connection.cursor(dictionary=True)
-                    cursor.execute(query, params or ())
-                    result = cursor.fetchone()
-                    return result
+                    if txn:
+                        txn.failed = True
+                        return default
+                        
+                    if not is_transient(e):
+                        # The server answered, so the database itself is up
+                        self._record_success(replica=on_replica)
+                        return default
+                        
+                    # An I/O error: drop this connection so the retry reconnects, and
+                    # make the next liveness check go to the server. Failures to check
+                    # a connection out were already counted by _acquire()
+                    broken = True
+                    self._last_success = None
+                    if connection is not None:
+                        self.breaker.record_failure()
+                    attempt += 1
+                    if attempt >= max_attempts or not self.retry_policy.try_spend():
+                        return default
                 finally:
-                    # Always close the cursor and specific connection
                     if cursor:
-                        cursor.close()
-                    if connection and connection.is_connected():
-                        connection.close()
-            except Error as e:
-                logger.error(f"Error fetching data (attempt {attempt+1}/{max_attempts}): {e}")
-                logger.error(f"Query: {query}")
-                logger.error(f"Params: {params}")
-                
-                attempt += 1
-                if attempt < max_attempts:
-                    time.sleep(1)
-                else:
-                    return None
+                        try:
+                            cursor.close()
+                        except Error:
+                            broken = True
+                    if connection and not txn:
+                        self._release(connection, discard=broken, replica=on_replica)
+                        
+                time.sleep(self.retry_policy.backoff(attempt))
+        finally:
+            self.metrics.record(query, time.monotonic() - started, rows=rows, pool_wait=pool_wait,
+                                error=failed, attempts=attempt + 1)
 
-    def insert(self, table, data):
-        """Insert data into a table and return the ID"""
-        cursor = None
-        attempt = 0
-        max_attempts = 3
+    def execute_query(self, query, params=None):
+        """Execute a query without returning a result"""
+        return self._run(query, params, lambda cursor: True, False)
+
+    def fetch_all(self, query, params=None, primary=False, result='dict'):
+        """Execute a query and return all results
         
-        while attempt < max_attempts:
-            try:
-                if not self.ensure_connection():
-                    attempt += 1
-                    if attempt < max_attempts:
-                        time.sleep(1)
-                        continue
-                    return None
-                    
-                columns = ", ".join(data.keys())
-                placeholders = ", ".join(["%s"] * len(data))
-                query = f"INSERT INTO {table} ({columns}) VALUES ({placeholders})"
-                
-                cursor = self.connection.cursor()
-                cursor.execute(query, list(data.values()))
-                self.connection.commit()
-                
-                last_id = cursor.lastrowid
-                
-                logger.info(f"Data inserted into {table}, ID: {last_id}")
-                return last_id
-            except Error as e:
-                logger.error(f"Error inserting data (attempt {attempt+1}/{max_attempts}): {e}")
-                logger.error(f"Table: {table}")
-                logger.error(f"Data: {data}")
-                if self.connection and self.connection.is_connected():
-                    self.connection.rollback()
-                
-                attempt += 1
-                if attempt < max_attempts:
-                    time.sleep(1)
-                    # Reset the connection before retrying
-                    self.connect()
-                else:
-                    return None
-            finally:
-                if cursor:
-                    cursor.close()
+        Reads go to the read replica when one is configured. Pass primary=True
+        to read your own writes (replicas lag behind the primary).
+        
+        result picks the shape of the rows:
+        - 'dict' (default): a list of dicts
+        - 'tuple': a list of named tuples (row.column or row[i]), much lighter
+          than dicts for large results
+        - 'columns': {column: NumPy array}, for analytics over whole columns
+          (numeric columns are int64/float64, NULLs NaN); {} on failure
+        """
+        if result not in RESULT_MODES:
+            raise ValueError(f"Unknown result mode: {result}")
+        
+        if result == 'dict':
+            return self._run(query, params, lambda cursor: cursor.fetchall(), [],
+                             dictionary=True, action="fetching data", replica=not primary)
+        
+        shape = to_records if result == 'tuple' else to_columns
+        return self._run(query, params, lambda cursor: shape(cursor.column_names, cursor.fetchall()),
+                         [] if result == 'tuple' else {}, action="fetching data", replica=not primary)
 
-    def update(self, table, data, condition):
-        """Update data in a table"""
-        cursor = None
-        try:
-            if not self.ensure_connection():
-                return False
-                
-            set_clause = ", ".join([f"{key} = %s" for key in data.keys()])
-            where_clause = " AND ".join([f"{key} = %s" for key in condition.keys()])
+    def fetch_one(self, query, params=None, primary=False):
+        """Execute a query and return one result (see fetch_all for primary)"""
+        def first_row(cursor):
+            row = cursor.fetchone()
+            # Drain the rest so the connection goes back to the pool clean
+            cursor.fetchall()
+            return row
             
-            query = f"UPDATE {table} SET {set_clause} WHERE {where_clause}"
+        return self._run(query, params, first_row, None, dictionary=True,
+                         action="fetching data", replica=not primary)
+
+    def fetch_iter(self, query, params=None, batch_size=1000, primary=False, result='dict'):
+        """Stream the results of a query, yielding one dict per row
+        
+        Rows come from an unbuffered cursor on a dedicated connection (opened
+        outside the pool so a long scan never holds a pooled slot), fetched
+        batch_size at a time, so memory use stays flat however large the result
+        is. Like fetch_all, reads go to the replica unless primary=True; they
+        never see uncommitted writes of an open transaction().
+        
+        result='tuple' yields named tuples instead of dicts, and
+        result='columns' yields one {column: NumPy array} per batch.
+        
+        Unlike the other helpers it raises on failure (CircuitOpenError when
+        the circuit breaker is open, the database error otherwise, possibly
+        after rows were yielded), so a consumer can't mistake a broken-off
+        stream for a complete one.
+        """
+        if result not in RESULT_MODES:
+            raise ValueError(f"Unknown result mode: {result}")
             
-            cursor = self.connection.cursor()
-            cursor.execute(query, list(data.values()) + list(condition.values()))
-            self.connection.commit()
+        replica = not primary and self.replica_pool is not None
+        breaker = self.replica_breaker if replica else self.breaker
+        if not breaker.allow():
+            raise CircuitOpenError(f"Database {'replica' if replica else 'primary'} circuit breaker is open, failing fast")
             
-            affected_rows = cursor.rowcount
+        connection = None
+        cursor = None
+        started = time.monotonic()
+        elapsed = None
+        streamed = 0
+        failed = False
+        try:
+            connection = self._open_connection(replica=replica)
+            cursor = connection.cursor(dictionary=result == 'dict', buffered=False)
+            cursor.execute(query, params or ())
+            self._record_success(replica=replica)
             
-            logger.info(f"Data updated in {table}, {affected_rows} rows affected")
-            return affected_rows > 0
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                if elapsed is None:
+                    # Latency up to the first batch; the rest is paced by the consumer
+                    elapsed = time.monotonic() - started
+                streamed += len(rows)
+                if result == 'columns':
+                    yield to_columns(cursor.column_names, rows)
+                    continue
+                if result == 'tuple':
+                    rows = to_records(cursor.column_names, rows)
+                for row in rows:
+                    yield row
         except Error as e:
-            logger.error(f"Error updating data: {e}")
-            logger.error(f"Table: {table}")
-            logger.error(f"Data: {data}")
-            logger.error(f"Condition: {condition}")
-            if self.connection and self.connection.is_connected():
-                self.connection.rollback()
-            return False
+            failed = True
+            logger.error(f"Error streaming data: {e}")
+            logger.error(f"Query: {query}")
+            logger.error(f"Params: {params}")
+            if is_transient(e):
+                breaker.record_failure()
+            else:
+                # The server answered, so the database itself is up
+                self._record_success(replica=replica)
+            raise
         finally:
+            # Closing early (consumer stopped iterating) leaves unread rows behind;
+            # dropping the dedicated connection discards them
             if cursor:
-                cursor.close()
+                try:
+                    cursor.close()
+                except Error:
+                    pass
+            if connection:
+                try:
+                    connection.close()
+                except Error:
+                    pass
+            self.metrics.record(query, elapsed if elapsed is not None else time.monotonic() - started,
+                                rows=streamed, error=failed)
 
-    def delete(self, table, condition):
-        """Delete data from a table"""
-        cursor = None
-        try:
-            if not self.ensure_connection():
-                return False
+    def insert(self, table, data):
+        """Insert data into a table and return the ID"""
+        columns = ", ".join(data.keys())
+        placeholders = ", ".join(["%s"] * len(data))
+        query = f"INSERT INTO {table} ({columns}) VALUES ({placeholders})"
+        
+        last_id = self._run(query, list(data.values()), lambda cursor: cursor.lastrowid, None,
+                            action=f"inserting data into {table}")
+        
+        if last_id:
+            logger.info(f"Data inserted into {table}, ID: {last_id}")
+        return last_id
+
+    def queue_insert(self, table, data, key=None):
+        """Insert a row through the write-behind buffer, or right away when it is off
+        
+        With write-behind on, this returns a PendingId as soon as the row is
+        queued; it can be used as a column value of other queued rows and
+        resolves to the real ID once written. key names the row's identifying
+        columns so later queue_update() calls coalesce with it.
+        """
+        if self.write_behind:
+            return self.write_behind.insert(table, data, key=key)
+        return self.insert(table, data)
+
+    def queue_insert_many(self, table, rows):
+        """insert_many() through the write-behind buffer (see queue_insert)"""
+        if self.write_behind:
+            return [self.write_behind.insert(table, row) for row in rows]
+        return self.insert_many(table, rows)
+
+    def queue_upsert_many(self, table, rows, key_columns, add_columns=()):
+        """upsert_many() through the write-behind buffer; queued upserts of one row coalesce"""
+        if self.write_behind:
+            return all([self.write_behind.upsert(table, row, key_columns, add_columns=add_columns)
+                        for row in rows])
+        return self.upsert_many(table, rows, key_columns, add_columns=add_columns)
+
+    def queue_update(self, table, data, condition):
+        """update() through the write-behind buffer; queued updates of one row coalesce"""
+        if self.write_behind:
+            return self.write_behind.update(table, data, condition)
+        return self.update(table, data, condition)
+
+    def pending_writes(self, table, match):
+        """Queued, not yet written state of keyed rows matching match (read-your-writes)"""
+        if self.write_behind:
+            return self.write_behind.pending(table, match)
+        return []
+
+    def flush_writes(self, timeout=None):
+        """Wait until every queued write has been written"""
+        if self.write_behind:
+            return self.write_behind.flush(timeout)
+        return True
+
+    def _chunk_rows(self, rows, max_rows, max_bytes):
+        """Split rows into chunks that respect the row and byte budgets"""
+        chunk = []
+        chunk_bytes = 0
+        
+        for row in rows:
+            # Rough size of the row once rendered into the statement
+            row_bytes = sum(len(str(value)) + 4 for value in row)
+            
+            if chunk and (len(chunk) >= max_rows or chunk_bytes + row_bytes > max_bytes):
+                yield chunk
+                chunk = []
+                chunk_bytes = 0
                 
-            where_clause = " AND ".join([f"{key} = %s" for key in condition.keys()])
+            chunk.append(row)
+            chunk_bytes += row_bytes
             
-            query = f"DELETE FROM {table} WHERE {where_clause}"
+        if chunk:
+            yield chunk
+
+    def insert_many(self, table, rows, max_rows=None, max_bytes=None):
+        """Insert many rows into a table using multi-row INSERT statements
+        
+        Rows are dicts sharing the same keys. They are written in chunks bounded
+        by max_rows and max_bytes, one statement and one commit per chunk.
+        Returns the list of generated IDs in row order (MySQL hands out
+        consecutive IDs for a multi-row INSERT, starting at lastrowid).
+        """
+        if not rows:
+            return []
             
-            cursor = self.connection.cursor()
-            cursor.execute(query, list(condition.values()))
-            self.connection.commit()
+        max_rows = max_rows or self.batch_max_rows
+        max_bytes = max_bytes or self.batch_max_bytes
+        
+        columns = list(rows[0].keys())
+        values = [tuple(row.get(column) for column in columns) for row in rows]
+        row_placeholder = "(" + ", ".join(["%s"] * len(columns)) + ")"
+        
+        ids = []
+        for chunk in self._chunk_rows(values, max_rows, max_bytes):
+            query = f"INSERT INTO {table} ({', '.join(columns)}) VALUES " + ", ".join([row_placeholder] * len(chunk))
+            params = [value for row in chunk for value in row]
             
-            affected_rows = cursor.rowcount
+            first_id = self._run(query, params, lambda cursor: cursor.lastrowid, None,
+                                 action=f"inserting batch of {len(chunk)} rows into {table}")
+                        
+            if first_id is None:
+                logger.error(f"Giving up on batch insert into {table} after {len(ids)} of {len(values)} rows")
+                return ids
+                
+            ids.extend(range(first_id, first_id + len(chunk)))
             
-            logger.info(f"Data deleted from {table}, {affected_rows} rows affected")
-            return affected_rows > 0
-        except Error as e:
-            logger.error(f"Error deleting data: {e}")
-            logger.error(f"Table: {table}")
-            logger.error(f"Condition: {condition}")
-            if self.connection and self.connection.is_connected():
-                self.connection.rollback()
-            return False
-        finally:
-            if cursor:
-                cursor.close()
+        logger.info(f"Batch inserted into {table}, {len(ids)} rows, IDs: {ids[0]}-{ids[-1]}")
+        return ids
+
+    def upsert_many(self, table, rows, key_columns, max_rows=None, max_bytes=None, add_columns=()):
+        """Insert rows, updating the existing row instead when its unique key is taken
+        
+        Rows are dicts sharing the same keys; key_columns must be a unique key
+        of table. On a conflict every other column of the row overwrites the
+        stored one, except add_columns, which are added to it (counters).
+        Rows are written in multi-row statements chunked like
+        insert_many(), so a batch costs one round trip per chunk rather than
+        an UPDATE or INSERT per row. Returns True if every row was written.
+        """
+        if not rows:
+            return True
+            
+        max_rows = max_rows or self.batch_max_rows
+        max_bytes = max_bytes or self.batch_max_bytes
+        
+        columns = list(rows[0].keys())
+        updated = [column for column in columns if column not in key_columns]
+        values = [tuple(row.get(column) for column in columns) for row in rows]
+        row_placeholder = "(" + ", ".join(["%s"] * len(columns)) + ")"
+        
+        if self.backend.name == 'sqlite':
+            new_value = "excluded.{}"
+            conflict = f" ON CONFLICT ({', '.join(key_columns)}) DO UPDATE SET "
+        else:
+            new_value = "VALUES({})"
+            conflict = " ON DUPLICATE KEY UPDATE "
+        conflict += ", ".join(
+            f"{column} = {column} + {new_value.format(column)}" if column in add_columns
+            else f"{column} = {new_value.format(column)}"
+            for column in updated
+        )
+        
+        written = 0
+        for chunk in self._chunk_rows(values, max_rows, max_bytes):
+            query = (f"INSERT INTO {table} ({', '.join(columns)}) VALUES "
+                     + ", ".join([row_placeholder] * len(chunk)) + conflict)
+            params = [value for row in chunk for value in row]
+            
+            if not self._run(query, params, lambda cursor: True, False,
+                             action=f"upserting batch of {len(chunk)} rows into {table}"):
+                logger.error(f"Giving up on batch upsert into {table} after {written} of {len(values)} rows")
+                return False
+            written += len(chunk)
+            
+        logger.info(f"Batch upserted into {table}, {written} rows")
+        return True
+
+    def update(self, table, data, condition):
+        """Update data in a table"""
+        set_clause = ", ".join([f"{key} = %s" for key in data.keys()])
+        where_clause = " AND ".join([f"{key} = %s" for key in condition.keys()])
+        
+        query = f"UPDATE {table} SET {set_clause} WHERE {where_clause}"
+        params = list(data.values()) + list(condition.values())
+        
+        affected_rows = self._run(query, params, lambda cursor: cursor.rowcount, 0,
+                                  action=f"updating data in {table}")
+        
+        logger.info(f"Data updated in {table}, {affected_rows} rows affected")
+        return affected_rows > 0
+
+    def delete(self, table, condition):
+        """Delete data from a table"""
+        where_clause = " AND ".join([f"{key} = %s" for key in condition.keys()])
+        
+        query = f"DELETE FROM {table} WHERE {where_clause}"
+        
+        affected_rows = self._run(query, list(condition.values()), lambda cursor: cursor.rowcount, 0,
+                                  action=f"deleting data from {table}")
+        
+        logger.info(f"Data deleted from {table}, {affected_rows} rows affected")
+        return affected_rows > 0
 
     def log_activity(self, user_id, activity_type, ip_address, resource=None, details=None, user_agent=None, session_id=None):
         """Log user activity"""
@@ -408,7 +741,11 @@ class Database:
         # If access was logged successfully, generate an alert
         if access_id and not is_authorized:
             from ..models.alert import Alert
-            Alert.create_honeytoken_access_alert(token_id, user_id, access_id, ip_address)
+            try:
+                Alert.create_honeytoken_access_alert(token_id, user_id, access_id, ip_address)
+            except Error as e:
+                # No connection for the alert's transaction; the access is recorded either way
+                logger.error(f"Failed to create the alert for honeytoken access {access_id}: {e}")
             
         return access_id
 
@@ -448,11 +785,12 @@ class Database:
 _db_instance = None
 
 def get_db():
-    """Get the database instance"""
+    """Get the database instance
+    
+    This does no I/O: liveness is tracked from query outcomes, and broken
+    connections are replaced when a query hits an I/O error.
+    """
     global _db_instance
     if _db_instance is None:
         _db_instance = Database()
-    elif not _db_instance.connection or not _db_instance.connection.is_connected():
-        # If connection is lost, reconnect
-        _db_instance.connect()
-    return _db_instance 
\ No newline at end of file
+    return _db_instance
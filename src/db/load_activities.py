@@ -32,7 +32,9 @@ def load_offline_activities():
         activity_files = list(activities_dir.glob('activity_*.json'))
         logger.info(f"Found {len(activity_files)} activity files to process")
         
-        # Process each activity file
+        # Parse every activity file into a row
+        rows = []
+        parsed_files = []
         for activity_file in activity_files:
             try:
                 # Read activity data
@@ -40,42 +42,37 @@ def load_offline_activities():
                     activity_data = json.load(f)
                 
                 # Extract fields
-                user_id = activity_data['user_id']
-                activity_type = activity_data['activity_type']
-                ip_address = activity_data['ip_address']
-                user_agent = activity_data['user_agent']
-                resource = activity_data.get('resource', '')
                 details = activity_data.get('details', {})
                 
                 # Convert timestamp string to datetime
                 timestamp = datetime.fromisoformat(details.get('timestamp', datetime.now().isoformat()))
                 
-                # Insert into database
-                db.execute_query("""
-                    INSERT INTO user_activities 
-                    (user_id, activity_type, timestamp, ip_address, user_agent, resource_accessed, action_details)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s)
-                """, (
-                    user_id,
-                    activity_type,
-                    timestamp,
-                    ip_address,
-                    user_agent,
-                    resource,
-                    json.dumps(details)
-                ))
-                
-                # Move processed file to processed directory
-                processed_dir = activities_dir / 'processed'
-                processed_dir.mkdir(exist_ok=True)
-                activity_file.rename(processed_dir / activity_file.name)
-                
-                logger.info(f"Processed activity file: {activity_file.name}")
+                rows.append({
+                    'user_id': activity_data['user_id'],
+                    'activity_type': activity_data['activity_type'],
+                    'timestamp': timestamp,
+                    'ip_address': activity_data['ip_address'],
+                    'user_agent': activity_data['user_agent'],
+                    'resource_accessed': activity_data.get('resource', ''),
+                    'action_details': json.dumps(details)
+                })
+                parsed_files.append(activity_file)
                 
             except Exception as e:
                 logger.error(f"Error processing activity file {activity_file.name}: {str(e)}")
                 continue
         
+        # Insert into database in batched multi-row statements
+        activity_ids = db.insert_many('user_activities', rows)
+        
+        # Move processed files to processed directory; insert_many stops at the
+        # first failing chunk, so only the files that made it in are moved
+        processed_dir = activities_dir / 'processed'
+        processed_dir.mkdir(exist_ok=True)
+        for activity_file in parsed_files[:len(activity_ids)]:
+            activity_file.rename(processed_dir / activity_file.name)
+            logger.info(f"Processed activity file: {activity_file.name}")
+        
         logger.info("Finished processing all activity files")
         
     except Exception as e:
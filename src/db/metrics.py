@@ -0,0 +1,148 @@
+import re
+import logging
+import threading
+from functools import lru_cache
+
+# Slow statements get their own log file, kept out of database.log
+slow_logger = logging.getLogger('slow_queries')
+slow_logger.propagate = False
+if not slow_logger.handlers:
+    _handler = logging.FileHandler('logs/slow_queries.log')
+    _handler.setFormatter(logging.Formatter('%(asctime)s - %(message)s'))
+    slow_logger.addHandler(_handler)
+    slow_logger.setLevel(logging.INFO)
+
+# Latency histogram bucket upper bounds, in milliseconds (the last bucket is unbounded)
+BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+# Beyond this many distinct fingerprints, new ones are folded into one entry
+MAX_FINGERPRINTS = 500
+OTHER = '<other>'
+
+_STRING = re.compile(r"'(?:[^'\\]|\\.)*'")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_ROWS = re.compile(r"(\(\?\+?\))(?:\s*,\s*\(\?\+?\))+")
+_SPACE = re.compile(r"\s+")
+
+@lru_cache(maxsize=1024)
+def fingerprint(query):
+    """Normalize a statement so every execution of it maps to one key
+
+    Literals become ?, whitespace is collapsed, lists of values become (?+)
+    and the repeated rows of a multi-row INSERT are folded into one.
+    """
+    text = query.replace('%s', '?')
+    text = _STRING.sub('?', text)
+    text = _NUMBER.sub('?', text)
+    text = _LIST.sub('(?+)', text)
+    text = _ROWS.sub(r'\1, ...', text)
+    return _SPACE.sub(' ', text).strip()
+
+class _StatementStats:
+    """Running aggregates for one fingerprint"""
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.rows = 0
+        self.time_total = 0.0
+        self.time_max = 0.0
+        self.pool_wait_total = 0.0
+        self.buckets = [0] * (len(BUCKETS_MS) + 1)
+
+    def record(self, elapsed, rows, pool_wait, error):
+        self.calls += 1
+        self.errors += 1 if error else 0
+        self.rows += rows
+        self.time_total += elapsed
+        self.time_max = max(self.time_max, elapsed)
+        self.pool_wait_total += pool_wait
+
+        elapsed_ms = elapsed * 1000
+        for i, bound in enumerate(BUCKETS_MS):
+            if elapsed_ms <= bound:
+                self.buckets[i] += 1
+                break
+        else:
+            self.buckets[-1] += 1
+
+    def percentile(self, fraction):
+        """Upper bound (ms) of the bucket holding the given fraction of calls"""
+        wanted = fraction * self.calls
+        seen = 0
+        for i, count in enumerate(self.buckets):
+            seen += count
+            if count and seen >= wanted:
+                return BUCKETS_MS[i] if i < len(BUCKETS_MS) else None
+        return None
+
+    def snapshot(self):
+        return {
+            'calls': self.calls,
+            'errors': self.errors,
+            'rows': self.rows,
+            'avg_ms': round(self.time_total / self.calls * 1000, 3) if self.calls else 0.0,
+            'max_ms': round(self.time_max * 1000, 3),
+            'p50_ms': self.percentile(0.5),
+            'p95_ms': self.percentile(0.95),
+            'p99_ms': self.percentile(0.99),
+            'total_ms': round(self.time_total * 1000, 3),
+            'pool_wait_ms': round(self.pool_wait_total * 1000, 3),
+            'histogram': dict(zip([f"<={b}ms" for b in BUCKETS_MS] + ['>10000ms'], self.buckets))
+        }
+
+class QueryMetrics:
+    """Per-fingerprint latency histograms, row counts and pool wait time
+
+    Statements slower than ``slow_threshold`` seconds are also written to
+    logs/slow_queries.log.
+    """
+
+    def __init__(self, slow_threshold=0.5):
+        self.slow_threshold = slow_threshold
+        self.slow_queries = 0
+        self._statements = {}
+        self._lock = threading.Lock()
+
+    def record(self, query, elapsed, rows=0, pool_wait=0.0, error=False, attempts=1):
+        """Account for one call of a statement (all of its attempts together)"""
+        key = fingerprint(query)
+
+        with self._lock:
+            stats = self._statements.get(key)
+            if stats is None:
+                if len(self._statements) >= MAX_FINGERPRINTS:
+                    key = OTHER
+                    stats = self._statements.get(key)
+                if stats is None:
+                    stats = self._statements[key] = _StatementStats()
+            stats.record(elapsed, rows, pool_wait, error)
+
+            slow = elapsed >= self.slow_threshold
+            if slow:
+                self.slow_queries += 1
+
+        if slow:
+            slow_logger.info(
+                f"{elapsed * 1000:.1f}ms rows={rows} pool_wait={pool_wait * 1000:.1f}ms "
+                f"attempts={attempts}{' error' if error else ''} | {key}"
+            )
+
+    def snapshot(self, top=None, sort='total_ms'):
+        """Aggregates per fingerprint, the most expensive first"""
+        with self._lock:
+            statements = [dict(stats.snapshot(), query=key) for key, stats in self._statements.items()]
+            slow_queries = self.slow_queries
+
+        statements.sort(key=lambda s: s.get(sort) or 0, reverse=True)
+        return {
+            'slow_threshold_ms': self.slow_threshold * 1000,
+            'slow_queries': slow_queries,
+            'statements': statements[:top] if top else statements
+        }
+
+    def reset(self):
+        with self._lock:
+            self._statements.clear()
+            self.slow_queries = 0
@@ -0,0 +1,77 @@
+import os
+import re
+import logging
+from .database import get_db
+
+logger = logging.getLogger('database')
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
+
+def list_migrations(backend='mysql'):
+    """Return (version, name, path) for every migration file, in order
+    
+    NNN_name.sql is written for MySQL; other backends use their own variant,
+    NNN_name.<backend>.sql, which every migration must provide.
+    """
+    suffix = '.sql' if backend == 'mysql' else f'.{backend}.sql'
+    migrations = []
+    for filename in sorted(os.listdir(MIGRATIONS_DIR)):
+        match = re.match(r'^(\d+)_(\w+)\.sql$', filename)
+        if not match:
+            continue
+        path = os.path.join(MIGRATIONS_DIR, filename[:-len('.sql')] + suffix)
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"Migration {filename} has no {backend} variant")
+        migrations.append((int(match.group(1)), match.group(2), path))
+    return migrations
+
+def split_statements(sql):
+    """Split a migration file into individual statements, dropping comments"""
+    lines = [line for line in sql.splitlines() if not line.strip().startswith('--')]
+    return [statement.strip() for statement in '\n'.join(lines).split(';') if statement.strip()]
+
+def applied_versions(db):
+    """Versions already recorded in schema_migrations"""
+    db.execute_query("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INT PRIMARY KEY,
+            name VARCHAR(255) NOT NULL,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    rows = db.fetch_all("SELECT version FROM schema_migrations", primary=True)
+    return {row['version'] for row in rows}
+
+def migrate():
+    """Apply every pending migration in version order
+    
+    MySQL commits DDL implicitly, so a migration is only recorded once all of
+    its statements succeeded; if one fails midway, the runner stops and the
+    statements already applied have to be reverted by hand before a rerun.
+    Returns the number of migrations applied, or None on failure.
+    """
+    db = get_db()
+    done = applied_versions(db)
+    applied = 0
+    
+    for version, name, path in list_migrations(db.backend.name):
+        if version in done:
+            continue
+            
+        logger.info(f"Applying migration {version:03d}_{name}")
+        with open(path) as f:
+            statements = split_statements(f.read())
+            
+        for statement in statements:
+            if not db.execute_query(statement):
+                logger.error(f"Migration {version:03d}_{name} failed on: {statement}")
+                return None
+                
+        if not db.execute_query(
+            "INSERT INTO schema_migrations (version, name) VALUES (%s, %s)", (version, name)
+        ):
+            return None
+        applied += 1
+        
+    logger.info(f"Schema is up to date ({applied} migrations applied)")
+    return applied
@@ -0,0 +1,25 @@
+-- Composite and covering indexes for the hot query paths
+-- (SQLite variant: 001_composite_indexes.sqlite.sql)
+
+-- Per-user activity windows (UEBA checks, /api/users/<id>/activities, activity patterns).
+-- Covers the IP and resource checks without touching the table rows.
+CREATE INDEX idx_user_activities_user_time
+    ON user_activities(user_id, timestamp, activity_type, ip_address, resource_accessed);
+
+-- Superseded by the composite index above (same leading column)
+DROP INDEX idx_user_activities_user ON user_activities;
+
+-- Open alerts, newest first (dashboard, alert list)
+CREATE INDEX idx_alerts_resolved_time ON alerts(is_resolved, timestamp);
+
+-- Open alerts per user (risky users)
+CREATE INDEX idx_alerts_user_resolved ON alerts(user_id, is_resolved, severity);
+
+-- Alert counts by severity per user over a window (user risk score)
+CREATE INDEX idx_alerts_user_time ON alerts(user_id, timestamp, severity);
+
+-- Average anomaly score per user over a window
+CREATE INDEX idx_anomaly_scores_user_time ON anomaly_scores(user_id, timestamp, anomaly_score);
+
+-- Average anomaly score per activity (activity list and stats joins)
+CREATE INDEX idx_anomaly_scores_activity ON anomaly_scores(activity_id, anomaly_score);
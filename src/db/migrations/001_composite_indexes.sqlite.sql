@@ -0,0 +1,16 @@
+-- Composite and covering indexes for the hot query paths (SQLite variant of 001)
+
+CREATE INDEX idx_user_activities_user_time
+    ON user_activities(user_id, timestamp, activity_type, ip_address, resource_accessed);
+
+DROP INDEX idx_user_activities_user;
+
+CREATE INDEX idx_alerts_resolved_time ON alerts(is_resolved, timestamp);
+
+CREATE INDEX idx_alerts_user_resolved ON alerts(user_id, is_resolved, severity);
+
+CREATE INDEX idx_alerts_user_time ON alerts(user_id, timestamp, severity);
+
+CREATE INDEX idx_anomaly_scores_user_time ON anomaly_scores(user_id, timestamp, anomaly_score);
+
+CREATE INDEX idx_anomaly_scores_activity ON anomaly_scores(activity_id, anomaly_score);
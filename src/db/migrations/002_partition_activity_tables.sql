@@ -0,0 +1,37 @@
+-- Range-partition user_activities and anomaly_scores on timestamp
+--
+-- MySQL cannot partition tables that have (or are referenced by) foreign keys,
+-- and every unique key must contain the partitioning column, so the foreign
+-- keys are dropped and the primary keys widened to (id, timestamp). The ids
+-- stay AUTO_INCREMENT and unique in practice.
+--
+-- Everything starts in the catch-all p_future partition; run.py
+-- --maintain-partitions splits it into daily or monthly partitions and drops
+-- the ones past the retention window. This rewrites both tables once.
+
+ALTER TABLE anomaly_scores
+    DROP FOREIGN KEY anomaly_scores_ibfk_1,
+    DROP FOREIGN KEY anomaly_scores_ibfk_2;
+
+ALTER TABLE user_activities
+    DROP FOREIGN KEY user_activities_ibfk_1;
+
+ALTER TABLE user_activities
+    MODIFY timestamp TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    DROP PRIMARY KEY,
+    ADD PRIMARY KEY (activity_id, timestamp);
+
+ALTER TABLE anomaly_scores
+    MODIFY timestamp TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    DROP PRIMARY KEY,
+    ADD PRIMARY KEY (anomaly_id, timestamp);
+
+ALTER TABLE user_activities
+    PARTITION BY RANGE (UNIX_TIMESTAMP(timestamp)) (
+        PARTITION p_future VALUES LESS THAN MAXVALUE
+    );
+
+ALTER TABLE anomaly_scores
+    PARTITION BY RANGE (UNIX_TIMESTAMP(timestamp)) (
+        PARTITION p_future VALUES LESS THAN MAXVALUE
+    );
@@ -0,0 +1,3 @@
+-- SQLite variant of 002: SQLite has no table partitioning, so there is nothing
+-- to do. run.py --maintain-partitions applies the retention window with a
+-- DELETE on SQLite instead.
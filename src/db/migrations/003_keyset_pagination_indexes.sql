@@ -0,0 +1,7 @@
+-- Indexes in (timestamp, id) order for keyset pagination
+-- (SQLite variant: 003_keyset_pagination_indexes.sqlite.sql)
+
+-- A user's activities page by page (/api/ueba/activities/<id>?cursor=).
+-- idx_user_activities_user_time has other columns between timestamp and the
+-- primary key, so it can't return rows in (timestamp, activity_id) order.
+CREATE INDEX idx_user_activities_user_page ON user_activities(user_id, timestamp, activity_id);
@@ -0,0 +1,3 @@
+-- Indexes in (timestamp, id) order for keyset pagination (SQLite variant of 003)
+
+CREATE INDEX idx_user_activities_user_page ON user_activities(user_id, timestamp, activity_id);
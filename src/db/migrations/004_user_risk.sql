@@ -0,0 +1,14 @@
+-- Incrementally maintained risk counters, one row per user (see src/models/risk.py)
+-- (SQLite variant: 004_user_risk.sqlite.sql)
+
+-- Exponentially time-decayed sums over the user's unresolved alerts and anomaly
+-- scores, updated as they are recorded; reading a user's risk is a primary key
+-- lookup. Fill it from existing data with `python run.py --rebuild-risk`.
+CREATE TABLE user_risk (
+    user_id INT PRIMARY KEY,
+    alert_weight DOUBLE NOT NULL DEFAULT 0,
+    alert_count DOUBLE NOT NULL DEFAULT 0,
+    anomaly_sum DOUBLE NOT NULL DEFAULT 0,
+    anomaly_count DOUBLE NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
@@ -0,0 +1,10 @@
+-- Incrementally maintained risk counters, one row per user (SQLite variant of 004)
+
+CREATE TABLE user_risk (
+    user_id INTEGER PRIMARY KEY,
+    alert_weight REAL NOT NULL DEFAULT 0,
+    alert_count REAL NOT NULL DEFAULT 0,
+    anomaly_sum REAL NOT NULL DEFAULT 0,
+    anomaly_count REAL NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP NOT NULL DEFAULT (datetime('now', 'localtime'))
+);
@@ -0,0 +1,10 @@
+-- Running mean and variance per baseline, for z-score anomaly scoring
+-- (SQLite variant: 005_baseline_variance.sqlite.sql)
+
+-- sample_count (effective, with forgetting), sample_mean and sample_m2 (sum of
+-- squared deviations) are Welford's online state, updated alongside the EWMA
+-- feature_value. Existing baselines start from an empty state.
+ALTER TABLE behavioral_baselines
+    ADD COLUMN sample_count DOUBLE NOT NULL DEFAULT 0,
+    ADD COLUMN sample_mean DOUBLE NOT NULL DEFAULT 0,
+    ADD COLUMN sample_m2 DOUBLE NOT NULL DEFAULT 0;
@@ -0,0 +1,5 @@
+-- Running mean and variance per baseline (SQLite variant of 005)
+
+ALTER TABLE behavioral_baselines ADD COLUMN sample_count REAL NOT NULL DEFAULT 0;
+ALTER TABLE behavioral_baselines ADD COLUMN sample_mean REAL NOT NULL DEFAULT 0;
+ALTER TABLE behavioral_baselines ADD COLUMN sample_m2 REAL NOT NULL DEFAULT 0;
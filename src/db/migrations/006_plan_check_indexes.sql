@@ -0,0 +1,15 @@
+-- Indexes that let the remaining hot queries pass --check-plans without exemptions
+-- (SQLite variant: 006_plan_check_indexes.sqlite.sql)
+
+-- Alert counts by severity over a window (alert summary); covers the grouped column
+CREATE INDEX idx_alerts_time_severity ON alerts(timestamp, severity);
+
+-- Superseded by the covering index above (same leading column)
+DROP INDEX idx_alerts_timestamp ON alerts;
+
+-- Open alerts grouped per user (risky users): read in user_id order from the
+-- index, so users is joined by primary key instead of scanned
+CREATE INDEX idx_alerts_resolved_user ON alerts(is_resolved, user_id, severity);
+
+-- Admin user count
+CREATE INDEX idx_users_role ON users(role);
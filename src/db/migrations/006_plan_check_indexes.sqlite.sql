@@ -0,0 +1,9 @@
+-- Indexes that let the remaining hot queries pass --check-plans without exemptions (SQLite variant of 006)
+
+CREATE INDEX idx_alerts_time_severity ON alerts(timestamp, severity);
+
+DROP INDEX idx_alerts_timestamp;
+
+CREATE INDEX idx_alerts_resolved_user ON alerts(is_resolved, user_id, severity);
+
+CREATE INDEX idx_users_role ON users(role);
@@ -0,0 +1,48 @@
+import base64
+from datetime import datetime
+
+class InvalidCursor(ValueError):
+    """A continuation cursor that wasn't produced by encode_cursor"""
+
+def encode_cursor(timestamp, row_id):
+    """Opaque continuation cursor for the position of a (timestamp, id) row"""
+    raw = f"{timestamp.isoformat()}|{row_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+def decode_cursor(cursor):
+    """The (timestamp, id) position a cursor stands for"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        timestamp, row_id = raw.split('|')
+        return datetime.fromisoformat(timestamp), int(row_id)
+    except (ValueError, UnicodeDecodeError):
+        raise InvalidCursor(f"Invalid cursor: {cursor}")
+
+def after(position, timestamp_column, id_column):
+    """WHERE condition (and params) for the rows after position, newest first
+
+    Pages are ordered by (timestamp DESC, id DESC): the id breaks ties between
+    rows with the same timestamp, so no row is skipped or repeated. The
+    condition is a range on the timestamp index, so a page costs the same
+    however deep it is, where OFFSET reads and discards every earlier row.
+    """
+    timestamp, row_id = position
+    return (f"({timestamp_column} < %s OR ({timestamp_column} = %s AND {id_column} < %s))",
+            [timestamp, timestamp, row_id])
+
+def next_cursor(rows, limit, timestamp_key, id_key):
+    """Cursor for the page after rows, or None if rows was the last page
+
+    Rows with a NULL timestamp sort after all others (newest first) and no
+    position after them can be expressed, so a page ending on one is the last.
+    """
+    if not rows or len(rows) < limit:
+        return None
+    last = rows[-1]
+    if isinstance(last, dict):
+        timestamp, row_id = last[timestamp_key], last[id_key]
+    else:
+        timestamp, row_id = getattr(last, timestamp_key), getattr(last, id_key)
+    if timestamp is None:
+        return None
+    return encode_cursor(timestamp, row_id)
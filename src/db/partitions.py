@@ -0,0 +1,149 @@
+import logging
+from datetime import date, timedelta
+from .database import get_db
+
+logger = logging.getLogger('database')
+
+# Tables range-partitioned on UNIX_TIMESTAMP(timestamp) by migration 002
+PARTITIONED_TABLES = ('user_activities', 'anomaly_scores')
+
+def period_start(day, interval):
+    """First day of the partition period containing day"""
+    return day.replace(day=1) if interval == 'month' else day
+
+def next_period(start, interval):
+    """First day of the period after the one starting at start"""
+    if interval == 'month':
+        return (start.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return start + timedelta(days=1)
+
+def list_partitions(db, table):
+    """Partitions of a table in order, as dicts with name and bound (None for MAXVALUE)"""
+    rows = db.fetch_all("""
+        SELECT PARTITION_NAME as name, PARTITION_DESCRIPTION as bound
+        FROM information_schema.PARTITIONS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND PARTITION_NAME IS NOT NULL
+        ORDER BY PARTITION_ORDINAL_POSITION
+    """, (table,), primary=True)
+    return [
+        {'name': row['name'], 'bound': None if row['bound'] == 'MAXVALUE' else int(row['bound'])}
+        for row in rows
+    ]
+
+def add_partitions(db, table, partitions, today):
+    """Split p_future so the current period and the next few have their own partitions
+
+    On the first run every row is still in p_future, so dated partitions are
+    created from the oldest row's period onwards (or from the start of the
+    retention window, if that is later). History is then spread over its own
+    periods and retention can drop it period by period, instead of it all
+    landing in the current period's partition.
+    """
+    interval = db.partition_interval
+    dated = [p for p in partitions if p['bound'] is not None]
+
+    start = period_start(today, interval)
+    if dated:
+        # Continue after the last dated partition, but never backfill past periods:
+        # a range partition holds everything below its bound anyway
+        last = db.fetch_one("SELECT DATE(FROM_UNIXTIME(%s)) as day", (dated[-1]['bound'],), primary=True)
+        start = max(start, last['day'])
+    else:
+        # One scan, on the first run only
+        oldest = db.fetch_one(f"SELECT DATE(MIN(timestamp)) as day FROM {table}", primary=True)
+        if oldest and oldest['day']:
+            first = oldest['day']
+            if db.retention_days > 0:
+                # Older rows go into the first partition, which expires within a period
+                first = max(first, today - timedelta(days=db.retention_days))
+            start = min(start, period_start(first, interval))
+
+    horizon = period_start(today, interval)
+    for _ in range(db.partitions_ahead):
+        horizon = next_period(horizon, interval)
+
+    definitions = []
+    while start <= horizon:
+        end = next_period(start, interval)
+        definitions.append(
+            f"PARTITION p{start.strftime('%Y%m%d')} VALUES LESS THAN (UNIX_TIMESTAMP('{end.isoformat()}'))"
+        )
+        start = end
+
+    if not definitions:
+        return 0
+
+    # p_future is empty in steady state, so reorganizing it copies nothing. The
+    # first run moves the existing rows out of it into their dated partitions
+    query = (f"ALTER TABLE {table} REORGANIZE PARTITION p_future INTO ("
+             + ", ".join(definitions) + ", PARTITION p_future VALUES LESS THAN MAXVALUE)")
+    if not db.execute_query(query):
+        logger.error(f"Failed to add partitions to {table}")
+        return 0
+    return len(definitions)
+
+def drop_expired_partitions(db, table, partitions, today):
+    """Drop the partitions whose rows are all older than the retention window"""
+    if db.retention_days <= 0:
+        return []
+
+    cutoff = today - timedelta(days=db.retention_days)
+    cutoff_ts = db.fetch_one("SELECT UNIX_TIMESTAMP(%s) as ts", (cutoff.isoformat(),), primary=True)['ts']
+    expired = [p['name'] for p in partitions if p['bound'] is not None and p['bound'] <= cutoff_ts]
+
+    if not expired:
+        return []
+
+    # Dropping a partition discards its rows instantly, without a DELETE scan
+    if not db.execute_query(f"ALTER TABLE {table} DROP PARTITION {', '.join(expired)}"):
+        logger.error(f"Failed to drop expired partitions of {table}")
+        return []
+    return expired
+
+def delete_expired_rows(db, table, today):
+    """Retention without partitions: delete the rows older than the retention window"""
+    if db.retention_days <= 0:
+        return 0
+
+    cutoff = today - timedelta(days=db.retention_days)
+    expired = db.fetch_one(f"SELECT COUNT(*) as count FROM {table} WHERE timestamp < %s", (cutoff,), primary=True)
+    if not expired or not expired['count']:
+        return 0
+
+    if not db.execute_query(f"DELETE FROM {table} WHERE timestamp < %s", (cutoff,)):
+        logger.error(f"Failed to delete expired rows of {table}")
+        return 0
+    return expired['count']
+
+def maintain_partitions(today=None):
+    """Create upcoming partitions and apply retention; meant to run daily (cron)
+
+    Settings: DB_PARTITION_INTERVAL (day or month), DB_PARTITIONS_AHEAD and
+    DB_RETENTION_DAYS (0 keeps everything). Returns {table: {'added', 'dropped'}}
+    or None if the tables have not been partitioned yet (run --migrate).
+    SQLite has no partitions, so there retention is a plain DELETE and
+    'deleted' (a row count) replaces 'added' and 'dropped'.
+    """
+    db = get_db()
+    today = today or date.today()
+    summary = {}
+
+    if db.backend.name == 'sqlite':
+        for table in PARTITIONED_TABLES:
+            deleted = delete_expired_rows(db, table, today)
+            summary[table] = {'deleted': deleted}
+            logger.info(f"Retention on {table}: deleted {deleted} rows")
+        return summary
+
+    for table in PARTITIONED_TABLES:
+        partitions = list_partitions(db, table)
+        if not partitions:
+            logger.error(f"Table {table} is not partitioned; apply the migrations first")
+            return None
+
+        dropped = drop_expired_partitions(db, table, partitions, today)
+        added = add_partitions(db, table, partitions, today)
+        summary[table] = {'added': added, 'dropped': dropped}
+        logger.info(f"Partitions of {table}: added {added}, dropped {len(dropped)} {dropped}")
+
+    return summary
@@ -0,0 +1,166 @@
+import logging
+import threading
+import time
+from collections import deque
+from mysql.connector.errors import PoolError
+
+logger = logging.getLogger('database')
+
+class ConnectionPool:
+    """Thread-safe pool of database connections with bounded overflow
+
+    Up to ``size`` connections are kept open and reused. When all of them are
+    checked out, up to ``max_overflow`` extra connections are opened; they are
+    closed on release once ``size`` connections are idle again. Beyond that,
+    callers wait up to ``timeout`` seconds for a connection to come back
+    before PoolError is raised.
+
+    Idle connections are only validated (``validate(connection)``, typically a
+    ping) when they have sat unused for longer than ``validate_after`` seconds;
+    recently used connections are handed out without any I/O.
+    """
+
+    def __init__(self, connect, size=5, max_overflow=5, timeout=10, validate=None, validate_after=30):
+        self._connect = connect
+        self.size = size
+        self.max_overflow = max_overflow
+        self.timeout = timeout
+        self._validate = validate
+        self.validate_after = validate_after
+
+        self._idle = deque()
+        self._opened = 0
+        self._in_use = 0
+        self._condition = threading.Condition()
+
+        # Counters
+        self.checkouts = 0
+        self.waits = 0
+        self.wait_time_total = 0.0
+        self.wait_time_max = 0.0
+        self.exhausted = 0
+        self.created = 0
+        self.discarded = 0
+        self.validations = 0
+
+    def acquire(self):
+        """Check out a connection, opening or waiting for one as needed"""
+        started = time.monotonic()
+        deadline = started + self.timeout
+        waited = False
+
+        with self._condition:
+            while True:
+                if self._idle:
+                    connection, released_at = self._idle.pop()
+                    break
+
+                if self._opened < self.size + self.max_overflow:
+                    # Reserve the slot now, open the connection outside the lock
+                    self._opened += 1
+                    connection = None
+                    break
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.exhausted += 1
+                    raise PoolError(
+                        f"Connection pool exhausted: {self._in_use} connections in use "
+                        f"(size={self.size}, max_overflow={self.max_overflow})"
+                    )
+
+                waited = True
+                self._condition.wait(remaining)
+
+            self._in_use += 1
+            self.checkouts += 1
+            wait_time = time.monotonic() - started
+            if waited:
+                self.waits += 1
+            self.wait_time_total += wait_time
+            self.wait_time_max = max(self.wait_time_max, wait_time)
+
+        # Only ping connections that have been idle long enough to have gone stale
+        if connection is not None and self._validate and time.monotonic() - released_at > self.validate_after:
+            self.validations += 1
+            try:
+                valid = self._validate(connection)
+            except Exception:
+                valid = False
+            if not valid:
+                logger.info("Discarding stale pooled connection")
+                self._close(connection)
+                with self._condition:
+                    self.discarded += 1
+                connection = None
+
+        if connection is None:
+            try:
+                connection = self._connect()
+            except Exception:
+                with self._condition:
+                    self._opened -= 1
+                    self._in_use -= 1
+                    self._condition.notify()
+                raise
+            with self._condition:
+                self.created += 1
+
+        return connection
+
+    def release(self, connection, discard=False):
+        """Return a connection to the pool, closing it if broken or surplus"""
+        with self._condition:
+            self._in_use -= 1
+
+            # Only up to ``size`` idle connections are kept; surplus overflow ones are closed
+            if discard or len(self._idle) >= self.size:
+                self._opened -= 1
+                self.discarded += 1
+                close = True
+            else:
+                self._idle.append((connection, time.monotonic()))
+                close = False
+
+            self._condition.notify()
+
+        if close:
+            self._close(connection)
+
+    def _close(self, connection):
+        try:
+            connection.close()
+        except Exception as e:
+            logger.debug(f"Error closing pooled connection: {e}")
+
+    def close_all(self):
+        """Close every idle connection"""
+        with self._condition:
+            idle = list(self._idle)
+            self._idle.clear()
+            self._opened -= len(idle)
+
+        for connection, _ in idle:
+            self._close(connection)
+
+        return len(idle)
+
+    def stats(self):
+        """Snapshot of pool occupancy and counters"""
+        with self._condition:
+            return {
+                'size': self.size,
+                'max_overflow': self.max_overflow,
+                'opened': self._opened,
+                'in_use': self._in_use,
+                'idle': len(self._idle),
+                'checkouts': self.checkouts,
+                'waits': self.waits,
+                'wait_time_total': self.wait_time_total,
+                'wait_time_avg': self.wait_time_total / self.checkouts if self.checkouts else 0.0,
+                'wait_time_max': self.wait_time_max,
+                'exhausted': self.exhausted,
+                'created': self.created,
+                'discarded': self.discarded,
+                'validations': self.validations
+            }
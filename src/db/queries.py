@@ -0,0 +1,163 @@
+"""SQL of the hot queries, shared by their call sites and query_plans.hot_queries()
+
+Queries with a {conditions} (or {where}) placeholder get their optional
+filters, e.g. a pagination.after() cursor condition, with str.format().
+"""
+
+# ueba.py
+
+USER_ACTIVITIES_RECENT = """
+    SELECT * FROM user_activities
+    WHERE user_id = %s AND timestamp > %s
+    ORDER BY timestamp DESC
+    LIMIT %s
+"""
+
+# alert.py
+
+ANOMALY_DETAILS = """
+    SELECT ans.*, ua.activity_type, ua.resource_accessed, ua.ip_address
+    FROM anomaly_scores ans
+    JOIN user_activities ua ON ans.activity_id = ua.activity_id
+    WHERE ans.user_id = %s AND ans.timestamp > %s
+    ORDER BY ans.anomaly_score DESC
+    LIMIT 10
+"""
+
+ACTIVITY_PATTERNS = """
+    SELECT activity_type, COUNT(*) as count,
+           MIN(timestamp) as first_seen, MAX(timestamp) as last_seen
+    FROM user_activities
+    WHERE user_id = %s
+    GROUP BY activity_type
+    ORDER BY count DESC
+"""
+
+# {where} is empty or " WHERE ..." with the filters
+ALERTS_PAGE = """
+    SELECT * FROM alerts{where}
+    ORDER BY timestamp DESC, alert_id DESC LIMIT %s OFFSET %s
+"""
+
+ALERTS_SINCE = """
+    SELECT * FROM alerts WHERE {conditions}
+    ORDER BY timestamp DESC
+"""
+
+# app.py
+
+RECENT_ALERTS = """
+    SELECT
+        a.alert_id as id, a.description as title, a.description, a.severity,
+        a.timestamp, a.is_resolved as status, a.user_id, u.username
+    FROM alerts a
+    LEFT JOIN users u ON a.user_id = u.user_id
+    WHERE a.timestamp > %s
+    ORDER BY a.timestamp DESC
+    LIMIT 50
+"""
+
+ALERT_SUMMARY = """
+    SELECT severity, COUNT(*) as count
+    FROM alerts
+    WHERE timestamp > %s
+    GROUP BY severity
+"""
+
+RISKY_USERS = """
+    SELECT u.user_id, u.username, u.department, u.role,
+           MAX(a.severity) as highest_severity,
+           COUNT(a.alert_id) as alert_count
+    FROM users u
+    JOIN alerts a ON u.user_id = a.user_id
+    WHERE a.is_resolved = FALSE
+    GROUP BY u.user_id, u.username, u.department, u.role
+    ORDER BY
+        CASE
+            WHEN MAX(a.severity) = 'critical' THEN 1
+            WHEN MAX(a.severity) = 'high' THEN 2
+            WHEN MAX(a.severity) = 'medium' THEN 3
+            ELSE 4
+        END,
+        COUNT(a.alert_id) DESC
+    LIMIT 5
+"""
+
+USER_COUNT = "SELECT COUNT(*) as count FROM users"
+
+ACTIVE_USER_COUNT = """
+    SELECT COUNT(DISTINCT user_id) as count
+    FROM user_activities
+    WHERE timestamp > DATE_SUB(NOW(), INTERVAL 7 DAY)
+"""
+
+ADMIN_USER_COUNT = """
+    SELECT COUNT(*) as count
+    FROM users
+    WHERE role = 'admin'
+"""
+
+USERS_WITH_OPEN_ALERTS = """
+    SELECT COUNT(DISTINCT user_id) as count
+    FROM alerts
+    WHERE is_resolved = FALSE
+"""
+
+USER_ACTIVITIES_PAGE = """
+    SELECT * FROM user_activities
+    WHERE {conditions}
+    ORDER BY timestamp DESC, activity_id DESC
+    LIMIT %s
+"""
+
+ACTIVITIES_PAGE = """
+    SELECT ua.activity_id as id, ua.user_id, u.username, ua.activity_type,
+           ua.resource_accessed as resource, ua.ip_address, ua.timestamp,
+           COALESCE((
+               -- Per-row lookup on idx_anomaly_scores_activity instead of
+               -- aggregating the whole anomaly_scores table up front
+               SELECT AVG(ans.anomaly_score) FROM anomaly_scores ans
+               WHERE ans.activity_id = ua.activity_id
+           ), 0) as anomaly_score,
+           ua.action_details as details
+    FROM user_activities ua
+    LEFT JOIN users u ON ua.user_id = u.user_id
+    WHERE {conditions}
+    ORDER BY ua.timestamp DESC, ua.activity_id DESC
+    LIMIT %s
+"""
+
+ACTIVITY_COUNT = """
+    SELECT COUNT(*) as count
+    FROM user_activities
+    WHERE timestamp > DATE_SUB(NOW(), INTERVAL %s HOUR)
+"""
+
+# Anomaly rows are never timestamped before their activity, so the extra bound
+# on ans.timestamp changes nothing but lets MySQL prune anomaly_scores partitions too
+ANOMALOUS_ACTIVITY_COUNT = """
+    SELECT COUNT(*) as count
+    FROM user_activities ua
+    JOIN anomaly_scores ans ON ua.activity_id = ans.activity_id
+    WHERE ua.timestamp > DATE_SUB(NOW(), INTERVAL %s HOUR)
+    AND ans.timestamp > DATE_SUB(NOW(), INTERVAL %s HOUR)
+    AND ans.anomaly_score > 0.5
+"""
+
+AVG_ANOMALY_SCORE = """
+    SELECT AVG(ans.anomaly_score) as avg_score
+    FROM user_activities ua
+    JOIN anomaly_scores ans ON ua.activity_id = ans.activity_id
+    WHERE ua.timestamp > DATE_SUB(NOW(), INTERVAL %s HOUR)
+    AND ans.timestamp > DATE_SUB(NOW(), INTERVAL %s HOUR)
+"""
+
+ANOMALY_DISTRIBUTION = """
+    SELECT ROUND(anomaly_score, 1) as score_range, COUNT(*) as count
+    FROM user_activities ua
+    JOIN anomaly_scores ans ON ua.activity_id = ans.activity_id
+    WHERE ua.timestamp > DATE_SUB(NOW(), INTERVAL %s HOUR)
+    AND ans.timestamp > DATE_SUB(NOW(), INTERVAL %s HOUR)
+    GROUP BY ROUND(anomaly_score, 1)
+    ORDER BY ROUND(anomaly_score, 1)
+"""
@@ -0,0 +1,110 @@
+import logging
+from datetime import datetime, timedelta
+from . import queries
+from .database import get_db
+from .pagination import after
+
+logger = logging.getLogger('database')
+
+# Lookup tables that stay tiny, where a full scan is cheaper than any index:
+# honeytokens holds the deployed decoys, a few dozen rows
+SMALL_TABLES = ('honeytokens',)
+
+# Sorting by an aggregate or expression can't be served by an index
+SORTS_GROUPS = "sorts the grouped rows by an aggregate, which no index can provide"
+
+def hot_queries():
+    """The hot queries of app.py, ueba.py and alert.py with representative parameters
+
+    Each entry is (name, query, params, exempt). The SQL comes from queries.py,
+    which the call sites use too. exempt maps a problem the check would report
+    ('filesort' or 'scan') to the reason it is acceptable for that query; most
+    queries have none.
+    """
+    user_id = 1
+    one_hour_ago = datetime.now() - timedelta(hours=1)
+    one_day_ago = datetime.now() - timedelta(days=1)
+    thirty_days_ago = datetime.now() - timedelta(days=30)
+
+    # The continuation condition of a page after the first
+    page, page_params = after((one_hour_ago, 1000), 'timestamp', 'alert_id')
+    activities_page, activities_page_params = after((one_hour_ago, 1000), 'timestamp', 'activity_id')
+    joined_page, joined_page_params = after((one_hour_ago, 1000), 'ua.timestamp', 'ua.activity_id')
+
+    return [
+        # ueba.py
+        ('ueba.get_user_activities', queries.USER_ACTIVITIES_RECENT, (user_id, thirty_days_ago, 100), {}),
+
+        # alert.py
+        ('alert.anomaly_details', queries.ANOMALY_DETAILS, (user_id, one_day_ago),
+         {'filesort': "range on timestamp, order by score: sorts one user's scores of the last day"}),
+        ('alert.activity_patterns', queries.ACTIVITY_PATTERNS, (user_id,),
+         {'filesort': SORTS_GROUPS + " (one row per activity type)"}),
+        ('alert.get_all_unresolved', queries.ALERTS_PAGE.format(where=" WHERE is_resolved = %s"),
+         (False, 100, 0), {}),
+        ('alert.get_all_unresolved_page', queries.ALERTS_PAGE.format(where=" WHERE is_resolved = %s AND " + page),
+         [False] + page_params + [100, 0], {}),
+        ('alert.get_recent_alerts', queries.ALERTS_SINCE.format(conditions="timestamp > %s AND is_resolved = FALSE"),
+         (one_day_ago,), {}),
+
+        # app.py: the endpoints the dashboard polls
+        ('app.recent_alerts', queries.RECENT_ALERTS, (one_day_ago,), {}),
+        ('app.alert_summary', queries.ALERT_SUMMARY, (one_day_ago,), {}),
+        ('app.risky_users', queries.RISKY_USERS, (),
+         {'filesort': SORTS_GROUPS + " (one row per user with open alerts)"}),
+        ('app.user_count', queries.USER_COUNT, (),
+         {'scan': "COUNT(*) of a whole table reads its smallest index whatever the indexes"}),
+        ('app.active_user_count', queries.ACTIVE_USER_COUNT, (), {}),
+        ('app.admin_user_count', queries.ADMIN_USER_COUNT, (), {}),
+        ('app.users_with_open_alerts', queries.USERS_WITH_OPEN_ALERTS, (), {}),
+        ('app.user_activities_page', queries.USER_ACTIVITIES_PAGE.format(
+            conditions="user_id = %s AND timestamp > DATE_SUB(NOW(), INTERVAL %s DAY) AND " + activities_page),
+         [user_id, 30] + activities_page_params + [100], {}),
+        ('app.activities_page', queries.ACTIVITIES_PAGE.format(
+            conditions="ua.timestamp > DATE_SUB(NOW(), INTERVAL %s HOUR) AND " + joined_page),
+         [24] + joined_page_params + [500], {}),
+        ('app.activity_count', queries.ACTIVITY_COUNT, (24,), {}),
+        ('app.anomalous_activity_count', queries.ANOMALOUS_ACTIVITY_COUNT, (24, 24), {}),
+        ('app.avg_anomaly_score', queries.AVG_ANOMALY_SCORE, (24, 24), {}),
+        ('app.anomaly_distribution', queries.ANOMALY_DISTRIBUTION, (24, 24),
+         {'filesort': SORTS_GROUPS + " (at most 11 ROUND(score, 1) buckets)"}),
+    ]
+
+def check_query_plans():
+    """EXPLAIN every hot query and report full scans and filesorts
+
+    Run it against a populated database (e.g. after seed_demo_data.py): on
+    near-empty tables the optimizer prefers full scans whatever the indexes.
+    Returns a list of (name, problem) tuples; empty means every plan is fine.
+    """
+    db = get_db()
+    problems = []
+
+    if db.backend.name != 'mysql':
+        # The checks below read MySQL's EXPLAIN output
+        logger.info(f"Query plan check skipped: it needs MySQL, not {db.backend.name}")
+        return problems
+
+    for name, query, params, exempt in hot_queries():
+        plan = db.fetch_all("EXPLAIN " + query, params, primary=True)
+        if not plan:
+            problems.append((name, "EXPLAIN failed"))
+            continue
+
+        for row in plan:
+            table = row.get('table') or ''
+            extra = row.get('Extra') or ''
+
+            if row.get('type') in ('ALL', 'index') and table not in SMALL_TABLES and 'scan' not in exempt:
+                problems.append((name, f"full {'index ' if row['type'] == 'index' else ''}scan on {table}"))
+            if 'Using filesort' in extra and 'filesort' not in exempt:
+                problems.append((name, f"filesort on {table}"))
+
+        logger.info(f"Plan for {name}: " + "; ".join(
+            f"{row.get('table')}={row.get('type')}/{row.get('key')}" for row in plan
+        ))
+
+    for name, problem in problems:
+        logger.error(f"Query plan check failed for {name}: {problem}")
+
+    return problems
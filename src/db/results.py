@@ -0,0 +1,51 @@
+from collections import namedtuple
+from decimal import Decimal
+from functools import lru_cache
+import numpy as np
+
+# Result modes accepted by Database.fetch_all / fetch_iter
+RESULT_MODES = ('dict', 'tuple', 'columns')
+
+@lru_cache(maxsize=256)
+def record_type(columns):
+    """Named tuple class for a result's column names (one class per column set)
+
+    Rows are plain tuples underneath: no per-row dict, attribute access by
+    column name (row.alert_id) and positional access (row[0]).
+    Names that aren't identifiers (e.g. COUNT(*) without an alias) are renamed _<index>.
+    """
+    return namedtuple('Row', columns, rename=True)
+
+def to_records(columns, rows):
+    """Turn raw tuple rows into named tuple rows"""
+    make = record_type(tuple(columns))._make
+    return [make(row) for row in rows]
+
+def _column_array(values):
+    """One column as a NumPy array: int64 or float64 when numeric, object otherwise
+
+    NULLs in a numeric column become NaN (so the column is float64).
+    """
+    numeric = True
+    floating = False
+    for value in values:
+        if value is None or isinstance(value, (float, Decimal)):
+            floating = True
+        elif not isinstance(value, int):
+            numeric = False
+            break
+
+    if numeric and values:
+        if floating:
+            return np.array([np.nan if value is None else float(value) for value in values], dtype=np.float64)
+        return np.array(values, dtype=np.int64)
+
+    array = np.empty(len(values), dtype=object)
+    array[:] = values
+    return array
+
+def to_columns(columns, rows):
+    """Turn raw tuple rows into {column: array}, one NumPy array per column"""
+    if not rows:
+        return {column: np.empty(0, dtype=object) for column in columns}
+    return {column: _column_array(list(values)) for column, values in zip(columns, zip(*rows))}
@@ -0,0 +1,157 @@
+import random
+import threading
+import time
+from mysql.connector import errors
+
+# MySQL error codes worth retrying on the same statement
+DEADLOCK_ERRNOS = (1205, 1213)  # Lock wait timeout, deadlock
+
+class CircuitOpenError(errors.Error):
+    """Raised instead of touching the database while the circuit breaker is open"""
+
+def is_transient(error):
+    """Whether an error is worth retrying (failed connect, lost connection, deadlock)
+
+    An exhausted local pool is not: the database is fine, and retrying would
+    only add to the contention for connections.
+    """
+    if isinstance(error, (CircuitOpenError, errors.PoolError)):
+        return False
+    if isinstance(error, (errors.InterfaceError, errors.OperationalError)):
+        return True
+    return getattr(error, 'errno', None) in DEADLOCK_ERRNOS
+
+class RetryPolicy:
+    """Exponential backoff with full jitter, bounded by a per-process retry budget
+
+    Every first attempt deposits ``budget_ratio`` tokens into the budget (capped
+    at ``budget_max``) and every retry spends one. When the database is down,
+    the budget runs dry quickly and callers stop piling retries on top of it.
+    """
+
+    def __init__(self, max_attempts=3, base_delay=0.05, max_delay=2.0, budget_ratio=0.2, budget_max=20):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.budget_ratio = budget_ratio
+        self.budget_max = budget_max
+
+        self._tokens = float(budget_max)
+        self._lock = threading.Lock()
+        self.retries = 0
+        self.budget_exhausted = 0
+
+    def record_request(self):
+        """Credit the retry budget for a new operation"""
+        with self._lock:
+            self._tokens = min(self.budget_max, self._tokens + self.budget_ratio)
+
+    def try_spend(self):
+        """Take one retry from the budget, returning False if none are left"""
+        with self._lock:
+            if self._tokens >= 1:
+                self._tokens -= 1
+                self.retries += 1
+                return True
+            self.budget_exhausted += 1
+            return False
+
+    def backoff(self, attempt):
+        """Delay before retry number ``attempt`` (1-based), with full jitter"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    def stats(self):
+        with self._lock:
+            return {
+                'max_attempts': self.max_attempts,
+                'budget_tokens': round(self._tokens, 2),
+                'retries': self.retries,
+                'budget_exhausted': self.budget_exhausted
+            }
+
+class CircuitBreaker:
+    """Fail fast while the database is down
+
+    After ``failure_threshold`` consecutive transient failures the breaker opens
+    and every call is refused for ``reset_timeout`` seconds. It then lets a
+    single trial call through (half-open): success closes it again, failure
+    re-opens it for another timeout. A trial whose outcome is never recorded
+    is given up on after ``trial_timeout`` seconds (default ``reset_timeout``)
+    and another one is let through.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold=5, reset_timeout=30, trial_timeout=None):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.trial_timeout = reset_timeout if trial_timeout is None else trial_timeout
+
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = None
+        self._trial_in_flight = False
+        self._trial_started = None
+        self._lock = threading.Lock()
+        self.times_opened = 0
+        self.rejected = 0
+
+    def allow(self):
+        """Whether a call may go to the database right now"""
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+
+            if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self._state = self.HALF_OPEN
+                self._trial_in_flight = False
+
+            if self._state == self.HALF_OPEN:
+                now = time.monotonic()
+                if not self._trial_in_flight or now - self._trial_started >= self.trial_timeout:
+                    self._trial_in_flight = True
+                    self._trial_started = now
+                    return True
+
+            self.rejected += 1
+            return False
+
+    def release_trial(self):
+        """Give back a half-open trial that never reached the database"""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_success(self):
+        with self._lock:
+            self._state = self.CLOSED
+            self._failures = 0
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != self.OPEN:
+                    self.times_opened += 1
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+                self._trial_in_flight = False
+
+    @property
+    def state(self):
+        return self._state
+
+    def stats(self):
+        with self._lock:
+            retry_in = None
+            if self._state == self.OPEN:
+                retry_in = max(0.0, self.reset_timeout - (time.monotonic() - self._opened_at))
+            return {
+                'state': self._state,
+                'consecutive_failures': self._failures,
+                'retry_in': retry_in,
+                'times_opened': self.times_opened,
+                'rejected': self.rejected
+            }
@@ -1,4 +1,5 @@
 -- Honeytoken System Database Schema
+-- Baseline only: apply src/db/migrations/ afterwards with `python run.py --migrate`
 
 -- Drop database if exists and create a new one
 DROP DATABASE IF EXISTS honeytoken_ueba;
@@ -0,0 +1,161 @@
+-- Honeytoken System Database Schema (SQLite backend)
+-- Same tables as schema.sql; created automatically when DB_BACKEND=sqlite opens an empty file.
+-- Baseline only: the backend applies src/db/migrations/ on top of it when it opens the file
+-- Timestamps are stored as local time text ('YYYY-MM-DD HH:MM:SS'), like MySQL's NOW()
+
+-- Create Users table
+CREATE TABLE users (
+    user_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    username VARCHAR(50) NOT NULL UNIQUE,
+    email VARCHAR(100) NOT NULL UNIQUE,
+    department VARCHAR(50) NOT NULL,
+    role VARCHAR(50) NOT NULL,
+    created_at TIMESTAMP DEFAULT (datetime('now', 'localtime')),
+    last_login TIMESTAMP NULL,
+    is_active BOOLEAN DEFAULT 1
+);
+
+-- Create Honeytokens table
+CREATE TABLE honeytokens (
+    token_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    token_name VARCHAR(100) NOT NULL,
+    token_type TEXT NOT NULL CHECK (token_type IN ('file', 'database', 'api_key', 'credentials', 'document')),
+    token_value TEXT NOT NULL,
+    token_location TEXT NOT NULL,
+    description TEXT,
+    created_at TIMESTAMP DEFAULT (datetime('now', 'localtime')),
+    is_active BOOLEAN DEFAULT 1,
+    sensitivity_level TEXT DEFAULT 'medium' CHECK (sensitivity_level IN ('low', 'medium', 'high', 'critical')),
+    expected_access_pattern TEXT
+);
+
+-- Create UserActivity table for UEBA
+CREATE TABLE user_activities (
+    activity_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INT REFERENCES users(user_id),
+    activity_type VARCHAR(50) NOT NULL,
+    timestamp TIMESTAMP NOT NULL DEFAULT (datetime('now', 'localtime')),
+    ip_address VARCHAR(45) NOT NULL,
+    user_agent TEXT,
+    resource_accessed VARCHAR(255),
+    action_details TEXT,
+    session_id VARCHAR(100)
+);
+
+-- Create HoneytokenAccess table
+CREATE TABLE honeytoken_access (
+    access_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    token_id INT NOT NULL REFERENCES honeytokens(token_id),
+    user_id INT REFERENCES users(user_id),
+    ip_address VARCHAR(45) NOT NULL,
+    user_agent TEXT,
+    access_time TIMESTAMP DEFAULT (datetime('now', 'localtime')),
+    access_method VARCHAR(50),
+    additional_context TEXT,
+    is_authorized BOOLEAN DEFAULT 0,
+    access_duration INT DEFAULT 0  -- Duration in seconds
+);
+
+-- Create Alerts table
+CREATE TABLE alerts (
+    alert_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    token_id INT REFERENCES honeytokens(token_id),
+    user_id INT REFERENCES users(user_id),
+    access_id INT REFERENCES honeytoken_access(access_id),
+    alert_type TEXT NOT NULL CHECK (alert_type IN ('access', 'unusual_behavior', 'multiple_access', 'unauthorized')),
+    severity TEXT NOT NULL CHECK (severity IN ('low', 'medium', 'high', 'critical')),
+    timestamp TIMESTAMP DEFAULT (datetime('now', 'localtime')),
+    description TEXT NOT NULL,
+    is_resolved BOOLEAN DEFAULT 0,
+    resolved_by INT REFERENCES users(user_id),
+    resolution_notes TEXT,
+    forensic_evidence TEXT
+);
+
+-- Create BehavioralBaselines table for UEBA
+CREATE TABLE behavioral_baselines (
+    baseline_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INT NOT NULL REFERENCES users(user_id),
+    feature_name VARCHAR(100) NOT NULL,
+    feature_value FLOAT NOT NULL,
+    confidence_score FLOAT DEFAULT 0.8,
+    last_updated TIMESTAMP DEFAULT (datetime('now', 'localtime')),
+    UNIQUE (user_id, feature_name)
+);
+
+-- Create AnomalyScores table for UEBA
+CREATE TABLE anomaly_scores (
+    anomaly_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INT NOT NULL REFERENCES users(user_id),
+    activity_id INT NOT NULL,
+    feature_name VARCHAR(100) NOT NULL,
+    expected_value FLOAT,
+    actual_value FLOAT,
+    anomaly_score FLOAT NOT NULL,
+    timestamp TIMESTAMP NOT NULL DEFAULT (datetime('now', 'localtime'))
+);
+
+-- Create ForensicLogs table for detailed forensic evidence
+CREATE TABLE forensic_logs (
+    log_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    alert_id INT REFERENCES alerts(alert_id),
+    access_id INT REFERENCES honeytoken_access(access_id),
+    log_type TEXT NOT NULL CHECK (log_type IN ('system', 'network', 'file', 'database', 'application')),
+    timestamp TIMESTAMP DEFAULT (datetime('now', 'localtime')),
+    source VARCHAR(255) NOT NULL,
+    log_data TEXT NOT NULL,
+    hash_value VARCHAR(255)  -- For integrity verification
+);
+
+-- Create AuditTrail table for system auditing
+CREATE TABLE audit_trail (
+    audit_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INT REFERENCES users(user_id),
+    action VARCHAR(100) NOT NULL,
+    entity_type VARCHAR(50) NOT NULL,
+    entity_id INT NOT NULL,
+    old_value TEXT,
+    new_value TEXT,
+    timestamp TIMESTAMP DEFAULT (datetime('now', 'localtime')),
+    ip_address VARCHAR(45)
+);
+
+-- Insert some initial data for testing
+INSERT INTO users (username, email, department, role) VALUES
+('admin', 'admin@example.com', 'IT', 'Administrator'),
+('jsmith', 'jsmith@example.com', 'Finance', 'Analyst'),
+('apatil', 'apatil@example.com', 'HR', 'Manager'),
+('rjones', 'rjones@example.com', 'Engineering', 'Developer');
+
+-- Create views for easy querying
+CREATE VIEW active_honeytokens AS
+SELECT * FROM honeytokens WHERE is_active = 1;
+
+CREATE VIEW unresolved_alerts AS
+SELECT a.*, h.token_name, h.token_type, u.username
+FROM alerts a
+JOIN honeytokens h ON a.token_id = h.token_id
+LEFT JOIN users u ON a.user_id = u.user_id
+WHERE a.is_resolved = 0;
+
+CREATE VIEW user_risk_scores AS
+SELECT
+    u.user_id,
+    u.username,
+    COUNT(a.alert_id) AS total_alerts,
+    SUM(CASE WHEN a.severity = 'critical' THEN 4
+             WHEN a.severity = 'high' THEN 3
+             WHEN a.severity = 'medium' THEN 2
+             WHEN a.severity = 'low' THEN 1
+             ELSE 0 END) AS risk_score
+FROM users u
+LEFT JOIN alerts a ON u.user_id = a.user_id
+GROUP BY u.user_id, u.username;
+
+-- Create indexes for performance
+CREATE INDEX idx_user_activities_user ON user_activities(user_id);
+CREATE INDEX idx_user_activities_timestamp ON user_activities(timestamp);
+CREATE INDEX idx_honeytoken_access_token ON honeytoken_access(token_id);
+CREATE INDEX idx_honeytoken_access_time ON honeytoken_access(access_time);
+CREATE INDEX idx_alerts_timestamp ON alerts(timestamp);
+CREATE INDEX idx_alerts_severity ON alerts(severity);
@@ -0,0 +1,412 @@
+import atexit
+import logging
+import queue
+import threading
+import time
+from mysql.connector import Error
+
+logger = logging.getLogger('database')
+
+class PendingId:
+    """Placeholder for the ID of a queued row, filled in once the row is written
+
+    A PendingId can be used as a column value of another queued row (e.g. the
+    activity_id of an anomaly score); the writer substitutes the real ID.
+    """
+
+    def __init__(self):
+        self.value = None
+        self._written = threading.Event()
+
+    def resolve(self, value):
+        self.value = value
+        self._written.set()
+
+    def wait(self, timeout=None):
+        """Block until the row is written; returns its ID (None if it was dropped)"""
+        self._written.wait(timeout)
+        return self.value
+
+    def __repr__(self):
+        return f"PendingId({self.value})"
+
+def resolve_id(value):
+    """The ID behind a PendingId if it is known yet, otherwise the value itself"""
+    return value.value if isinstance(value, PendingId) else value
+
+class WriteBehindBuffer:
+    """Bounded in-process queue of writes drained by a background writer thread
+
+    Queued inserts are grouped per table into multi-row INSERTs, queued
+    upserts per table into multi-row upserts, and both updates and upserts
+    are coalesced per row (last write wins, except for the add_columns of an
+    upsert, whose queued values are summed). A flush happens when
+    ``flush_rows`` writes are waiting or ``flush_interval`` seconds after the
+    first one, and writes everything in one transaction, tables of parent rows
+    before the tables whose rows reference their PendingIds. A failed flush is retried
+    ``max_attempts`` times before its writes are dropped (and logged).
+
+    When the queue is full, writers block for up to ``put_timeout`` seconds
+    (backpressure) before the write is rejected. Everything still queued is
+    flushed at interpreter exit.
+    """
+
+    def __init__(self, db, max_queue=10000, flush_rows=500, flush_interval=0.5, put_timeout=5.0, max_attempts=3):
+        self.db = db
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+        self.put_timeout = put_timeout
+        self.max_attempts = max_attempts
+
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        # Latest queued state per keyed row, so readers can see writes not flushed yet
+        self._overlay = {}
+        self._version = 0
+        self._closed = False
+
+        # Counters
+        self.queued = 0
+        self.written = 0
+        self.dropped = 0
+        self.rejected = 0
+        self.blocked = 0
+        self.flushes = 0
+        self.failed_flushes = 0
+        self.last_flush_time = 0.0
+
+        self._thread = threading.Thread(target=self._run, name='db-write-behind', daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def _put(self, op):
+        if self._closed:
+            return False
+        try:
+            self._queue.put_nowait(op)
+        except queue.Full:
+            with self._lock:
+                self.blocked += 1
+            try:
+                self._queue.put(op, timeout=self.put_timeout)
+            except queue.Full:
+                with self._lock:
+                    self.rejected += 1
+                logger.error(f"Write-behind queue full for {self.put_timeout}s, rejecting write to {op[1]}")
+                return False
+        with self._lock:
+            self.queued += 1
+        return True
+
+    def _remember(self, table, key, data):
+        """Record the queued state of a keyed row and return its version"""
+        with self._lock:
+            self._version += 1
+            entry = self._overlay.get((table, key))
+            merged = dict(entry[1]) if entry else dict(key)
+            merged.update(data)
+            self._overlay[(table, key)] = (self._version, merged)
+            return self._version
+
+    def insert(self, table, data, key=None):
+        """Queue an insert and return a PendingId for its row (None if rejected)
+
+        key (a dict of identifying columns) makes later update() calls for the
+        same row coalesce into this insert and makes the row visible to pending().
+        """
+        key = tuple(sorted(key.items())) if key else None
+        version = self._remember(table, key, data) if key else None
+        pending = PendingId()
+        if not self._put(('insert', table, dict(data), key, pending, version, ())):
+            self._forget([(table, key, version)])
+            return None
+        return pending
+
+    def update(self, table, data, condition):
+        """Queue an update of the row matching condition (coalesced, last write wins)"""
+        key = tuple(sorted(condition.items()))
+        version = self._remember(table, key, data)
+        if not self._put(('update', table, dict(data), key, None, version, ())):
+            self._forget([(table, key, version)])
+            return False
+        return True
+
+    def upsert(self, table, data, key_columns, add_columns=()):
+        """Queue an upsert of data on its unique key_columns (coalesced, last write wins)
+
+        add_columns are added to the stored values instead (counters), and
+        queued upserts of the same row add up. Such a row holds deltas rather
+        than its state, so it isn't visible to pending().
+        """
+        key = tuple(sorted((column, data[column]) for column in key_columns))
+        add_columns = tuple(add_columns)
+        version = None if add_columns else self._remember(table, key, data)
+        if not self._put(('upsert', table, dict(data), key, None, version, add_columns)):
+            self._forget([(table, key, version)])
+            return False
+        return True
+
+    def pending(self, table, match):
+        """Queued (not yet written) state of the keyed rows of table matching match"""
+        with self._lock:
+            return [
+                dict(data) for (entry_table, _), (_, data) in self._overlay.items()
+                if entry_table == table and all(data.get(k) == v for k, v in match.items())
+            ]
+
+    def _forget(self, keyed):
+        """Drop overlay entries once written, unless a newer write superseded them"""
+        with self._lock:
+            for table, key, version in keyed:
+                if key is None:
+                    continue
+                entry = self._overlay.get((table, key))
+                if entry and entry[0] == version:
+                    del self._overlay[(table, key)]
+
+    def flush(self, timeout=None):
+        """Block until everything queued before this call has been written"""
+        if self._closed:
+            # The writer takes everything still queued on its way out; wait for it
+            # instead of for a flush it will never see
+            self._thread.join(timeout)
+            return not self._thread.is_alive()
+        done = threading.Event()
+        self._queue.put(('flush', done))
+        return done.wait(timeout)
+
+    def close(self, timeout=30):
+        """Flush everything still queued and stop the writer thread"""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(('stop', None))
+        self._thread.join(timeout)
+
+    def _run(self):
+        while True:
+            batch = []
+            waiters = []
+            stop = False
+            deadline = None
+
+            while True:
+                timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+                try:
+                    op = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if op[0] == 'flush':
+                    waiters.append(op[1])
+                    break
+                if op[0] == 'stop':
+                    stop = True
+                    break
+                batch.append(op)
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_interval
+                if len(batch) >= self.flush_rows:
+                    break
+
+            if stop:
+                # Shutting down: take whatever is still queued as well
+                while True:
+                    try:
+                        op = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if op[0] in ('insert', 'update', 'upsert'):
+                        batch.append(op)
+                    elif op[0] == 'flush':
+                        waiters.append(op[1])
+
+            if batch:
+                try:
+                    self._flush(batch)
+                except Exception as e:
+                    logger.error(f"Write-behind writer error: {e}")
+
+            for waiter in waiters:
+                waiter.set()
+            if stop:
+                return
+
+    def _plan(self, ops):
+        """Group queued ops into per-table inserts (in queue order), upserts and coalesced updates"""
+        inserts = []
+        keyed_inserts = {}
+        upserts = {}
+        updates = {}
+
+        for kind, table, data, key, pending, version, add_columns in ops:
+            if kind == 'insert':
+                row = dict(data)
+                inserts.append((table, row, pending))
+                if key:
+                    keyed_inserts[(table, key)] = row
+            elif kind == 'upsert':
+                row, _ = upserts.setdefault((table, key), ({}, add_columns))
+                for column, value in data.items():
+                    if column in add_columns and column in row:
+                        row[column] += value
+                    else:
+                        row[column] = value
+            elif (table, key) in keyed_inserts and (table, key) not in updates:
+                # Updating a row inserted in this same flush: fold it into the insert
+                keyed_inserts[(table, key)].update(data)
+            else:
+                condition, merged = updates.get((table, key), (dict(key), {}))
+                merged.update(data)
+                updates[(table, key)] = (condition, merged)
+
+        # One multi-row INSERT per table and column set
+        groups = {}
+        table_order = {}
+        for table, row, pending in inserts:
+            table_order.setdefault(table, len(table_order))
+            groups.setdefault((table, tuple(sorted(row))), []).append((row, pending))
+
+        # Tables whose queued rows reference PendingIds of another table in this flush
+        owners = {pending: table for table, _, pending in inserts if pending is not None}
+        parents = {table: set() for table in table_order}
+        for table, row, _ in inserts:
+            for value in row.values():
+                parent = owners.get(value) if isinstance(value, PendingId) else None
+                if parent is not None and parent != table:
+                    parents[table].add(parent)
+
+        # Parent tables are written before the tables referencing them (the flush may
+        # start with children of a row queued later); otherwise tables keep the order
+        # they first appeared in
+        rank = {}
+
+        def visit(table, path):
+            if table in rank or table in path:
+                return
+            path.add(table)
+            for parent in sorted(parents[table], key=table_order.get):
+                visit(parent, path)
+            path.discard(table)
+            rank[table] = len(rank)
+
+        for table in table_order:
+            visit(table, set())
+
+        ordered = sorted(groups.items(), key=lambda item: rank[item[0][0]])
+
+        # One multi-row upsert per table, key columns, column set and added columns
+        upsert_groups = {}
+        for (table, key), (row, add_columns) in upserts.items():
+            key_columns = tuple(column for column, _ in key)
+            upsert_groups.setdefault((table, key_columns, tuple(sorted(row)), add_columns), []).append(row)
+
+        return ordered, list(upsert_groups.items()), list(updates.items())
+
+    def _write(self, groups, upserts, updates):
+        """Write one flush in a transaction
+        
+        Returns ({PendingId: id}, rows dropped) or (None, 0) if the transaction failed.
+        """
+        ids = {}
+        dropped = 0
+
+        with self.db.transaction() as txn:
+            for (table, _), entries in groups:
+                rows = []
+                owners = []
+                for row, pending in entries:
+                    resolved = {}
+                    for column, value in row.items():
+                        if isinstance(value, PendingId):
+                            value = ids[value] if value in ids else value.value
+                            if value is None:
+                                break
+                        resolved[column] = value
+                    else:
+                        rows.append(resolved)
+                        owners.append(pending)
+                        continue
+                    # Its parent row was dropped, so this one cannot be written either
+                    dropped += 1
+                    if pending:
+                        ids[pending] = None
+
+                new_ids = self.db.insert_many(table, rows)
+                if txn.failed:
+                    return None, 0
+                for pending, new_id in zip(owners, new_ids):
+                    if pending:
+                        ids[pending] = new_id
+
+            for (table, key_columns, _, add_columns), rows in upserts:
+                self.db.upsert_many(table, rows, key_columns, add_columns=add_columns)
+                if txn.failed:
+                    return None, 0
+
+            for (table, _), (condition, data) in updates:
+                self.db.update(table, data, condition)
+                if txn.failed:
+                    return None, 0
+
+        if txn.failed:
+            return None, 0
+        if dropped:
+            logger.error(f"Write-behind dropped {dropped} rows whose parent rows were not written")
+        return ids, dropped
+
+    def _flush(self, ops):
+        started = time.monotonic()
+        keyed = [(table, key, version) for _, table, _, key, _, version, _ in ops]
+        pendings = [op[4] for op in ops if op[4] is not None]
+
+        ids = None
+        dropped = 0
+        try:
+            groups, upserts, updates = self._plan(ops)
+            for attempt in range(1, self.max_attempts + 1):
+                try:
+                    ids, dropped = self._write(groups, upserts, updates)
+                except Error as e:
+                    logger.error(f"Write-behind flush failed: {e}")
+                    ids = None
+                if ids is not None:
+                    break
+                with self._lock:
+                    self.failed_flushes += 1
+                if attempt < self.max_attempts:
+                    time.sleep(self.db.retry_policy.backoff(attempt))
+        finally:
+            # Also when planning or writing raised something else (e.g. a value the
+            # connector can't convert): nobody may be left waiting on a PendingId
+            if ids is None:
+                logger.error(f"Write-behind flush failed, dropping {len(ops)} writes")
+                for pending in pendings:
+                    pending.resolve(None)
+            else:
+                for pending in pendings:
+                    pending.resolve(ids.get(pending))
+
+            self._forget(keyed)
+            with self._lock:
+                self.flushes += 1
+                if ids is None:
+                    self.dropped += len(ops)
+                else:
+                    self.written += len(ops) - dropped
+                    self.dropped += dropped
+                self.last_flush_time = time.monotonic() - started
+
+    def stats(self):
+        with self._lock:
+            return {
+                'queue_depth': self._queue.qsize(),
+                'max_queue': self._queue.maxsize,
+                'queued': self.queued,
+                'written': self.written,
+                'dropped': self.dropped,
+                'rejected': self.rejected,
+                'blocked': self.blocked,
+                'flushes': self.flushes,
+                'failed_flushes': self.failed_flushes,
+                'last_flush_ms': round(self.last_flush_time * 1000, 3)
+            }
@@ -3,7 +3,11 @@ import json
 import hashlib
 import time
 from datetime import datetime, timedelta
+from mysql.connector import Error
 from ..db.database import get_db
+from ..db import queries
+from ..db.pagination import after, decode_cursor
+from .risk import record_risk
 
 # Set up logging
 logging.basicConfig(
@@ -77,14 +81,26 @@ class Alert:
             self.db.update('alerts', data, condition)
             logger.info(f"Updated alert {self.alert_id}")
         else:
-            # Create new alert
-            self.alert_id = self.db.insert('alerts', data)
+            # Create new alert, counting it towards the user's risk
+            try:
+                with self.db.transaction() as txn:
+                    self.alert_id = self.db.insert('alerts', data)
+                    if self.alert_id:
+                        record_risk(self.db, [data])
+            except Error as e:
+                logger.error(f"Failed to create alert: {e}")
+                return None
+            if txn.failed:
+                # The insert was rolled back with the risk update
+                self.alert_id = None
+                logger.error("Failed to create alert, changes rolled back")
+                return None
             logger.info(f"Created new alert {self.alert_id}")
             
         return self.alert_id
         
     def resolve(self, user_id, notes=None):
-        """Mark an alert as resolved"""
+        """Mark an alert as resolved (False if that failed)"""
         self.is_resolved = True
         self.resolved_by = user_id
         self.resolution_notes = notes
@@ -95,8 +111,24 @@ class Alert:
             'resolution_notes': notes
         }
         
-        condition = {'alert_id': self.alert_id}
-        self.db.update('alerts', data, condition)
+        try:
+            with self.db.transaction() as txn:
+                # Resolved alerts no longer count towards the user's risk. Only the
+                # update that flips is_resolved takes it out, so two concurrent
+                # resolves can't subtract it twice
+                if self.db.update('alerts', data, {'alert_id': self.alert_id, 'is_resolved': False}):
+                    if self.user_id and self.timestamp:
+                        record_risk(self.db, [{'user_id': self.user_id, 'severity': self.severity}],
+                                    when=self.timestamp, sign=-1)
+                else:
+                    # Already resolved: just record who resolved it this time
+                    self.db.update('alerts', data, {'alert_id': self.alert_id})
+        except Error as e:
+            logger.error(f"Failed to resolve alert {self.alert_id}: {e}")
+            return False
+        if txn.failed:
+            logger.error(f"Failed to resolve alert {self.alert_id}, changes rolled back")
+            return False
         
         # Log the resolution
         self.db.audit_action(
@@ -126,7 +158,8 @@ class Alert:
             WHERE ha.access_id = %s
             """
             
-            access_details = self.db.fetch_one(query, (self.access_id,))
+            # The access record was usually written moments ago, so read it from the primary
+            access_details = self.db.fetch_one(query, (self.access_id,), primary=True)
             if access_details:
                 evidence['access_details'] = {
                     'access_id': access_details['access_id'],
@@ -163,17 +196,8 @@ class Alert:
         # If this is a behavioral alert, gather anomaly details
         elif self.alert_type == 'unusual_behavior' and self.user_id:
             # Get recent anomaly scores for this user
-            query = """
-            SELECT ans.*, ua.activity_type, ua.resource_accessed, ua.ip_address
-            FROM anomaly_scores ans
-            JOIN user_activities ua ON ans.activity_id = ua.activity_id
-            WHERE ans.user_id = %s AND ans.timestamp > %s
-            ORDER BY ans.anomaly_score DESC
-            LIMIT 10
-            """
-            
             one_day_ago = datetime.now() - timedelta(days=1)
-            anomalies = self.db.fetch_all(query, (self.user_id, one_day_ago))
+            anomalies = self.db.fetch_all(queries.ANOMALY_DETAILS, (self.user_id, one_day_ago))
             
             if anomalies:
                 evidence['anomaly_details'] = []
@@ -191,16 +215,7 @@ class Alert:
                     })
                     
             # Get user activity pattern
-            query = """
-            SELECT activity_type, COUNT(*) as count, 
-                   MIN(timestamp) as first_seen, MAX(timestamp) as last_seen
-            FROM user_activities
-            WHERE user_id = %s
-            GROUP BY activity_type
-            ORDER BY count DESC
-            """
-            
-            activity_patterns = self.db.fetch_all(query, (self.user_id,))
+            activity_patterns = self.db.fetch_all(queries.ACTIVITY_PATTERNS, (self.user_id,))
             
             if activity_patterns:
                 evidence['user_activity_patterns'] = []
@@ -250,12 +265,20 @@ class Alert:
         return Alert(alert_id)
         
     @staticmethod
-    def get_all(resolved=None, severity=None, limit=100, offset=0):
-        """Get all alerts with optional filtering"""
+    def get_all(resolved=None, severity=None, limit=100, offset=0, cursor=None):
+        """Get all alerts with optional filtering, newest first
+        
+        Pass the cursor of the previous page (see pagination.next_cursor) to
+        continue after it instead of using offset; deep pages then cost the
+        same as the first. Raises InvalidCursor for a malformed cursor and
+        ValueError if both an offset and a cursor are given.
+        """
+        if cursor and offset:
+            raise ValueError("offset can't be combined with a cursor")
+            
         db = get_db()
         
         # Build query
-        query = "SELECT * FROM alerts"
         conditions = []
         params = []
         
@@ -267,31 +290,33 @@ class Alert:
             conditions.append("severity = %s")
             params.append(severity)
             
-        if conditions:
-            query += " WHERE " + " AND ".join(conditions)
+        if cursor:
+            condition, cursor_params = after(decode_cursor(cursor), 'timestamp', 'alert_id')
+            conditions.append(condition)
+            params.extend(cursor_params)
             
-        query += " ORDER BY timestamp DESC LIMIT %s OFFSET %s"
+        where = " WHERE " + " AND ".join(conditions) if conditions else ""
         params.extend([limit, offset])
         
-        # Execute query
-        results = db.fetch_all(query, params)
+        # Execute query (named tuple rows: no per-row dict before the Alert objects)
+        results = db.fetch_all(queries.ALERTS_PAGE.format(where=where), params, result='tuple')
         
         # Convert to Alert objects
         alerts = []
         for result in results:
             alert = Alert()
-            alert.alert_id = result['alert_id']
-            alert.token_id = result['token_id']
-            alert.user_id = result['user_id']
-            alert.access_id = result['access_id']
-            alert.alert_type = result['alert_type']
-            alert.severity = result['severity']
-            alert.timestamp = result['timestamp']
-            alert.description = result['description']
-            alert.is_resolved = result['is_resolved']
-            alert.resolved_by = result['resolved_by']
-            alert.resolution_notes = result['resolution_notes']
-            alert.forensic_evidence = result['forensic_evidence']
+            alert.alert_id = result.alert_id
+            alert.token_id = result.token_id
+            alert.user_id = result.user_id
+            alert.access_id = result.access_id
+            alert.alert_type = result.alert_type
+            alert.severity = result.severity
+            alert.timestamp = result.timestamp
+            alert.description = result.description
+            alert.is_resolved = result.is_resolved
+            alert.resolved_by = result.resolved_by
+            alert.resolution_notes = result.resolution_notes
+            alert.forensic_evidence = result.forensic_evidence
             alerts.append(alert)
             
         return alerts
@@ -371,14 +396,11 @@ class AlertManager:
         """Get recent alerts from the last N hours"""
         start_time = datetime.now() - timedelta(hours=hours)
         
-        query = "SELECT * FROM alerts WHERE timestamp > %s"
-        params = [start_time]
-        
+        conditions = "timestamp > %s"
         if not include_resolved:
-            query += " AND is_resolved = FALSE"
+            conditions += " AND is_resolved = FALSE"
             
-        query += " ORDER BY timestamp DESC"
-        results = self.db.fetch_all(query, params)
+        results = self.db.fetch_all(queries.ALERTS_SINCE.format(conditions=conditions), (start_time,))
         
         # Enrich with token and user data
         enriched_alerts = []
@@ -6,6 +6,7 @@ import hashlib
 import random
 import string
 from datetime import datetime
+from mysql.connector import Error
 from ..db.database import get_db
 
 # Set up logging
@@ -123,54 +124,79 @@ class Honeytoken:
         query = "SELECT * FROM honeytokens"
         if active_only:
             query += " WHERE is_active = TRUE"
-        results = db.fetch_all(query)
+        results = db.fetch_all(query, result='tuple')
         
         tokens = []
         for result in results:
             token = Honeytoken()
-            token.token_id = result['token_id']
-            token.name = result['token_name']
-            token.token_type = result['token_type']
-            token.value = result['token_value']
-            token.location = result['token_location']
-            token.description = result['description']
-            token.sensitivity = result['sensitivity_level']
-            token.created_at = result['created_at']
-            token.is_active = result['is_active']
+            token.token_id = result.token_id
+            token.name = result.token_name
+            token.token_type = result.token_type
+            token.value = result.token_value
+            token.location = result.token_location
+            token.description = result.description
+            token.sensitivity = result.sensitivity_level
+            token.created_at = result.created_at
+            token.is_active = result.is_active
             tokens.append(token)
         
         return tokens
         
     @staticmethod
     def log_access(token_id, user_id, ip_address, user_agent=None, method=None, context=None, is_authorized=False):
-        """Log access to a honeytoken"""
+        """Log access to a honeytoken
+        
+        The access record and its alert commit together in one transaction.
+        The forensic log is written only after that commit, so a failure there
+        can't roll the access back. If the transaction fails, the access is
+        written again on its own (the alert in its own transaction), so the
+        evidence isn't lost with the alert.
+        """
         db = get_db()
-        access_id = db.log_honeytoken_access(
-            token_id, user_id, ip_address, user_agent, method, context, is_authorized
-        )
         
-        # Create forensic logs
-        if access_id:
-            forensic_data = {
-                'timestamp': datetime.now().isoformat(),
-                'token_id': token_id,
-                'user_id': user_id,
-                'ip_address': ip_address,
-                'user_agent': user_agent,
-                'method': method,
-                'context': context,
-                'is_authorized': is_authorized
-            }
+        access_id = None
+        try:
+            with db.transaction() as txn:
+                access_id = db.log_honeytoken_access(
+                    token_id, user_id, ip_address, user_agent, method, context, is_authorized
+                )
+            if txn.failed:
+                access_id = None
+        except Error as e:
+            # transaction() rolled back (e.g. the commit failed), so the ID is gone too
+            access_id = None
+            logger.error(f"Failed to log access to honeytoken {token_id} in a transaction: {e}")
             
-            # Log the raw data for forensic analysis
-            db.create_forensic_log(
-                access_id=access_id,
-                log_type='application',
-                source='honeytoken_system',
-                log_data=json.dumps(forensic_data, indent=2)
+        if not access_id:
+            access_id = db.log_honeytoken_access(
+                token_id, user_id, ip_address, user_agent, method, context, is_authorized
             )
+        if not access_id:
+            logger.error(f"Failed to log access to honeytoken {token_id}")
+            return None
             
-            logger.warning(f"Honeytoken access detected - Token ID: {token_id}, User ID: {user_id}, IP: {ip_address}")
+        logger.warning(f"Honeytoken access detected - Token ID: {token_id}, User ID: {user_id}, IP: {ip_address}")
+        
+        # Create forensic logs
+        forensic_data = {
+            'timestamp': datetime.now().isoformat(),
+            'token_id': token_id,
+            'user_id': user_id,
+            'ip_address': ip_address,
+            'user_agent': user_agent,
+            'method': method,
+            'context': context,
+            'is_authorized': is_authorized
+        }
+        
+        # Log the raw data for forensic analysis
+        if not db.create_forensic_log(
+            access_id=access_id,
+            log_type='application',
+            source='honeytoken_system',
+            log_data=json.dumps(forensic_data, indent=2)
+        ):
+            logger.error(f"Failed to write the forensic log of honeytoken access {access_id}")
         
         return access_id
 
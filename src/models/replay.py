@@ -0,0 +1,193 @@
+import csv
+import heapq
+import logging
+import multiprocessing
+import os
+from datetime import datetime
+from ..db.database import get_db
+from .tracking import SlidingWindowTracker
+from .ueba import (UEBAEngine, FEATURE_NAMES, FEATURE_ALERT_THRESHOLD, OVERALL_ALERT_THRESHOLD,
+                   ANOMALY_SCORING, BASELINE_FORGETTING, IP_WINDOW, RESOURCE_WINDOW, RESOURCE_LIMIT,
+                   tracker_size)
+
+logger = logging.getLogger('ueba')
+
+# Activities scored per score_batch() call in each worker
+REPLAY_CHUNK_SIZE = 5000
+
+RESULT_COLUMNS = (('activity_id', 'user_id', 'timestamp', 'overall_score')
+                  + FEATURE_NAMES
+                  + ('feature_alerts', 'ip_anomaly', 'resource_anomaly', 'alert'))
+
+def _replay_partition(partition, partitions, start, end, options, path):
+    """Replay the activities of the users with user_id % partitions == partition
+
+    Streams them in timestamp order, scores them chunk by chunk against
+    baselines that start empty, applies the IP and resource checks with
+    trackers of its own, and writes one CSV row per activity to path.
+    Returns {day: [activities, feature alerts, activity alerts]}.
+    """
+    db = get_db()
+    engine = UEBAEngine(scoring=options['scoring'], forgetting=options['forgetting'])
+    baselines = {}
+    ip_tracker = SlidingWindowTracker(IP_WINDOW, max_users=options['max_users'])
+    resource_tracker = SlidingWindowTracker(RESOURCE_WINDOW, max_users=options['max_users'], max_values=RESOURCE_LIMIT)
+    days = {}
+
+    def replay_chunk(chunk, writer):
+        results = engine.score_batch([
+            {
+                'user_id': row.user_id,
+                'activity_type': row.activity_type,
+                'timestamp': row.timestamp,
+                'resource': row.resource_accessed,
+                'details': row.action_details
+            }
+            for row in chunk
+        ], baselines=baselines)
+
+        for row, result in zip(chunk, results):
+            # The same checks, in the same order, as process_activity()
+            now = row.timestamp.timestamp()
+            ip_anomaly = ip_tracker.count(row.user_id, now, exclude=row.ip_address) >= 2
+            resource_anomaly = bool(row.resource_accessed) and (
+                not resource_tracker.contains(row.user_id, row.resource_accessed, now)
+                and resource_tracker.count(row.user_id, now) > 5
+            )
+            ip_tracker.record(row.user_id, row.ip_address, now)
+            if row.resource_accessed:
+                resource_tracker.record(row.user_id, row.resource_accessed, now)
+
+            scores = result['feature_scores']
+            feature_alerts = sum(1 for score in scores.values() if score > options['feature_threshold'])
+            alert = result['overall_score'] > options['overall_threshold'] or ip_anomaly or resource_anomaly
+
+            counts = days.setdefault(row.timestamp.date().isoformat(), [0, 0, 0])
+            counts[0] += 1
+            counts[1] += feature_alerts
+            counts[2] += int(alert)
+
+            writer.writerow([row.activity_id, row.user_id, row.timestamp.isoformat(), result['overall_score']]
+                            + [scores.get(feature_name, '') for feature_name in FEATURE_NAMES]
+                            + [feature_alerts, int(ip_anomaly), int(resource_anomaly), int(alert)])
+
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        chunk = []
+        for row in db.fetch_iter("""
+            SELECT activity_id, user_id, activity_type, timestamp, ip_address, resource_accessed, action_details
+            FROM user_activities
+            WHERE timestamp >= %s AND timestamp < %s AND MOD(user_id, %s) = %s
+            ORDER BY timestamp, activity_id
+        """, (start, end, partitions, partition), batch_size=options['chunk_size'], result='tuple'):
+            chunk.append(row)
+            if len(chunk) >= options['chunk_size']:
+                replay_chunk(chunk, writer)
+                chunk = []
+        if chunk:
+            replay_chunk(chunk, writer)
+
+    evictions = ip_tracker.evictions + resource_tracker.evictions
+    logger.info(f"Replayed partition {partition + 1}/{partitions}: "
+                f"{sum(counts[0] for counts in days.values())} activities"
+                + (f", {evictions} tracker evictions (raise max_users)" if evictions else ""))
+    return days
+
+def _merge_results(paths, output):
+    """Merge the partitions' CSV files (each in timestamp order) into output"""
+    files = [open(path, newline='') for path in paths]
+    try:
+        readers = [csv.reader(f) for f in files]
+        with open(output, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(RESULT_COLUMNS)
+            writer.writerows(heapq.merge(*readers, key=lambda row: (datetime.fromisoformat(row[2]), int(row[0]))))
+    finally:
+        for f in files:
+            f.close()
+    for path in paths:
+        os.remove(path)
+
+def recorded_alerts(db, start, end):
+    """Behavior alerts the live engine raised between start and end, per day"""
+    rows = db.fetch_all("""
+        SELECT DATE(timestamp) as day, COUNT(*) as count
+        FROM alerts
+        WHERE alert_type = 'unusual_behavior' AND timestamp >= %s AND timestamp < %s
+        GROUP BY DATE(timestamp)
+    """, (start, end))
+    return {str(row['day']): row['count'] for row in rows}
+
+def replay(start, end, output='replay_results.csv', workers=4, scoring=ANOMALY_SCORING,
+           forgetting=BASELINE_FORGETTING, feature_threshold=FEATURE_ALERT_THRESHOLD,
+           overall_threshold=OVERALL_ALERT_THRESHOLD, chunk_size=REPLAY_CHUNK_SIZE, max_users=None):
+    """Re-run the UEBA model over the activities between start and end
+
+    Backtests scoring settings and alert thresholds on past data without
+    touching live state: baselines start empty at start and are kept in
+    memory, so each user's first activities train them as they would a new
+    user's. Users are split over worker processes by user_id % workers; each
+    streams its users' activities in timestamp order and scores them in
+    chunks, so memory is bounded by the number of users, not activities.
+    Writes one CSV row per activity to output and returns the alert volume
+    per day ({'days': {day: {...}}, 'totals': {...}}) next to the alerts
+    actually recorded, or None on failure. The trackers hold max_users users
+    per worker, by default enough for every user.
+    """
+    if max_users is None:
+        max_users = tracker_size(get_db())
+        if max_users is None:
+            logger.error("Replay failed: could not count the users to size the trackers for")
+            return None
+
+    options = {
+        'scoring': scoring,
+        'forgetting': forgetting,
+        'feature_threshold': feature_threshold,
+        'overall_threshold': overall_threshold,
+        'chunk_size': chunk_size,
+        'max_users': max_users
+    }
+    paths = [f"{output}.part{partition}" for partition in range(workers)]
+    tasks = [(partition, workers, start, end, options, path) for partition, path in enumerate(paths)]
+
+    logger.info(f"Replaying activities from {start} to {end} in {workers} processes "
+                f"(scoring={scoring}, thresholds {feature_threshold}/{overall_threshold})")
+    try:
+        if workers == 1:
+            partial = [_replay_partition(*tasks[0])]
+        else:
+            # Spawned, not forked: each worker opens its own database connections
+            with multiprocessing.get_context('spawn').Pool(workers) as pool:
+                partial = pool.starmap(_replay_partition, tasks)
+        _merge_results(paths, output)
+    except Exception as e:
+        logger.error(f"Replay failed: {e}")
+        for path in paths:
+            if os.path.exists(path):
+                os.remove(path)
+        return None
+
+    recorded = recorded_alerts(get_db(), start, end)
+    days = {}
+    for counts in partial:
+        for day, (activities, feature_alerts, alerts) in counts.items():
+            totals = days.setdefault(day, {'activities': 0, 'replayed_alerts': 0})
+            totals['activities'] += activities
+            totals['replayed_alerts'] += feature_alerts + alerts
+    for day in set(days) | set(recorded):
+        totals = days.setdefault(day, {'activities': 0, 'replayed_alerts': 0})
+        totals['recorded_alerts'] = recorded.get(day, 0)
+        totals['difference'] = totals['replayed_alerts'] - totals['recorded_alerts']
+
+    summary = {
+        'days': dict(sorted(days.items())),
+        'totals': {
+            key: sum(totals[key] for totals in days.values())
+            for key in ('activities', 'replayed_alerts', 'recorded_alerts', 'difference')
+        }
+    }
+    totals = summary['totals']
+    logger.info(f"Replay wrote {totals['activities']} activities to {output}: {totals['replayed_alerts']} alerts "
+                f"vs {totals['recorded_alerts']} recorded ({totals['difference']:+d})")
+    return summary
@@ -0,0 +1,173 @@
+import logging
+import math
+import numpy as np
+from mysql.connector import Error
+from datetime import datetime
+from ..db.database import get_db
+
+logger = logging.getLogger('ueba')
+
+# Weight of each alert severity in a user's risk score
+SEVERITY_WEIGHTS = {
+    'low': 1,
+    'medium': 3,
+    'high': 5,
+    'critical': 10
+}
+
+# Alerts and anomaly scores count for half as much after this many days (an
+# average lifetime of about 30 days, like the window risk used to be computed over)
+RISK_HALF_LIFE_DAYS = 21
+
+# Reference time of the stored counters. They grow by a factor of 2 per half-life
+# from here, so move it forward (and rebuild) within a few decades
+RISK_EPOCH = datetime(2024, 1, 1)
+
+RISK_COUNTERS = ('alert_weight', 'alert_count', 'anomaly_sum', 'anomaly_count')
+
+_DECAY_RATE = math.log(2) / (RISK_HALF_LIFE_DAYS * 86400)
+
+def growth(when):
+    """Weight of an event at when relative to one at RISK_EPOCH
+
+    user_risk stores sum(value * growth(event time)) per counter, so recording
+    an event is a plain addition whatever the row's age, and the decayed value
+    at time now is the stored one divided by growth(now).
+    """
+    return math.exp(_DECAY_RATE * (when - RISK_EPOCH).total_seconds())
+
+def record_risk(db, alerts=(), anomalies=(), when=None, sign=1, queue=False):
+    """Add alerts and anomaly scores to their users' risk counters
+
+    alerts are alert rows (user_id, severity) and anomalies anomaly_scores
+    rows (user_id, anomaly_score), all as of when (default now). sign=-1
+    takes alerts back out, e.g. when one is resolved (pass its timestamp).
+    One upsert for the lot; call it inside the transaction that writes the rows.
+
+    With queue=True the deltas go through the write-behind buffer when it is
+    on (the per-event scoring path), where they add up per user until the
+    next flush writes them in one upsert, instead of every event locking the
+    user's row.
+    """
+    weight = sign * growth(when or datetime.now())
+    totals = {}
+
+    for alert in alerts:
+        if alert.get('user_id') is None:
+            continue
+        counters = totals.setdefault(alert['user_id'], [0.0, 0.0, 0.0, 0.0])
+        counters[0] += SEVERITY_WEIGHTS.get(alert['severity'], 1) * weight
+        counters[1] += weight
+
+    for anomaly in anomalies:
+        counters = totals.setdefault(anomaly['user_id'], [0.0, 0.0, 0.0, 0.0])
+        counters[2] += float(anomaly['anomaly_score']) * weight
+        counters[3] += weight
+
+    if not totals:
+        return True
+
+    now = datetime.now()
+    rows = [dict(user_id=user_id, **dict(zip(RISK_COUNTERS, counters)), updated_at=now)
+            for user_id, counters in totals.items()]
+    if queue:
+        return db.queue_upsert_many('user_risk', rows, ('user_id',), add_columns=RISK_COUNTERS)
+    return db.upsert_many('user_risk', rows, ('user_id',), add_columns=RISK_COUNTERS)
+
+def risk_scores(alert_weight, alert_count, anomaly_sum, anomaly_count, now=None):
+    """Risk of users from their stored counters (scalars or NumPy arrays)
+
+    Returns a dict of arrays: alert_score (decayed sum of severity weights),
+    alert_count (decayed), avg_anomaly_score, raw_score and normalized_score
+    (0-100, log-scaled in the alert score). The average anomaly score fades
+    out once fewer than one recent score is left.
+    """
+    scale = 1 / growth(now or datetime.now())
+    alert_score = np.maximum(np.asarray(alert_weight, dtype=np.float64) * scale, 0)
+    alert_count = np.maximum(np.asarray(alert_count, dtype=np.float64) * scale, 0)
+    anomaly_count = np.asarray(anomaly_count, dtype=np.float64) * scale
+    avg_anomaly = np.asarray(anomaly_sum, dtype=np.float64) * scale / np.maximum(anomaly_count, 1)
+
+    return {
+        'alert_score': alert_score,
+        'alert_count': alert_count,
+        'avg_anomaly_score': avg_anomaly,
+        'raw_score': (alert_score * 0.7) + (avg_anomaly * 30),
+        'normalized_score': np.minimum(100, 20 + (50 * np.log10(1 + alert_score)) + (30 * avg_anomaly))
+    }
+
+def rebuild_user_risk(db=None):
+    """Recompute user_risk from the alerts and anomaly_scores tables
+
+    Reports how far the incrementally maintained rows had drifted from the
+    recomputed ones (they shouldn't, short of rows written or deleted behind
+    the application's back: bulk loads, partition retention), then replaces
+    them. Run it while no events are being processed. Returns a dict with
+    users, drifted and max_difference (in raw score points), or None
+    on failure.
+    """
+    db = db or get_db()
+    totals = {}
+
+    def accumulate(batches, value_column, first):
+        for batch in batches:
+            seconds = np.array([(timestamp - RISK_EPOCH).total_seconds() for timestamp in batch['timestamp']])
+            weights = np.exp(_DECAY_RATE * seconds)
+            if value_column == 'severity':
+                values = np.array([SEVERITY_WEIGHTS.get(severity, 1) for severity in batch['severity']], dtype=np.float64)
+            else:
+                values = batch[value_column].astype(np.float64)
+            for user_id, weighted, weight in zip(batch['user_id'].tolist(), (weights * values).tolist(), weights.tolist()):
+                counters = totals.setdefault(user_id, [0.0, 0.0, 0.0, 0.0])
+                counters[first] += weighted
+                counters[first + 1] += weight
+
+    try:
+        # Resolved alerts don't count towards risk. Rows without a timestamp can't
+        # be weighted (and are never counted incrementally), so they are skipped
+        accumulate(db.fetch_iter("""
+            SELECT user_id, severity, timestamp FROM alerts
+            WHERE is_resolved = FALSE AND user_id IS NOT NULL AND timestamp IS NOT NULL
+        """, primary=True, result='columns'), 'severity', 0)
+        accumulate(db.fetch_iter("""
+            SELECT user_id, anomaly_score, timestamp FROM anomaly_scores
+            WHERE timestamp IS NOT NULL AND anomaly_score IS NOT NULL
+        """, primary=True, result='columns'), 'anomaly_score', 2)
+    except Error as e:
+        # Partial totals would replace good rows with low ones
+        logger.error(f"Failed to read the events to rebuild user_risk from, left it as it was: {e}")
+        return None
+
+    # Compare with what was maintained incrementally
+    stored = {row['user_id']: [row[counter] for counter in RISK_COUNTERS]
+              for row in db.fetch_all("SELECT * FROM user_risk", primary=True)}
+    now = datetime.now()
+    user_ids = sorted(set(stored) | set(totals))
+    drifted = 0
+    max_difference = 0.0
+    if user_ids:
+        zeros = [0.0, 0.0, 0.0, 0.0]
+        before = risk_scores(*np.array([stored.get(user_id, zeros) for user_id in user_ids]).T, now=now)
+        after = risk_scores(*np.array([totals.get(user_id, zeros) for user_id in user_ids]).T, now=now)
+        difference = np.abs(before['raw_score'] - after['raw_score'])
+        drifted = int((difference > 0.01).sum())
+        max_difference = float(difference.max())
+
+    try:
+        with db.transaction() as txn:
+            db.execute_query("DELETE FROM user_risk")
+            db.insert_many('user_risk', [
+                dict(user_id=user_id, **dict(zip(RISK_COUNTERS, counters)), updated_at=now)
+                for user_id, counters in totals.items()
+            ])
+    except Error as e:
+        logger.error(f"Failed to rebuild user_risk: {e}")
+        return None
+
+    if txn.failed:
+        logger.error("Failed to rebuild user_risk, changes rolled back")
+        return None
+
+    logger.info(f"Rebuilt user_risk for {len(totals)} users; {drifted} had drifted "
+                f"(max difference {max_difference:.2f} points)")
+    return {'users': len(totals), 'drifted': drifted, 'max_difference': max_difference}
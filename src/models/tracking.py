@@ -0,0 +1,93 @@
+import logging
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger('ueba')
+
+# Log every this many evictions of a user (and the first)
+EVICTION_LOG_INTERVAL = 1000
+
+class SlidingWindowTracker:
+    """Per-user sets of values seen within a sliding time window, kept in memory
+
+    Each user's values are kept in last-seen order, so values that fell out
+    of the window are dropped lazily, from the front, when the user is next
+    looked at: a lookup costs amortized O(1). Memory is bounded by
+    max_users users (the least recently active are evicted) and max_values
+    values per user (the least recently seen are evicted). An evicted user
+    looks new to the checks until they have been active again, so size
+    max_users for every active user; evictions counts (and logs) the misses.
+    Times are epoch seconds.
+    """
+
+    def __init__(self, window, max_users=10000, max_values=64):
+        self.window = window
+        self.max_users = max_users
+        self.max_values = max_values
+        self.evictions = 0
+        self._users = OrderedDict()
+        self._lock = threading.Lock()
+
+    def record(self, user_id, value, when):
+        """Note that user_id used value at time when"""
+        with self._lock:
+            values = self._users.get(user_id)
+            if values is None:
+                values = self._users[user_id] = OrderedDict()
+                while len(self._users) > self.max_users:
+                    self._users.popitem(last=False)
+                    self.evictions += 1
+                    if self.evictions % EVICTION_LOG_INTERVAL == 1:
+                        logger.warning(f"Tracker full at {self.max_users} users: evicted the least recently "
+                                       f"active ({self.evictions} so far); raise max_users")
+            self._users.move_to_end(user_id)
+
+            last_seen = values.pop(value, None)
+            if last_seen is not None and last_seen > when:
+                when = last_seen
+            newest = next(reversed(values.values()), None)
+            values[value] = when
+            if newest is not None and newest > when:
+                # Recorded out of order (backfills): re-sort this user's few values
+                ordered = sorted(values.items(), key=lambda item: item[1])
+                values.clear()
+                values.update(ordered)
+
+            while len(values) > self.max_values:
+                values.popitem(last=False)
+
+    def _expire(self, user_id, now):
+        values = self._users.get(user_id)
+        if values is None:
+            return None
+        cutoff = now - self.window
+        while values and next(iter(values.values())) <= cutoff:
+            values.popitem(last=False)
+        if not values:
+            del self._users[user_id]
+            return None
+        return values
+
+    def values(self, user_id, now):
+        """The values user_id used within the window ending at now"""
+        with self._lock:
+            values = self._expire(user_id, now)
+            return list(values) if values else []
+
+    def count(self, user_id, now, exclude=None):
+        """How many distinct values user_id used within the window (not counting exclude)"""
+        with self._lock:
+            values = self._expire(user_id, now)
+            if not values:
+                return 0
+            return len(values) - (1 if exclude is not None and exclude in values else 0)
+
+    def contains(self, user_id, value, now):
+        """Whether user_id used value within the window"""
+        with self._lock:
+            values = self._expire(user_id, now)
+            return bool(values) and value in values
+
+    def clear(self):
+        with self._lock:
+            self._users.clear()
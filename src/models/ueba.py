@@ -1,9 +1,21 @@
 import logging
 import json
+import hashlib
+import heapq
 import math
 import statistics
+import threading
+import time
+import numpy as np
+from mysql.connector import Error
+from collections import OrderedDict
+from contextlib import ExitStack
+from functools import lru_cache
 from datetime import datetime, timedelta
 from ..db.database import get_db
+from ..db import queries
+from .risk import RISK_COUNTERS, record_risk, risk_scores
+from .tracking import SlidingWindowTracker
 
 # Set up logging
 logging.basicConfig(
@@ -16,34 +28,106 @@ logging.basicConfig(
 )
 logger = logging.getLogger('ueba')
 
+# Profiles cached by UEBAEngine: how many users, and how long (seconds) before
+# a profile is reloaded to pick up baseline changes made by other processes
+PROFILE_CACHE_SIZE = 1000
+PROFILE_CACHE_TTL = 300
+
+# IPs a user used within this many seconds count towards the multiple-IP check
+IP_WINDOW = 3600
+
+# Resources a user accessed within this many seconds are not new to them; at
+# most RESOURCE_LIMIT of the most recently accessed are kept per user
+RESOURCE_WINDOW = 30 * 24 * 3600
+RESOURCE_LIMIT = 256
+
+# The IP and resource trackers hold at least TRACKER_MAX_USERS users, and warm_up()
+# grows them to the number of users times TRACKER_USER_HEADROOM (room for new ones)
+TRACKER_MAX_USERS = 10000
+TRACKER_USER_HEADROOM = 1.5
+
+# Key of the categorical feature digest. Changing it changes every encoded
+# resource_type/activity_type value, so the learned baselines for them go stale
+CATEGORICAL_KEY = b'honeytoken-ueba'
+
+# A feature scoring above FEATURE_ALERT_THRESHOLD raises an alert of its own; an
+# activity whose overall (mean) score is above OVERALL_ALERT_THRESHOLD raises one
+# for the activity. See replay.py to try other values on past activity
+FEATURE_ALERT_THRESHOLD = 0.7
+OVERALL_ALERT_THRESHOLD = 0.8
+
+# How anomaly scores are computed: 'ratio' (distance from the EWMA baseline
+# relative to its magnitude) or 'zscore' (standard deviations from the running mean)
+ANOMALY_SCORING = 'ratio'
+ANOMALY_SCORING_MODES = ('ratio', 'zscore')
+
+# In zscore mode, this many standard deviations from the mean score 1.0, and a
+# baseline needs this many (effective) observations before it is used; until
+# then the ratio score applies
+ZSCORE_SCALE = 4.0
+ZSCORE_MIN_SAMPLES = 5
+
+# Exponential forgetting of the running mean and variance: each observation
+# discounts the earlier ones by a factor (1 - BASELINE_FORGETTING); 0 keeps
+# them all at full weight
+BASELINE_FORGETTING = 0.0
+
+# Every feature _extract_features() can produce, in the order it produces them
+FEATURE_NAMES = ('time_of_day', 'day_of_week', 'resource_type', 'activity_type',
+                 'activity_duration', 'bytes_transferred', 'access_count')
+
 class UserBehaviorProfile:
     """Model to track and analyze user behavior"""
     
-    def __init__(self, user_id):
+    def __init__(self, user_id, scoring=ANOMALY_SCORING, forgetting=BASELINE_FORGETTING):
+        if scoring not in ANOMALY_SCORING_MODES:
+            raise ValueError(f"Unknown anomaly scoring mode: {scoring}")
+            
         self.user_id = user_id
+        self.scoring = scoring
+        self.forgetting = forgetting
         self.db = get_db()
         self.baseline_data = self._load_baseline()
+        self.loaded_at = time.monotonic()
+        # Serializes the read-modify-write of baselines by concurrent events of this user
+        self.lock = threading.Lock()
         
     def _load_baseline(self):
         """Load baseline data for this user from the database"""
-        query = "SELECT feature_name, feature_value, confidence_score FROM behavioral_baselines WHERE user_id = %s"
-        results = self.db.fetch_all(query, (self.user_id,))
+        query = """
+        SELECT feature_name, feature_value, confidence_score, sample_count, sample_mean, sample_m2 
+        FROM behavioral_baselines 
+        WHERE user_id = %s
+        """
+        # Baselines are read-modify-write state, so never read them from a lagging replica.
+        # Updates still queued for write-behind are newer than the table; read them first
+        # so one flushed in between is not missed
+        pending = self.db.pending_writes('behavioral_baselines', {'user_id': self.user_id})
+        results = self.db.fetch_all(query, (self.user_id,), primary=True)
         
         baseline = {}
-        for result in results:
+        for result in results + pending:
             baseline[result['feature_name']] = {
                 'value': result['feature_value'],
-                'confidence': result['confidence_score']
+                'confidence': result['confidence_score'],
+                'count': result['sample_count'],
+                'mean': result['sample_mean'],
+                'm2': result['sample_m2']
             }
             
         return baseline
         
     def update_baseline(self, feature_name, new_value, weight=0.3):
         """Update baseline with new observed value using weighted average"""
+        self._save_baselines([self._next_baseline(feature_name, new_value, weight)])
+        
+    def _next_baseline(self, feature_name, new_value, weight=0.3):
+        """Fold an observation into the local baseline and return the row to store"""
         if feature_name in self.baseline_data:
             # Get current value and confidence
-            current = self.baseline_data[feature_name]['value']
-            confidence = self.baseline_data[feature_name]['confidence']
+            baseline = self.baseline_data[feature_name]
+            current = baseline['value']
+            confidence = baseline['confidence']
             
             # Update with weighted average
             updated_value = (current * (1 - weight)) + (new_value * weight)
@@ -51,44 +135,47 @@ class UserBehaviorProfile:
             # Increase confidence slightly with each update
             updated_confidence = min(0.99, confidence + 0.01)
             
-            # Update in database
-            data = {
-                'feature_value': updated_value,
-                'confidence_score': updated_confidence,
-                'last_updated': datetime.now()
-            }
-            condition = {
-                'user_id': self.user_id,
-                'feature_name': feature_name
-            }
-            self.db.update('behavioral_baselines', data, condition)
-            
-            # Update local cache
-            self.baseline_data[feature_name] = {
-                'value': updated_value,
-                'confidence': updated_confidence
-            }
+            # Welford's update of the running mean and M2 (sum of squared
+            # deviations), with the earlier observations discounted
+            retained = 1 - self.forgetting
+            count = (baseline['count'] * retained) + 1
+            delta = new_value - baseline['mean']
+            mean = baseline['mean'] + (delta / count)
+            m2 = (baseline['m2'] * retained) + (delta * (new_value - mean))
             
             logger.debug(f"Updated baseline for user {self.user_id}, feature {feature_name}: {current} -> {updated_value}")
-            
         else:
-            # Create new baseline
-            data = {
-                'user_id': self.user_id,
-                'feature_name': feature_name,
-                'feature_value': new_value,
-                'confidence_score': 0.5  # Initial confidence is moderate
-            }
-            self.db.insert('behavioral_baselines', data)
-            
-            # Update local cache
-            self.baseline_data[feature_name] = {
-                'value': new_value,
-                'confidence': 0.5
-            }
+            # Create new baseline; initial confidence is moderate
+            updated_value = new_value
+            updated_confidence = 0.5
+            count, mean, m2 = 1.0, new_value, 0.0
             
             logger.debug(f"Created new baseline for user {self.user_id}, feature {feature_name}: {new_value}")
             
+        # Update local cache
+        self.baseline_data[feature_name] = {
+            'value': updated_value,
+            'confidence': updated_confidence,
+            'count': count,
+            'mean': mean,
+            'm2': m2
+        }
+        
+        return {
+            'user_id': self.user_id,
+            'feature_name': feature_name,
+            'feature_value': updated_value,
+            'confidence_score': updated_confidence,
+            'sample_count': count,
+            'sample_mean': mean,
+            'sample_m2': m2,
+            'last_updated': datetime.now()
+        }
+        
+    def _save_baselines(self, rows):
+        """Store baseline rows in one upsert on the (user_id, feature_name) unique key"""
+        self.db.queue_upsert_many('behavioral_baselines', rows, ('user_id', 'feature_name'))
+            
     def calculate_anomaly_score(self, feature_name, observed_value):
         """Calculate an anomaly score for an observed value compared to baseline"""
         if feature_name not in self.baseline_data:
@@ -98,9 +185,18 @@ class UserBehaviorProfile:
             
         baseline = self.baseline_data[feature_name]['value']
         confidence = self.baseline_data[feature_name]['confidence']
+        count = self.baseline_data[feature_name]['count']
         
         # Calculate normalized difference
-        if baseline == 0:
+        if self.scoring == 'zscore' and count >= ZSCORE_MIN_SAMPLES:
+            # Standard deviations from the running mean, scaled so ZSCORE_SCALE scores 1.0
+            mean = self.baseline_data[feature_name]['mean']
+            std = math.sqrt(self.baseline_data[feature_name]['m2'] / count)
+            if std == 0:
+                normalized_diff = 1.0 if observed_value != mean else 0.0
+            else:
+                normalized_diff = abs(observed_value - mean) / std / ZSCORE_SCALE
+        elif baseline == 0:
             # Avoid division by zero
             normalized_diff = 1.0 if observed_value != 0 else 0.0
         else:
@@ -115,15 +211,14 @@ class UserBehaviorProfile:
         logger.debug(f"Anomaly score for user {self.user_id}, feature {feature_name}: {anomaly_score}")
         return anomaly_score
         
-    def record_anomaly_score(self, activity_id, feature_name, observed_value):
-        """Record an anomaly score for a specific activity"""
+    def _build_anomaly_records(self, activity_id, feature_name, observed_value):
+        """Build the anomaly_scores row (and alert row, if any) for an observed value"""
         # Get expected value from baseline
         expected_value = self.baseline_data.get(feature_name, {'value': None})['value']
         
         # Calculate anomaly score
         anomaly_score = self.calculate_anomaly_score(feature_name, observed_value)
         
-        # Record in database
         data = {
             'user_id': self.user_id,
             'activity_id': activity_id,
@@ -133,10 +228,9 @@ class UserBehaviorProfile:
             'anomaly_score': anomaly_score
         }
         
-        anomaly_id = self.db.insert('anomaly_scores', data)
-        
         # If anomaly score is high, create an alert
-        if anomaly_score > 0.7:
+        alert_data = None
+        if anomaly_score > FEATURE_ALERT_THRESHOLD:
             severity = "high" if anomaly_score > 0.9 else "medium"
             
             alert_data = {
@@ -145,40 +239,58 @@ class UserBehaviorProfile:
                 'severity': severity,
                 'description': f"Unusual behavior detected for user {self.user_id}: {feature_name} (score: {anomaly_score:.2f})"
             }
-            
-            alert_id = self.db.insert('alerts', alert_data)
             logger.warning(f"Created alert for anomalous behavior - User ID: {self.user_id}, Feature: {feature_name}, Score: {anomaly_score:.2f}")
             
+        return data, alert_data
+        
+    def record_anomaly_score(self, activity_id, feature_name, observed_value):
+        """Record an anomaly score for a specific activity"""
+        data, alert_data = self._build_anomaly_records(activity_id, feature_name, observed_value)
+        
+        # Record in database
+        anomaly_id = self.db.insert('anomaly_scores', data)
+        
+        if alert_data:
+            self.db.insert('alerts', alert_data)
+            
+        record_risk(self.db, [alert_data] if alert_data else [], [data], queue=True)
         return anomaly_id
         
     def get_user_activities(self, days=30, limit=100):
         """Get recent user activities for analysis"""
         start_date = datetime.now() - timedelta(days=days)
         
-        query = """
-        SELECT * FROM user_activities 
-        WHERE user_id = %s AND timestamp > %s 
-        ORDER BY timestamp DESC 
-        LIMIT %s
-        """
-        
-        return self.db.fetch_all(query, (self.user_id, start_date, limit))
+        return self.db.fetch_all(queries.USER_ACTIVITIES_RECENT, (self.user_id, start_date, limit))
         
     def analyze_recent_activity(self, activity_id, activity_type, timestamp, resource, details=None):
         """Analyze a new activity against the user's behavioral baseline"""
         # Extract features from the activity
         features = self._extract_features(activity_type, timestamp, resource, details)
         
-        # Calculate and record anomaly scores for each feature
+        # Calculate anomaly scores for each feature, collecting the rows to record
         anomaly_scores = {}
+        anomaly_rows = []
+        alert_rows = []
+        baseline_rows = []
         for feature_name, value in features.items():
-            anomaly_scores[feature_name] = self.calculate_anomaly_score(feature_name, value)
-            self.record_anomaly_score(activity_id, feature_name, value)
+            anomaly_row, alert_row = self._build_anomaly_records(activity_id, feature_name, value)
+            anomaly_scores[feature_name] = anomaly_row['anomaly_score']
+            anomaly_rows.append(anomaly_row)
+            if alert_row:
+                alert_rows.append(alert_row)
             
             # Update baseline with new observation 
             # (only if not highly anomalous, to avoid poisoning the baseline)
             if anomaly_scores[feature_name] < 0.7:
-                self.update_baseline(feature_name, value)
+                baseline_rows.append(self._next_baseline(feature_name, value))
+                
+        # Record all feature scores (and any per-feature alerts) and baseline changes in
+        # one round trip each. Scores and baselines may go through the write-behind
+        # buffer; alerts are always written now
+        self._save_baselines(baseline_rows)
+        self.db.queue_insert_many('anomaly_scores', anomaly_rows)
+        self.db.insert_many('alerts', alert_rows)
+        record_risk(self.db, alert_rows, anomaly_rows, queue=True)
                 
         # Calculate overall anomaly score as weighted average
         if anomaly_scores:
@@ -191,7 +303,8 @@ class UserBehaviorProfile:
             'feature_scores': anomaly_scores
         }
         
-    def _extract_features(self, activity_type, timestamp, resource, details=None):
+    @staticmethod
+    def _extract_features(activity_type, timestamp, resource, details=None):
         """Extract behavioral features from an activity"""
         features = {}
         
@@ -204,10 +317,10 @@ class UserBehaviorProfile:
         features['day_of_week'] = day_of_week
         
         # Resource access patterns
-        features['resource_type'] = self._hash_categorical(resource.split('/')[0] if '/' in resource else resource)
+        features['resource_type'] = UserBehaviorProfile._hash_categorical(resource.split('/')[0] if '/' in resource else resource)
         
         # Activity type features
-        features['activity_type'] = self._hash_categorical(activity_type)
+        features['activity_type'] = UserBehaviorProfile._hash_categorical(activity_type)
         
         # Parse details if available
         if details:
@@ -232,20 +345,322 @@ class UserBehaviorProfile:
                 
         return features
         
-    def _hash_categorical(self, value):
-        """Convert categorical values to numeric using a simple hash"""
+    @staticmethod
+    @lru_cache(maxsize=4096)
+    def _hash_categorical(value):
+        """Convert categorical values to numeric using a keyed digest
+        
+        Unlike the built-in hash(), which is salted per process, the digest is
+        the same in every worker and after restarts, so baselines learned in
+        one process hold in all of them.
+        """
         if value is None:
             return 0
             
-        # Use hash function to convert string to numeric
-        hash_val = hash(str(value)) % 1000
+        digest = hashlib.blake2b(str(value).encode(), digest_size=8, key=CATEGORICAL_KEY).digest()
+        hash_val = int.from_bytes(digest, 'big') % 1000
         return hash_val / 1000  # Normalize to 0-1 range
 
+def tracker_size(db, minimum=TRACKER_MAX_USERS):
+    """How many users the IP and resource trackers should hold (None on failure)"""
+    row = db.fetch_one(queries.USER_COUNT)
+    if not row:
+        return None
+    return max(minimum, int(row['count'] * TRACKER_USER_HEADROOM))
+
 class UEBAEngine:
     """Main engine for User Entity Behavior Analytics"""
     
-    def __init__(self):
+    def __init__(self, profile_cache_size=PROFILE_CACHE_SIZE, profile_cache_ttl=PROFILE_CACHE_TTL,
+                 scoring=ANOMALY_SCORING, forgetting=BASELINE_FORGETTING, tracker_max_users=TRACKER_MAX_USERS):
+        if scoring not in ANOMALY_SCORING_MODES:
+            raise ValueError(f"Unknown anomaly scoring mode: {scoring}")
+            
         self.db = get_db()
+        self.scoring = scoring
+        self.forgetting = forgetting
+        self.profile_cache_size = profile_cache_size
+        self.profile_cache_ttl = profile_cache_ttl
+        self._profiles = OrderedDict()
+        self._profiles_lock = threading.Lock()
+        
+        # Recent IPs per user, kept in memory instead of queried per event
+        self.ip_tracker = SlidingWindowTracker(IP_WINDOW, max_users=tracker_max_users)
+        # Resources per user over 30 days, for the resource novelty check
+        self.resource_tracker = SlidingWindowTracker(RESOURCE_WINDOW, max_users=tracker_max_users,
+                                                     max_values=RESOURCE_LIMIT)
+        self._warmed_up = False
+        self._warm_up_lock = threading.Lock()
+        
+    def warm_up(self):
+        """Size the in-memory trackers for every user and load the recent activity history they need (once)
+        
+        Called at startup; the first event triggers it otherwise, and the
+        next one again if the load fails part way.
+        """
+        with self._warm_up_lock:
+            if self._warmed_up:
+                return
+                
+            max_users = tracker_size(self.db, self.ip_tracker.max_users)
+            if max_users is None:
+                logger.error("Failed to count the users to size the trackers for")
+                return
+            # Every user fits: an evicted one would look new to the checks
+            self.ip_tracker.max_users = self.resource_tracker.max_users = max_users
+            
+            try:
+                since = datetime.now() - timedelta(seconds=IP_WINDOW)
+                count = 0
+                for row in self.db.fetch_iter("""
+                    SELECT user_id, ip_address, MAX(timestamp) as last_seen
+                    FROM user_activities
+                    WHERE timestamp > %s
+                    GROUP BY user_id, ip_address
+                """, (since,), result='tuple'):
+                    self.ip_tracker.record(row.user_id, row.ip_address, row.last_seen.timestamp())
+                    count += 1
+                    
+                # Oldest first, so a user's resources are recorded in order and the
+                # RESOURCE_LIMIT most recent are the ones kept
+                since = datetime.now() - timedelta(seconds=RESOURCE_WINDOW)
+                resources = 0
+                for row in self.db.fetch_iter("""
+                    SELECT user_id, resource_accessed, MAX(timestamp) as last_seen
+                    FROM user_activities
+                    WHERE timestamp > %s AND resource_accessed IS NOT NULL AND resource_accessed != ''
+                    GROUP BY user_id, resource_accessed
+                    ORDER BY last_seen
+                """, (since,), result='tuple'):
+                    self.resource_tracker.record(row.user_id, row.resource_accessed, row.last_seen.timestamp())
+                    resources += 1
+                    
+            except Error as e:
+                # Stay cold so the next event tries again; what was recorded is kept
+                logger.error(f"Failed to load the tracker history: {e}")
+                return
+                
+            self._warmed_up = True
+            logger.info(f"Loaded {count} recent user IPs and {resources} user resources into the trackers "
+                        f"(up to {max_users} users)")
+        
+    def get_profile(self, user_id):
+        """The user's behavior profile, from the LRU cache when it is fresh enough
+        
+        A cached profile is write-through: update_baseline() changes it and
+        queues the database write together, so scoring a known user reads no
+        baselines. Profiles expire after profile_cache_ttl seconds, which
+        bounds how long a baseline change made by another process goes unseen;
+        call invalidate_profile() after changing baselines in this one.
+        """
+        with self._profiles_lock:
+            profile = self._profiles.get(user_id)
+            if profile and time.monotonic() - profile.loaded_at < self.profile_cache_ttl:
+                self._profiles.move_to_end(user_id)
+                return profile
+                
+        # Load outside the lock so a slow read doesn't hold up other users
+        profile = UserBehaviorProfile(user_id, scoring=self.scoring, forgetting=self.forgetting)
+        with self._profiles_lock:
+            current = self._profiles.get(user_id)
+            if current and time.monotonic() - current.loaded_at < self.profile_cache_ttl:
+                # Another thread loaded it meanwhile; keep the one that may have updates
+                self._profiles.move_to_end(user_id)
+                return current
+            self._profiles[user_id] = profile
+            self._profiles.move_to_end(user_id)
+            while len(self._profiles) > self.profile_cache_size:
+                self._profiles.popitem(last=False)
+        return profile
+        
+    def invalidate_profile(self, user_id=None):
+        """Drop a user's cached profile (every profile if user_id is None)"""
+        with self._profiles_lock:
+            if user_id is None:
+                self._profiles.clear()
+            else:
+                self._profiles.pop(user_id, None)
+                
+    def score_batch(self, activities, baselines=None, weight=0.3):
+        """Score a batch of activities with NumPy, returning one result per activity in order
+        
+        activities are dicts with user_id, activity_type, timestamp, resource
+        and (optionally) details. Each result is {'overall_score',
+        'feature_scores'}, identical to what analyze_recent_activity() gives
+        for the same events processed one by one, baseline updates included.
+        
+        By default the engine's cached profiles are scored against and updated,
+        and the changed baselines are stored with one upsert. Pass baselines
+        ({user_id: {feature: {'value', 'confidence', ...}}}, updated in place) to
+        score against isolated baselines without touching the database, e.g.
+        for a replay. Their 'count', 'mean' and 'm2' (the running mean and
+        variance) may be left out for an empty state. Recording activities,
+        anomaly scores and alerts is up to the caller.
+        """
+        if not activities:
+            return []
+            
+        user_ids = sorted({activity['user_id'] for activity in activities})
+        
+        if baselines is not None:
+            for user_id in user_ids:
+                baselines.setdefault(user_id, {})
+            results, _ = self._score_waves(activities, user_ids, baselines, weight)
+            return results
+            
+        with ExitStack() as stack:
+            # Locked in user_id order, so concurrent batches can't deadlock
+            profiles = [self.get_profile(user_id) for user_id in user_ids]
+            for profile in profiles:
+                stack.enter_context(profile.lock)
+                
+            live = {profile.user_id: profile.baseline_data for profile in profiles}
+            results, changed = self._score_waves(activities, user_ids, live, weight)
+            
+            now = datetime.now()
+            self.db.queue_upsert_many('behavioral_baselines', [
+                {
+                    'user_id': user_id,
+                    'feature_name': feature_name,
+                    'feature_value': live[user_id][feature_name]['value'],
+                    'confidence_score': live[user_id][feature_name]['confidence'],
+                    'sample_count': live[user_id][feature_name]['count'],
+                    'sample_mean': live[user_id][feature_name]['mean'],
+                    'sample_m2': live[user_id][feature_name]['m2'],
+                    'last_updated': now
+                }
+                for user_id, feature_name in changed
+            ], ('user_id', 'feature_name'))
+            
+        return results
+        
+    def _score_waves(self, activities, user_ids, baselines, weight):
+        """Vectorized scoring behind score_batch(); returns (results, changed (user_id, feature) pairs)
+        
+        Baselines are held in (user, feature) arrays. Events are scored in
+        waves holding at most one event per user (the k-th event of each), so
+        every event sees its user's baselines as left by that user's earlier
+        events, exactly like the one-by-one path. The arithmetic mirrors
+        calculate_anomaly_score() and _next_baseline() operation for operation
+        (fmin behaves like min() on NaN), so results match bit for bit.
+        Scoring mode and forgetting are the engine's.
+        """
+        n = len(activities)
+        columns = {name: i for i, name in enumerate(FEATURE_NAMES)}
+        user_rows = {user_id: i for i, user_id in enumerate(user_ids)}
+        
+        # Observed features, one row per activity
+        observed = np.zeros((n, len(FEATURE_NAMES)))
+        present = np.zeros((n, len(FEATURE_NAMES)), dtype=bool)
+        for i, activity in enumerate(activities):
+            features = UserBehaviorProfile._extract_features(
+                activity['activity_type'], activity['timestamp'],
+                activity.get('resource') or '', activity.get('details')
+            )
+            for feature_name, value in features.items():
+                observed[i, columns[feature_name]] = value
+                present[i, columns[feature_name]] = True
+                
+        # Baselines, confidences and running mean/variance state, one row per user
+        value = np.zeros((len(user_ids), len(FEATURE_NAMES)))
+        confidence = np.zeros((len(user_ids), len(FEATURE_NAMES)))
+        count = np.zeros((len(user_ids), len(FEATURE_NAMES)))
+        mean = np.zeros((len(user_ids), len(FEATURE_NAMES)))
+        m2 = np.zeros((len(user_ids), len(FEATURE_NAMES)))
+        known = np.zeros((len(user_ids), len(FEATURE_NAMES)), dtype=bool)
+        for user_id, row in user_rows.items():
+            for feature_name, baseline in baselines[user_id].items():
+                if feature_name in columns:
+                    column = columns[feature_name]
+                    value[row, column] = baseline['value']
+                    confidence[row, column] = baseline['confidence']
+                    count[row, column] = baseline.get('count', 0)
+                    mean[row, column] = baseline.get('mean', 0)
+                    m2[row, column] = baseline.get('m2', 0)
+                    known[row, column] = True
+                    
+        # Wave of each activity: how many earlier activities of the same user there are
+        users = np.array([user_rows[activity['user_id']] for activity in activities])
+        waves = np.empty(n, dtype=np.int64)
+        seen = {}
+        for i, row in enumerate(users):
+            waves[i] = seen.get(row, 0)
+            seen[row] = waves[i] + 1
+            
+        order = np.argsort(waves, kind='stable')
+        bounds = np.cumsum(np.bincount(waves))
+        
+        scores = np.full((n, len(FEATURE_NAMES)), np.nan)
+        changed = np.zeros_like(known)
+        retained = 1 - self.forgetting
+        start = 0
+        for end in bounds:
+            idx = order[start:end]
+            start = end
+            u = users[idx]
+            x = observed[idx]
+            p = present[idx]
+            v = value[u]
+            c = confidence[u]
+            k = known[u]
+            w = count[u]
+            mu = mean[u]
+            q = m2[u]
+            
+            diff = np.where(v == 0, (x != 0).astype(np.float64), np.abs(x - v) / np.maximum(1.0, np.abs(v)))
+            if self.scoring == 'zscore':
+                zscored = w >= ZSCORE_MIN_SAMPLES
+                std = np.sqrt(np.divide(q, w, out=np.zeros_like(q), where=zscored))
+                z = np.divide(np.abs(x - mu), std, out=np.zeros_like(std), where=std != 0) / ZSCORE_SCALE
+                diff = np.where(zscored, np.where(std == 0, (x != mu).astype(np.float64), z), diff)
+            score = np.where(k, np.fmin(1.0, diff * c), 0.5)
+            scores[idx] = np.where(p, score, np.nan)
+            
+            # Fold the observations in, except highly anomalous ones
+            update = p & (score < 0.7)
+            value[u] = np.where(update, np.where(k, (v * (1 - weight)) + (x * weight), x), v)
+            confidence[u] = np.where(update, np.where(k, np.fmin(0.99, c + 0.01), 0.5), c)
+            next_count = (w * retained) + 1
+            delta = x - mu
+            next_mean = mu + (delta / next_count)
+            next_m2 = (q * retained) + (delta * (x - next_mean))
+            count[u] = np.where(update, np.where(k, next_count, 1.0), w)
+            mean[u] = np.where(update, np.where(k, next_mean, x), mu)
+            m2[u] = np.where(update, np.where(k, next_m2, 0.0), q)
+            known[u] = k | update
+            changed[u] |= update
+            
+        # Overall score: the mean of the present features, summed in extraction order
+        total = np.zeros(n)
+        for column in range(len(FEATURE_NAMES)):
+            total = total + np.where(present[:, column], scores[:, column], 0.0)
+        counts = present.sum(axis=1)
+        overall = np.where(counts > 0, total / np.maximum(counts, 1), 0.0)
+        
+        changed_pairs = []
+        for row, column in zip(*np.nonzero(changed)):
+            user_id = user_ids[row]
+            feature_name = FEATURE_NAMES[column]
+            baselines[user_id][feature_name] = {
+                'value': float(value[row, column]),
+                'confidence': float(confidence[row, column]),
+                'count': float(count[row, column]),
+                'mean': float(mean[row, column]),
+                'm2': float(m2[row, column])
+            }
+            changed_pairs.append((user_id, feature_name))
+            
+        results = [
+            {
+                'overall_score': float(overall[i]),
+                'feature_scores': {
+                    feature_name: float(scores[i, column])
+                    for column, feature_name in enumerate(FEATURE_NAMES) if present[i, column]
+                }
+            }
+            for i in range(n)
+        ]
+        return results, changed_pairs
         
     def process_activity(self, user_id, activity_type, ip_address, resource=None, details=None, user_agent=None, session_id=None):
         """Process a new user activity"""
@@ -260,97 +675,104 @@ class UEBAEngine:
             'session_id': session_id
         }
         
-        activity_id = self.db.insert('user_activities', data)
-        
-        if not activity_id:
-            logger.error(f"Failed to log activity for user {user_id}")
+        if not self._warmed_up:
+            self.warm_up()
+            
+        # The activity, its scores, baseline updates and alerts commit together
+        # (with write-behind on, only the alerts do; the rest is queued and
+        # activity_id is a PendingId)
+        try:
+            with self.db.transaction() as txn:
+                activity_id = self.db.queue_insert('user_activities', data)
+            
+                if not activity_id:
+                    logger.error(f"Failed to log activity for user {user_id}")
+                    return None
+                
+                # Cached profile (loaded on first use)
+                user_profile = self.get_profile(user_id)
+            
+                # Analyze the activity
+                timestamp = datetime.now()
+                with user_profile.lock:
+                    analysis_result = user_profile.analyze_recent_activity(
+                        activity_id,
+                        activity_type,
+                        timestamp,
+                        resource or '',
+                        details
+                    )
+            
+                # Check if multiple accesses from different IPs
+                ip_anomaly = self._check_multiple_ip_access(user_id, ip_address, timestamp)
+            
+                # Check for other anomalies
+                resource_anomaly = self._check_resource_access_pattern(user_id, resource, timestamp)
+            
+                # If high anomaly scores, create alert
+                if analysis_result['overall_score'] > OVERALL_ALERT_THRESHOLD or ip_anomaly or resource_anomaly:
+                    alert_data = {
+                        'user_id': user_id,
+                        'alert_type': 'unusual_behavior',
+                        'severity': 'high' if analysis_result['overall_score'] > 0.9 else 'medium',
+                        'description': self._generate_alert_description(
+                            user_id, 
+                            analysis_result, 
+                            ip_anomaly, 
+                            resource_anomaly
+                        )
+                    }
+                
+                    alert_id = self.db.insert('alerts', alert_data)
+                    record_risk(self.db, [alert_data], queue=True)
+                    logger.warning(f"Created alert for user {user_id} - Score: {analysis_result['overall_score']:.2f}")
+                
+        except Error as e:
+            # No connection to run the transaction on (pool exhausted, circuit breaker open)
+            logger.error(f"Failed to record activity for user {user_id}: {e}")
+            self.invalidate_profile(user_id)
             return None
             
-        # Create user profile if not exists
-        user_profile = UserBehaviorProfile(user_id)
-        
-        # Analyze the activity
-        timestamp = datetime.now()
-        analysis_result = user_profile.analyze_recent_activity(
-            activity_id,
-            activity_type,
-            timestamp,
-            resource or '',
-            details
-        )
-        
-        # Check if multiple accesses from different IPs
-        ip_anomaly = self._check_multiple_ip_access(user_id, ip_address)
-        
-        # Check for other anomalies
-        resource_anomaly = self._check_resource_access_pattern(user_id, resource)
-        
-        # If high anomaly scores, create alert
-        if analysis_result['overall_score'] > 0.8 or ip_anomaly or resource_anomaly:
-            alert_data = {
-                'user_id': user_id,
-                'alert_type': 'unusual_behavior',
-                'severity': 'high' if analysis_result['overall_score'] > 0.9 else 'medium',
-                'description': self._generate_alert_description(
-                    user_id, 
-                    analysis_result, 
-                    ip_anomaly, 
-                    resource_anomaly
-                )
-            }
+        if txn.failed:
+            logger.error(f"Failed to record analysis for user {user_id}, activity rolled back")
+            # The cached profile has the rolled-back baseline updates; reload it next time
+            self.invalidate_profile(user_id)
+            return None
             
-            alert_id = self.db.insert('alerts', alert_data)
-            logger.warning(f"Created alert for user {user_id} - Score: {analysis_result['overall_score']:.2f}")
+        self.ip_tracker.record(user_id, ip_address, timestamp.timestamp())
+        if resource:
+            self.resource_tracker.record(user_id, resource, timestamp.timestamp())
             
         return {
             'activity_id': activity_id,
             'analysis': analysis_result
         }
         
-    def _check_multiple_ip_access(self, user_id, current_ip):
+    def _check_multiple_ip_access(self, user_id, current_ip, timestamp=None):
         """Check if user is accessing from multiple IPs in a short time window"""
-        # Get recent IP addresses used by this user in the last hour
-        query = """
-        SELECT DISTINCT ip_address FROM user_activities 
-        WHERE user_id = %s AND timestamp > %s 
-        ORDER BY timestamp DESC
-        """
-        
-        one_hour_ago = datetime.now() - timedelta(hours=1)
-        results = self.db.fetch_all(query, (user_id, one_hour_ago))
-        
-        # Extract IP addresses
-        recent_ips = [r['ip_address'] for r in results if r['ip_address'] != current_ip]
+        # IP addresses used by this user in the last hour, other than this one
+        now = (timestamp or datetime.now()).timestamp()
         
         # If multiple different IPs found, flag as anomaly
-        if len(recent_ips) >= 2:
+        if self.ip_tracker.count(user_id, now, exclude=current_ip) >= 2:
+            recent_ips = [ip for ip in self.ip_tracker.values(user_id, now) if ip != current_ip]
             logger.warning(f"Multiple IP access detected for user {user_id}: {current_ip}, {recent_ips}")
             return True
             
         return False
         
-    def _check_resource_access_pattern(self, user_id, resource):
+    def _check_resource_access_pattern(self, user_id, resource, timestamp=None):
         """Check if resource access pattern is anomalous"""
         if not resource:
             return False
             
-        # Get resources commonly accessed by this user
-        query = """
-        SELECT resource_accessed, COUNT(*) as count 
-        FROM user_activities 
-        WHERE user_id = %s AND timestamp > %s 
-        GROUP BY resource_accessed 
-        ORDER BY count DESC
-        """
-        
-        thirty_days_ago = datetime.now() - timedelta(days=30)
-        results = self.db.fetch_all(query, (user_id, thirty_days_ago))
-        
-        # Check if current resource has been accessed before
-        common_resources = [r['resource_accessed'] for r in results]
+        # Resources accessed by this user in the last 30 days (this access is
+        # recorded only after the check)
+        now = (timestamp or datetime.now()).timestamp()
         
         # If resource has never been accessed and we have enough data
-        if resource not in common_resources and len(common_resources) > 5:
+        if (not self.resource_tracker.contains(user_id, resource, now)
+                and self.resource_tracker.count(user_id, now) > 5):
             logger.warning(f"Unusual resource access for user {user_id}: {resource}")
             return True
             
@@ -386,87 +808,74 @@ class UEBAEngine:
         return description
         
     def get_user_risk_score(self, user_id):
-        """Calculate overall risk score for a user based on alerts and anomalies"""
-        # Get alert counts by severity for the user
-        query = """
-        SELECT severity, COUNT(*) as count 
-        FROM alerts 
-        WHERE user_id = %s AND timestamp > %s 
-        GROUP BY severity
-        """
-        
-        thirty_days_ago = datetime.now() - timedelta(days=30)
-        results = self.db.fetch_all(query, (user_id, thirty_days_ago))
-        
-        # Calculate weighted score based on alert severity
-        weights = {
-            'low': 1,
-            'medium': 3,
-            'high': 5,
-            'critical': 10
-        }
+        """Overall risk score for a user based on alerts and anomalies
         
-        alert_score = 0
-        for result in results:
-            severity = result['severity']
-            count = result['count']
-            alert_score += weights.get(severity, 1) * count
-            
-        # Get average anomaly score for the user
-        query = """
-        SELECT AVG(anomaly_score) as avg_score 
-        FROM anomaly_scores 
-        WHERE user_id = %s AND timestamp > %s
+        Read from the user's user_risk row (one primary key lookup), where
+        recorded alerts and anomaly scores are added up as they come, with
+        older ones decayed (see risk.py).
         """
+        row = self.db.fetch_one("""
+        SELECT alert_weight, alert_count, anomaly_sum, anomaly_count 
+        FROM user_risk 
+        WHERE user_id = %s
+        """, (user_id,))
         
-        result = self.db.fetch_one(query, (user_id, thirty_days_ago))
-        avg_anomaly = result['avg_score'] if result and result['avg_score'] else 0
+        scores = risk_scores(*[row[counter] if row else 0 for counter in RISK_COUNTERS])
         
-        # Combine scores
-        risk_score = (alert_score * 0.7) + (avg_anomaly * 30)
+        return {
+            'user_id': user_id,
+            'raw_score': float(scores['raw_score']),
+            'normalized_score': float(scores['normalized_score']),
+            'category': self._risk_category(scores['normalized_score']),
+            'alert_count': int(round(float(scores['alert_count']))),
+            'avg_anomaly_score': float(scores['avg_anomaly_score'])
+        }
         
-        # Normalize to 0-100 scale with logarithmic scaling for alert_score
-        if alert_score > 0:
-            normalized_risk = min(100, 20 + (50 * math.log10(1 + alert_score)) + (30 * avg_anomaly))
-        else:
-            normalized_risk = min(100, 20 + (30 * avg_anomaly))
-            
-        # Categorize risk
-        risk_category = 'low'
+    @staticmethod
+    def _risk_category(normalized_risk):
+        """Categorize a normalized (0-100) risk score"""
         if normalized_risk > 80:
-            risk_category = 'critical'
+            return 'critical'
         elif normalized_risk > 60:
-            risk_category = 'high'
+            return 'high'
         elif normalized_risk > 40:
-            risk_category = 'medium'
-            
-        return {
-            'user_id': user_id,
-            'raw_score': risk_score,
-            'normalized_score': normalized_risk,
-            'category': risk_category,
-            'alert_count': sum(result['count'] for result in results),
-            'avg_anomaly_score': avg_anomaly
-        }
+            return 'medium'
+        return 'low'
         
     def get_top_risky_users(self, limit=10):
-        """Get the top risky users based on alerts and anomalies"""
-        # Get all users
-        query = "SELECT user_id FROM users"
-        users = self.db.fetch_all(query)
-        
-        # Calculate risk score for each user
-        risk_scores = []
-        for user in users:
-            user_id = user['user_id']
-            risk_info = self.get_user_risk_score(user_id)
-            risk_scores.append(risk_info)
-            
-        # Sort by normalized risk score
-        risk_scores.sort(key=lambda x: x['normalized_score'], reverse=True)
-        
-        # Return top N
-        return risk_scores[:limit]
+        """Get the top risky users based on alerts and anomalies
+        
+        Scores every user from their user_risk row, in one query; users
+        without one score as having no alerts or anomalies.
+        """
+        users = self.db.fetch_all("""
+        SELECT u.user_id, r.alert_weight, r.alert_count, r.anomaly_sum, r.anomaly_count 
+        FROM users u 
+        LEFT JOIN user_risk r ON r.user_id = u.user_id 
+        ORDER BY u.user_id
+        """, result='columns')
+        
+        # {} if the query failed
+        if not users or not len(users['user_id']):
+            return []
+        user_ids = users['user_id']
+            
+        scores = risk_scores(*[np.nan_to_num(users[counter].astype(np.float64)) for counter in RISK_COUNTERS])
+        normalized = scores['normalized_score']
+        
+        # Top N (ties keep user_id order, as a stable sort would)
+        top = heapq.nlargest(limit, range(len(user_ids)), key=normalized.__getitem__)
+        return [
+            {
+                'user_id': int(user_ids[i]),
+                'raw_score': float(scores['raw_score'][i]),
+                'normalized_score': float(normalized[i]),
+                'category': self._risk_category(normalized[i]),
+                'alert_count': int(round(scores['alert_count'][i])),
+                'avg_anomaly_score': float(scores['avg_anomaly_score'][i])
+            }
+            for i in top
+        ]
         
 # Create a singleton instance
 ueba_engine = UEBAEngine()
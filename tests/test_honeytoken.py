@@ -0,0 +1,72 @@
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+class LogAccessTest(unittest.TestCase):
+    """A failed transaction doesn't lose the honeytoken access"""
+
+    def setUp(self):
+        # Database reads .dbcredentials and logs to logs/ relative to the working directory
+        self.cwd = os.getcwd()
+        self.tmp = tempfile.TemporaryDirectory()
+        os.chdir(self.tmp.name)
+        os.makedirs('logs')
+        with open('.dbcredentials', 'w') as f:
+            f.write("DB_BACKEND=sqlite\nDB_PATH=data/test.db\n")
+        sys.path.insert(0, ROOT)
+
+        from src.db import database
+        from src.models.honeytoken import Honeytoken
+        self.db = database.Database()
+        self.patch_db = mock.patch.object(database, '_db_instance', self.db)
+        self.patch_db.start()
+        self.Honeytoken = Honeytoken
+
+        self.db.execute_query("INSERT INTO users (username, email, department, role) VALUES ('a', 'a@example.com', 'IT', 'dev')")
+        self.db.execute_query("INSERT INTO honeytokens (token_name, token_type, token_value, token_location) VALUES ('t', 'file', 'v', '/tmp/t')")
+
+    def tearDown(self):
+        self.patch_db.stop()
+        self.db.disconnect()
+        sys.path.remove(ROOT)
+        os.chdir(self.cwd)
+        self.tmp.cleanup()
+
+    def access_ids(self, table):
+        return [row['access_id'] for row in self.db.fetch_all(f"SELECT access_id FROM {table}", primary=True)]
+
+    def test_logs_access_alert_and_forensic_log(self):
+        access_id = self.Honeytoken.log_access(1, 1, '10.0.0.1')
+        self.assertEqual(self.access_ids('honeytoken_access'), [access_id])
+        self.assertEqual(self.access_ids('alerts'), [access_id])
+        self.assertIn(access_id, self.access_ids('forensic_logs'))
+
+    def test_failed_commit_rewrites_access(self):
+        from mysql.connector import errors
+        from src.db.backends import SQLiteConnection
+
+        real_commit = SQLiteConnection.commit
+        calls = []
+
+        def commit(connection):
+            # Only the transaction's commit fails
+            calls.append(connection)
+            if len(calls) == 1:
+                connection.rollback()
+                raise errors.OperationalError(msg="database is locked")
+            return real_commit(connection)
+
+        with mock.patch.object(SQLiteConnection, 'commit', commit):
+            access_id = self.Honeytoken.log_access(1, 1, '10.0.0.1')
+
+        self.assertIsNotNone(access_id)
+        self.assertEqual(self.access_ids('honeytoken_access'), [access_id])
+        for forensic_access_id in self.access_ids('forensic_logs'):
+            self.assertEqual(forensic_access_id, access_id)
+
+if __name__ == '__main__':
+    unittest.main()
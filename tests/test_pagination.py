@@ -0,0 +1,36 @@
+import os
+import sys
+import unittest
+from collections import namedtuple
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from src.db.pagination import InvalidCursor, decode_cursor, encode_cursor, next_cursor
+
+class NextCursorTest(unittest.TestCase):
+    """Continuation cursors of keyset pages"""
+
+    def test_round_trip(self):
+        position = (datetime(2026, 5, 1, 12, 30, 15), 42)
+        self.assertEqual(decode_cursor(encode_cursor(*position)), position)
+
+    def test_malformed_cursor(self):
+        with self.assertRaises(InvalidCursor):
+            decode_cursor('not a cursor')
+
+    def test_last_page(self):
+        rows = [{'timestamp': datetime(2026, 5, 1), 'id': 1}]
+        self.assertIsNone(next_cursor(rows, 2, 'timestamp', 'id'))
+        self.assertIsNotNone(next_cursor(rows, 1, 'timestamp', 'id'))
+
+    def test_null_timestamp_ends_paging(self):
+        Row = namedtuple('Row', 'timestamp alert_id')
+        self.assertIsNone(next_cursor([{'timestamp': None, 'id': 1}], 1, 'timestamp', 'id'))
+        self.assertIsNone(next_cursor([Row(None, 1)], 1, 'timestamp', 'alert_id'))
+        self.assertEqual(next_cursor([Row(datetime(2026, 5, 1), 7)], 1, 'timestamp', 'alert_id'),
+                         encode_cursor(datetime(2026, 5, 1), 7))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,108 @@
+import os
+import sys
+import threading
+import time
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from mysql.connector.errors import PoolError
+from src.db.pool import ConnectionPool
+
+class FakeConnection:
+    def __init__(self, number):
+        self.number = number
+        self.closed = False
+        self.alive = True
+
+    def close(self):
+        self.closed = True
+
+class ConnectionPoolTest(unittest.TestCase):
+    """Checkout, overflow, timeout and validation of pooled connections"""
+
+    def setUp(self):
+        self.opened = []
+
+    def connect(self):
+        connection = FakeConnection(len(self.opened))
+        self.opened.append(connection)
+        return connection
+
+    def pool(self, **kwargs):
+        return ConnectionPool(self.connect, **kwargs)
+
+    def test_reuses_released_connection(self):
+        pool = self.pool(size=2, max_overflow=0)
+        first = pool.acquire()
+        pool.release(first)
+        self.assertIs(pool.acquire(), first)
+        self.assertEqual(pool.stats()['created'], 1)
+        self.assertEqual(pool.stats()['checkouts'], 2)
+
+    def test_overflow_connections_closed_on_release(self):
+        pool = self.pool(size=1, max_overflow=1, timeout=0.05)
+        first = pool.acquire()
+        overflow = pool.acquire()
+        self.assertEqual(pool.stats()['opened'], 2)
+
+        pool.release(first)
+        pool.release(overflow)
+        self.assertFalse(first.closed)
+        self.assertTrue(overflow.closed)
+        self.assertEqual(pool.stats()['opened'], 1)
+        self.assertEqual(pool.stats()['idle'], 1)
+
+    def test_exhausted_pool_times_out(self):
+        pool = self.pool(size=1, max_overflow=1, timeout=0.05)
+        pool.acquire()
+        pool.acquire()
+        with self.assertRaises(PoolError):
+            pool.acquire()
+        self.assertEqual(pool.stats()['exhausted'], 1)
+
+    def test_waiter_gets_released_connection(self):
+        pool = self.pool(size=1, max_overflow=0, timeout=5)
+        held = pool.acquire()
+        threading.Timer(0.05, pool.release, (held,)).start()
+        self.assertIs(pool.acquire(), held)
+        self.assertEqual(pool.stats()['waits'], 1)
+
+    def test_discarded_connection_frees_its_slot(self):
+        pool = self.pool(size=1, max_overflow=0, timeout=0.05)
+        broken = pool.acquire()
+        pool.release(broken, discard=True)
+        self.assertTrue(broken.closed)
+        self.assertIsNot(pool.acquire(), broken)
+
+    def test_failed_connect_frees_its_slot(self):
+        def connect():
+            raise PoolError("cannot connect")
+
+        pool = ConnectionPool(connect, size=1, max_overflow=0, timeout=0.05)
+        for _ in range(2):
+            with self.assertRaises(PoolError) as raised:
+                pool.acquire()
+            self.assertEqual(str(raised.exception), "cannot connect")
+        self.assertEqual(pool.stats()['in_use'], 0)
+
+    def test_stale_connection_replaced(self):
+        pool = self.pool(size=1, max_overflow=0, validate=lambda connection: connection.alive, validate_after=0)
+        stale = pool.acquire()
+        pool.release(stale)
+        stale.alive = False
+        time.sleep(0.01)
+        fresh = pool.acquire()
+        self.assertIsNot(fresh, stale)
+        self.assertTrue(stale.closed)
+        self.assertEqual(pool.stats()['validations'], 1)
+
+    def test_recently_used_connection_not_validated(self):
+        pool = self.pool(size=1, max_overflow=0, validate=lambda connection: connection.alive, validate_after=30)
+        pool.release(pool.acquire())
+        pool.acquire()
+        self.assertEqual(pool.stats()['validations'], 0)
+
+if __name__ == '__main__':
+    unittest.main()
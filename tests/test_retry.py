@@ -0,0 +1,189 @@
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from mysql.connector import errors
+from src.db.retry import RetryPolicy, CircuitBreaker, is_transient
+
+def open_breaker(breaker):
+    """Open the breaker and let its reset timeout run out"""
+    for _ in range(breaker.failure_threshold):
+        breaker.record_failure()
+    breaker._opened_at -= breaker.reset_timeout
+
+class RetryBudgetTest(unittest.TestCase):
+    """Retries stop once the budget is spent and resume as requests earn it back"""
+
+    def test_budget_exhaustion(self):
+        policy = RetryPolicy(budget_ratio=0.5, budget_max=2)
+        self.assertTrue(policy.try_spend())
+        self.assertTrue(policy.try_spend())
+        self.assertFalse(policy.try_spend())
+        self.assertEqual(policy.stats()['retries'], 2)
+        self.assertEqual(policy.stats()['budget_exhausted'], 1)
+
+        policy.record_request()
+        self.assertFalse(policy.try_spend())
+        policy.record_request()
+        self.assertTrue(policy.try_spend())
+
+    def test_backoff_is_capped(self):
+        policy = RetryPolicy(base_delay=1, max_delay=3)
+        for attempt in range(1, 10):
+            self.assertLessEqual(policy.backoff(attempt), 3)
+
+class CircuitBreakerTest(unittest.TestCase):
+    """open -> half-open -> closed/open transitions"""
+
+    def test_opens_after_threshold(self):
+        breaker = CircuitBreaker(failure_threshold=3, reset_timeout=60)
+        breaker.record_failure()
+        breaker.record_failure()
+        self.assertTrue(breaker.allow())
+        breaker.record_failure()
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+        self.assertFalse(breaker.allow())
+        self.assertEqual(breaker.stats()['rejected'], 1)
+
+    def test_success_resets_failure_count(self):
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60)
+        breaker.record_failure()
+        breaker.record_success()
+        breaker.record_failure()
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+
+    def test_half_open_trial_success_closes(self):
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=60)
+        open_breaker(breaker)
+        self.assertTrue(breaker.allow())
+        self.assertEqual(breaker.state, CircuitBreaker.HALF_OPEN)
+        # Only one trial at a time
+        self.assertFalse(breaker.allow())
+        breaker.record_success()
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+        self.assertTrue(breaker.allow())
+
+    def test_half_open_trial_failure_reopens(self):
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=60)
+        open_breaker(breaker)
+        self.assertTrue(breaker.allow())
+        breaker.record_failure()
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+        self.assertFalse(breaker.allow())
+        self.assertEqual(breaker.stats()['times_opened'], 2)
+
+    def test_unreported_trial_times_out(self):
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=60, trial_timeout=30)
+        open_breaker(breaker)
+        self.assertTrue(breaker.allow())
+        self.assertFalse(breaker.allow())
+        breaker._trial_started -= 30
+        self.assertTrue(breaker.allow())
+
+class PoolExhaustionTest(unittest.TestCase):
+    """An exhausted pool is neither retried nor counted against the database"""
+
+    def setUp(self):
+        # Database reads .dbcredentials and logs to logs/ relative to the working directory
+        self.cwd = os.getcwd()
+        self.tmp = tempfile.TemporaryDirectory()
+        os.chdir(self.tmp.name)
+        os.makedirs('logs')
+        with open('.dbcredentials', 'w') as f:
+            f.write("DB_BACKEND=sqlite\nDB_PATH=data/test.db\nDB_BREAKER_THRESHOLD=1\n"
+                    "DB_POOL_SIZE=1\nDB_POOL_MAX_OVERFLOW=0\nDB_POOL_TIMEOUT=0.01\n")
+
+        from src.db.database import Database
+        self.db = Database()
+
+    def tearDown(self):
+        self.db.disconnect()
+        os.chdir(self.cwd)
+        self.tmp.cleanup()
+
+    def test_exhausted_pool(self):
+        self.assertFalse(is_transient(errors.PoolError(msg="Connection pool exhausted")))
+
+        held = self.db.pool.acquire()
+        try:
+            self.assertIsNone(self.db.fetch_one("SELECT 1 AS one"))
+        finally:
+            self.db.pool.release(held)
+
+        self.assertEqual(self.db.breaker.state, 'closed')
+        self.assertEqual(self.db.retry_policy.stats()['retries'], 0)
+        self.assertEqual(self.db.fetch_one("SELECT 1 AS one"), {'one': 1})
+
+    def test_exhausted_pool_releases_half_open_trial(self):
+        open_breaker(self.db.breaker)
+        held = self.db.pool.acquire()
+        try:
+            self.assertIsNone(self.db.fetch_one("SELECT 1 AS one"))
+        finally:
+            self.db.pool.release(held)
+
+        # The trial never reached the database, so the next call gets it
+        self.assertEqual(self.db.fetch_one("SELECT 1 AS one"), {'one': 1})
+        self.assertEqual(self.db.breaker.state, 'closed')
+
+class TransactionBreakerTest(unittest.TestCase):
+    """transaction() reports its half-open trial even when no statement runs"""
+
+    def setUp(self):
+        # Database reads .dbcredentials and logs to logs/ relative to the working directory
+        self.cwd = os.getcwd()
+        self.tmp = tempfile.TemporaryDirectory()
+        os.chdir(self.tmp.name)
+        os.makedirs('logs')
+        with open('.dbcredentials', 'w') as f:
+            f.write("DB_BACKEND=sqlite\nDB_PATH=data/test.db\nDB_BREAKER_THRESHOLD=1\nDB_BREAKER_RESET=60\n")
+
+        from src.db.database import Database
+        self.db = Database()
+        open_breaker(self.db.breaker)
+
+    def tearDown(self):
+        self.db.disconnect()
+        os.chdir(self.cwd)
+        self.tmp.cleanup()
+
+    def failing_start(self, error):
+        connection = self.db.pool.acquire()
+        self.db.pool.release(connection)
+        return mock.patch.object(type(connection), 'start_transaction', side_effect=error)
+
+    def test_failed_start_transaction_in_half_open(self):
+        with self.failing_start(errors.ProgrammingError(msg="cannot start a transaction")):
+            with self.assertRaises(errors.ProgrammingError):
+                with self.db.transaction():
+                    pass
+
+        # The server answered, so the trial closes the breaker
+        self.assertEqual(self.db.breaker.state, 'closed')
+        self.assertEqual(self.db.fetch_one("SELECT 1 AS one"), {'one': 1})
+
+    def test_transient_start_failure_reopens(self):
+        with self.failing_start(errors.OperationalError(msg="database is locked")):
+            with self.assertRaises(errors.OperationalError):
+                with self.db.transaction():
+                    pass
+
+        self.assertEqual(self.db.breaker.state, 'open')
+
+    def test_empty_transaction_closes_breaker(self):
+        with self.db.transaction():
+            pass
+        self.assertEqual(self.db.breaker.state, 'closed')
+
+    def test_fetch_iter_non_transient_error_closes_breaker(self):
+        with self.assertRaises(errors.ProgrammingError):
+            list(self.db.fetch_iter("SELECT * FROM no_such_table"))
+        self.assertEqual(self.db.breaker.state, 'closed')
+
+if __name__ == '__main__':
+    unittest.main()
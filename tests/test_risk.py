@@ -0,0 +1,45 @@
+import os
+import sys
+import tempfile
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+class RebuildUserRiskTest(unittest.TestCase):
+    """rebuild_user_risk() recomputes the counters from alerts and anomaly scores"""
+
+    def setUp(self):
+        # Database reads .dbcredentials and logs to logs/ relative to the working directory
+        self.cwd = os.getcwd()
+        self.tmp = tempfile.TemporaryDirectory()
+        os.chdir(self.tmp.name)
+        os.makedirs('logs')
+        with open('.dbcredentials', 'w') as f:
+            f.write("DB_BACKEND=sqlite\nDB_PATH=data/test.db\n")
+        sys.path.insert(0, ROOT)
+
+        from src.db.database import Database
+        self.db = Database()
+
+    def tearDown(self):
+        self.db.disconnect()
+        sys.path.remove(ROOT)
+        os.chdir(self.cwd)
+        self.tmp.cleanup()
+
+    def test_rows_without_timestamp_are_skipped(self):
+        from src.models.risk import rebuild_user_risk
+
+        self.db.insert_many('alerts', [
+            {'user_id': 1, 'alert_type': 'access', 'severity': 'high', 'description': 'dated'},
+            {'user_id': 2, 'alert_type': 'access', 'severity': 'high', 'description': 'undated'},
+        ])
+        self.db.execute_query("UPDATE alerts SET timestamp = NULL WHERE user_id = 2")
+
+        summary = rebuild_user_risk(self.db)
+        self.assertEqual(summary['users'], 1)
+        rows = self.db.fetch_all("SELECT user_id FROM user_risk", primary=True)
+        self.assertEqual([row['user_id'] for row in rows], [1])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,50 @@
+import os
+import sys
+import tempfile
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+class SQLiteSchemaTest(unittest.TestCase):
+    """A new SQLite file comes up with every migration applied"""
+
+    def setUp(self):
+        # Database reads .dbcredentials and logs to logs/ relative to the working directory
+        self.cwd = os.getcwd()
+        self.tmp = tempfile.TemporaryDirectory()
+        os.chdir(self.tmp.name)
+        os.makedirs('logs')
+        with open('.dbcredentials', 'w') as f:
+            f.write("DB_BACKEND=sqlite\nDB_PATH=data/test.db\n")
+        sys.path.insert(0, ROOT)
+
+    def tearDown(self):
+        sys.path.remove(ROOT)
+        os.chdir(self.cwd)
+        self.tmp.cleanup()
+
+    def test_new_file_is_migrated(self):
+        from src.db.database import Database
+        from src.db.migrate import list_migrations
+
+        db = Database()
+        try:
+            rows = db.fetch_all("SELECT version FROM schema_migrations ORDER BY version", primary=True)
+            self.assertEqual([row['version'] for row in rows],
+                             [version for version, _, _ in list_migrations('sqlite')])
+            # Columns and tables added by migrations are usable right away
+            self.assertEqual(db.fetch_all("SELECT sample_count FROM behavioral_baselines"), [])
+            self.assertEqual(db.fetch_all("SELECT user_id FROM user_risk"), [])
+        finally:
+            db.disconnect()
+
+        # Reopening finds nothing left to apply
+        db = Database()
+        try:
+            self.assertEqual(db.fetch_one("SELECT COUNT(*) AS n FROM schema_migrations")['n'],
+                             len(list_migrations('sqlite')))
+        finally:
+            db.disconnect()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+import os
+import random
+import sys
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+from unittest import mock
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+class ScoreBatchTest(unittest.TestCase):
+    """score_batch() gives the scores of the one-by-one path, in both scoring modes"""
+
+    def setUp(self):
+        # Database reads .dbcredentials and logs to logs/ relative to the working directory
+        self.cwd = os.getcwd()
+        self.tmp = tempfile.TemporaryDirectory()
+        os.chdir(self.tmp.name)
+        os.makedirs('logs')
+        with open('.dbcredentials', 'w') as f:
+            f.write("DB_BACKEND=sqlite\nDB_PATH=data/test.db\n")
+        sys.path.insert(0, ROOT)
+
+        from src.db import database
+        self.db = database.Database()
+        self.patch_db = mock.patch.object(database, '_db_instance', self.db)
+        self.patch_db.start()
+
+    def tearDown(self):
+        self.patch_db.stop()
+        self.db.disconnect()
+        sys.path.remove(ROOT)
+        os.chdir(self.cwd)
+        self.tmp.cleanup()
+
+    def events(self, count=300, users=(1, 2, 3), seed=7):
+        """A random, interleaved stream of activities of a few users"""
+        rng = random.Random(seed)
+        start = datetime(2026, 3, 2, 8, 0, 0)
+        events = []
+        for i in range(count):
+            details = {}
+            if rng.random() < 0.7:
+                details['duration'] = rng.choice([30, 45, 60, 90, 600])
+            if rng.random() < 0.5:
+                details['bytes_transferred'] = rng.choice([1000, 1200, 1500, 250000])
+            if rng.random() < 0.3:
+                details['access_count'] = rng.randint(1, 4)
+            events.append({
+                'user_id': rng.choice(users),
+                'activity_type': rng.choice(['login', 'file_access', 'file_access', 'logout']),
+                'timestamp': start + timedelta(minutes=37 * i + rng.randint(0, 30)),
+                'resource': rng.choice(['docs/report.pdf', 'docs/plan.docx', 'hr/salaries.xlsx', '']),
+                'details': details or None
+            })
+        return events
+
+    def assert_matches_scalar_path(self, scoring):
+        from src.models.ueba import UEBAEngine, UserBehaviorProfile
+
+        events = self.events()
+        engine = UEBAEngine(scoring=scoring)
+        baselines = {}
+        batch = engine.score_batch(events, baselines=baselines)
+
+        profiles = {}
+        for activity_id, event in enumerate(events, 1):
+            user_id = event['user_id']
+            if user_id not in profiles:
+                profiles[user_id] = UserBehaviorProfile(user_id, scoring=scoring)
+            scalar = profiles[user_id].analyze_recent_activity(
+                activity_id, event['activity_type'], event['timestamp'], event['resource'], event['details']
+            )
+            self.assertEqual(batch[activity_id - 1]['feature_scores'], scalar['feature_scores'],
+                             f"feature scores of event {activity_id}")
+            self.assertEqual(batch[activity_id - 1]['overall_score'], scalar['overall_score'],
+                             f"overall score of event {activity_id}")
+
+        for user_id, profile in profiles.items():
+            for feature_name, state in profile.baseline_data.items():
+                for field in ('value', 'confidence', 'count', 'mean', 'm2'):
+                    self.assertEqual(baselines[user_id][feature_name][field], state[field])
+        return batch
+
+    def test_ratio_scoring(self):
+        self.assert_matches_scalar_path('ratio')
+
+    def test_zscore_scoring(self):
+        from src.models.ueba import UEBAEngine
+
+        batch = self.assert_matches_scalar_path('zscore')
+        # The stream is long enough for the z-score to take over from the ratio
+        ratio = UEBAEngine(scoring='ratio').score_batch(self.events(), baselines={})
+        self.assertNotEqual([result['feature_scores'] for result in batch],
+                            [result['feature_scores'] for result in ratio])
+
+if __name__ == '__main__':
+    unittest.main()
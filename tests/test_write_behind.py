@@ -0,0 +1,98 @@
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+class WriteBehindOrderTest(unittest.TestCase):
+    """Flushes write parent tables before the tables referencing their PendingIds"""
+
+    def setUp(self):
+        # Database reads .dbcredentials and logs to logs/ relative to the working directory
+        self.cwd = os.getcwd()
+        self.tmp = tempfile.TemporaryDirectory()
+        os.chdir(self.tmp.name)
+        os.makedirs('logs')
+        with open('.dbcredentials', 'w') as f:
+            f.write("DB_BACKEND=sqlite\nDB_PATH=data/test.db\n")
+        sys.path.insert(0, ROOT)
+
+        from src.db.database import Database
+        from src.db.write_behind import WriteBehindBuffer
+        self.db = Database()
+        # Large batch and interval: only flush() drains the queue
+        self.buffer = WriteBehindBuffer(self.db, flush_rows=10000, flush_interval=60)
+
+    def tearDown(self):
+        self.buffer.close()
+        self.db.disconnect()
+        sys.path.remove(ROOT)
+        os.chdir(self.cwd)
+        self.tmp.cleanup()
+
+    def activity(self):
+        return self.buffer.insert('user_activities', {
+            'user_id': 1, 'activity_type': 'login', 'ip_address': '10.0.0.1'
+        })
+
+    def score(self, activity_id):
+        return self.buffer.insert('anomaly_scores', {
+            'user_id': 1, 'activity_id': activity_id, 'feature_name': 'time_of_day', 'anomaly_score': 0.1
+        })
+
+    def test_flush_starting_with_child_rows(self):
+        first = self.activity()
+        self.assertTrue(self.buffer.flush(10))
+
+        # This flush starts with a score of the already written activity, so
+        # anomaly_scores appears before user_activities
+        self.score(first)
+        second = self.activity()
+        self.score(second)
+        self.assertTrue(self.buffer.flush(10))
+
+        rows = self.db.fetch_all("SELECT activity_id FROM anomaly_scores ORDER BY anomaly_id", primary=True)
+        self.assertEqual([row['activity_id'] for row in rows], [first.value, second.value])
+        self.assertEqual(self.buffer.stats()['dropped'], 0)
+
+    def test_flush_after_close(self):
+        first = self.activity()
+        self.buffer.close()
+        # Returns at once instead of waiting for the stopped writer
+        self.assertTrue(self.buffer.flush())
+        self.assertIsNotNone(first.value)
+
+    def test_unexpected_error_resolves_pending_ids(self):
+        self.buffer.update('users', {'last_login': '2026-01-01 00:00:00'}, {'user_id': 1})
+        first = self.activity()
+        with mock.patch.object(self.db, 'insert_many', side_effect=TypeError("cannot convert")):
+            self.buffer.flush(10)
+
+        # Dropped rather than left pending forever, and no longer overlaid
+        self.assertIsNone(first.wait(1))
+        self.assertEqual(self.buffer._overlay, {})
+        self.assertEqual(self.buffer.stats()['dropped'], 2)
+
+        # The writer carries on
+        second = self.activity()
+        self.assertTrue(self.buffer.flush(10))
+        self.assertIsNotNone(second.wait(1))
+
+    def test_additive_upserts_add_up(self):
+        self.db.upsert_many('user_risk', [{'user_id': 1, 'alert_weight': 1.0, 'alert_count': 1.0}],
+                            ('user_id',), add_columns=('alert_weight', 'alert_count'))
+        for weight in (2.0, 3.0):
+            self.buffer.upsert('user_risk', {'user_id': 1, 'alert_weight': weight, 'alert_count': 1.0},
+                               ('user_id',), add_columns=('alert_weight', 'alert_count'))
+        # Deltas aren't the row's state
+        self.assertEqual(self.buffer.pending('user_risk', {'user_id': 1}), [])
+        self.assertTrue(self.buffer.flush(10))
+
+        row = self.db.fetch_one("SELECT alert_weight, alert_count FROM user_risk WHERE user_id = 1", primary=True)
+        self.assertEqual(row, {'alert_weight': 6.0, 'alert_count': 3.0})
+        self.assertEqual(self.buffer.stats()['written'], 2)
+
+if __name__ == '__main__':
+    unittest.main()